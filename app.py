@@ -1,246 +1,1678 @@
 import sqlite3
 import json
-from flask import Flask, request, jsonify, render_template, g, send_file
+import collections
+import functools
+import threading
+import base64
+import hashlib
+from flask import Flask, request, jsonify, render_template, g, send_file, stream_with_context
+import click
 from flask_cors import CORS
 import datetime
 import re # Import regex for parsing
 import os
-import shutil
 import tempfile
+import io
+import csv
+import zlib
+import zipfile
+import uuid
+import queue
+import struct
+import urllib.parse
+import urllib.request
+import logging
+import bisect
+import sys
+import time
 
-# Change the template folder to point to the backend/templates directory
-template_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), 'linkedin_crm/backend/templates'))
-if not os.path.exists(template_dir):
-    # Alternative path for cPanel structure
-    template_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), 'backend/templates'))
-    if os.path.exists(template_dir):
-        print(f"Using alternative template path: {template_dir}")
-    else:
-        print(f"Warning: Template directory not found at {template_dir}")
+STARTUP_STARTED = time.perf_counter() # Start of the startup timing report (after the imports above)
+
+APP_ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# Only warnings and errors are reported unless CRM_LOG_LEVEL (e.g. INFO, DEBUG) is set
+logger = logging.getLogger('crm')
+if os.environ.get('CRM_LOG_LEVEL'):
+    logging.basicConfig(format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+    logger.setLevel(os.environ['CRM_LOG_LEVEL'].upper())
+
+# Filled in as the process starts; printed by prepare_database() on first database use
+STARTUP_TIMINGS = {}
 
-app = Flask(__name__, template_folder=template_dir)
+def resolve_template_dir():
+    """First existing template directory: CRM_TEMPLATE_DIR, the cPanel layouts, then ./templates."""
+    candidates = [os.environ.get('CRM_TEMPLATE_DIR'),
+                  os.path.join(APP_ROOT, 'linkedin_crm/backend/templates'),
+                  os.path.join(APP_ROOT, 'backend/templates'), # Alternative path for cPanel structure
+                  os.path.join(APP_ROOT, 'templates')]
+    for candidate in candidates:
+        if candidate and os.path.isdir(candidate):
+            return candidate
+    return os.path.join(APP_ROOT, 'templates')
+
+app = Flask(__name__, template_folder=resolve_template_dir())
 # Allow requests from the Chrome extension's origin
 # CORS(app, resources={r"/api/*": {"origins": "chrome-extension://*"}}) # Original line
 CORS(app) # Allow all origins for debugging
 
-# Set the database path
-db_path = os.path.abspath(os.path.join(os.path.dirname(__file__), 'linkedin_crm/backend/database.db'))
-if not os.path.exists(os.path.dirname(db_path)):
-    # Try alternative path for cPanel structure
-    alt_db_path = os.path.abspath(os.path.join(os.path.dirname(__file__), 'backend/database.db'))
-    if os.path.exists(os.path.dirname(alt_db_path)):
-        db_path = alt_db_path
-        print(f"Using alternative database path: {db_path}")
+# Database path override (also settable with CRM_DATABASE). When unset the
+# path is resolved once, on first use, by default_database_path().
+DATABASE = os.environ.get('CRM_DATABASE')
+
+@functools.lru_cache(maxsize=None)
+def default_database_path():
+    db_path = os.path.join(APP_ROOT, 'linkedin_crm/backend/database.db')
+    if not os.path.exists(os.path.dirname(db_path)):
+        # Try alternative path for cPanel structure
+        alt_db_path = os.path.join(APP_ROOT, 'backend/database.db')
+        if os.path.exists(os.path.dirname(alt_db_path)):
+            db_path = alt_db_path
+        else:
+            logger.warning("Neither database directory exists. Will attempt to create.")
+    logger.info("Database path set to: %s", db_path)
+    return db_path
+
+def database_path():
+    return DATABASE or default_database_path()
+
+# SQLite connection tuning. Each value can be overridden with an environment
+# variable named CRM_SQLITE_<KEY>, e.g. CRM_SQLITE_MMAP_SIZE=0.
+SQLITE_SETTINGS = {
+    'journal_mode': 'WAL',         # Readers no longer block behind the writer
+    'synchronous': 'NORMAL',       # Safe with WAL; fsync at checkpoints instead of every commit
+    'mmap_size': 134217728,        # 128 MiB of the file memory-mapped for reads
+    'cache_size': -32000,          # Page cache per connection, in KiB when negative
+    'busy_timeout': 5000,          # Milliseconds to wait for a lock before SQLITE_BUSY
+    'cached_statements': 256,      # Prepared statements kept per connection
+}
+
+def sqlite_setting(key):
+    """Return a connection setting, preferring its CRM_SQLITE_<KEY> environment override."""
+    value = os.environ.get(f'CRM_SQLITE_{key.upper()}', SQLITE_SETTINGS[key])
+    if not re.fullmatch(r'-?\w+', str(value)):
+        raise ValueError(f"Invalid value for SQLite setting {key}: {value!r}")
+    return value
+
+def read_only_uri(path):
+    """URI that opens the database file at path read-only, whatever characters the path contains."""
+    return f"file:{urllib.parse.quote(os.path.abspath(path))}?mode=ro"
+
+def open_connection(path, readonly=False):
+    """Open and tune a SQLite connection. Read-only connections cannot write by construction."""
+    factory = InstrumentedConnection if METRICS_ENABLED else sqlite3.Connection
+    if readonly:
+        db = sqlite3.connect(read_only_uri(path), uri=True, factory=factory, check_same_thread=False,
+                             timeout=int(sqlite_setting('busy_timeout')) / 1000,
+                             cached_statements=int(sqlite_setting('cached_statements')))
     else:
-        print(f"Warning: Neither database directory exists. Will attempt to create.")
+        db = sqlite3.connect(path, factory=factory, check_same_thread=False,
+                             timeout=int(sqlite_setting('busy_timeout')) / 1000,
+                             cached_statements=int(sqlite_setting('cached_statements')))
+        db.execute(f"PRAGMA journal_mode = {sqlite_setting('journal_mode')}")
+    db.row_factory = sqlite3.Row
+    db.execute("PRAGMA foreign_keys = ON") # Enforce foreign key constraints
+    register_text_functions(db, path) # inflate()/deflate() for compressed text
+    for pragma in ('synchronous', 'mmap_size', 'cache_size', 'busy_timeout'):
+        db.execute(f"PRAGMA {pragma} = {sqlite_setting(pragma)}")
+    return db
 
-DATABASE = db_path
-print(f"Database path set to: {DATABASE}")
+POOL_IDLE_CONNECTIONS = int(os.environ.get('CRM_POOL_SIZE', 8)) # Idle request connections kept per database and mode
 
-def get_db():
-    db = getattr(g, '_database', None)
-    if db is None:
-        # Ensure the directory exists
-        db_dir = os.path.dirname(DATABASE)
-        if not os.path.exists(db_dir):
+class ConnectionPool:
+    """Long-lived SQLite connections, shared by the threads that serve requests.
+
+    Connections are kept open instead of being opened and closed on every
+    request, so pragmas, the page cache and prepared statements survive
+    between requests. A request borrows one with acquire() and its teardown
+    hands it back with release(), so reuse does not depend on the same thread
+    serving the next request (threaded app.run() as well as single-threaded
+    Passenger workers). Up to POOL_IDLE_CONNECTIONS idle ones are kept per
+    database and mode; any beyond that are closed. Background threads and CLI
+    commands keep one connection per thread through connection(). A fork
+    (e.g. Passenger spawning a worker from a preloaded app) gets fresh
+    connections.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+        self.memory_fallback = None
+        self._prepared = set()
+        self._preparing = set()
+        self._prepare_lock = threading.RLock()
+        self._idle_lock = threading.Lock()
+        self._idle = {}  # (path, readonly) -> Queue of idle request connections
+        self._lent = {}  # Borrowed connection -> (path, readonly, pid)
+        self._pid = None
+
+    def connection(self, path, readonly=False):
+        """This thread's own connection, kept for the life of the thread."""
+        if path not in self._prepared:
+            self._prepare(path)
+        local = self._local
+        if getattr(local, 'pid', None) != os.getpid():
+            local.pid = os.getpid()
+            local.connections = {}
+        if self.memory_fallback is not None:
+            return self.memory_fallback
+        if readonly and not os.path.exists(path):
+            # Nothing to read yet; the writer creates the file
+            readonly = False
+        key = (path, readonly)
+        db = local.connections.get(key)
+        if db is None:
+            db = local.connections[key] = self._connect(path, readonly)
+        return db
+
+    def acquire(self, path, readonly=False):
+        """Borrow an idle connection (or open one) for a request; give it back with release()."""
+        if path not in self._prepared:
+            self._prepare(path)
+        if self.memory_fallback is not None:
+            return self.memory_fallback
+        if readonly and not os.path.exists(path):
+            readonly = False
+        key = (path, readonly)
+        with self._idle_lock:
+            if self._pid != os.getpid():
+                # The parent's connections must not be used across a fork
+                self._pid = os.getpid()
+                self._idle = {}
+                self._lent = {}
+            idle = self._idle.setdefault(key, queue.Queue(maxsize=POOL_IDLE_CONNECTIONS))
+        try:
+            db = idle.get_nowait()
+        except queue.Empty:
+            db = self._connect(path, readonly)
+            if db is self.memory_fallback:
+                return db
+        with self._idle_lock:
+            self._lent[db] = key + (os.getpid(),)
+        return db
+
+    def release(self, db):
+        """Return a borrowed connection to the pool, rolling back any transaction it left open."""
+        with self._idle_lock:
+            lent = self._lent.pop(db, None)
+            idle = self._idle.get(lent[:2]) if lent and lent[2] == os.getpid() else None
+        if db.in_transaction:
+            db.rollback()
+        if lent is None:
+            return # The shared in-memory fallback, or borrowed before a fork
+        try:
+            if idle is None:
+                raise queue.Full
+            idle.put_nowait(db)
+        except queue.Full:
+            db.close()
+
+    def _prepare(self, path):
+        # Other threads wait here until the first one has migrated; the
+        # preparing thread's own connection() calls pass straight through.
+        with self._prepare_lock:
+            if path in self._prepared or path in self._preparing:
+                return
+            self._preparing.add(path)
             try:
-                os.makedirs(db_dir, exist_ok=True)
-                print(f"Created database directory: {db_dir}")
-            except Exception as e:
-                print(f"Error creating database directory: {e}")
-        
-        # Try to connect to the database
+                prepare_database(self.connection(path), path)
+                self._prepared.add(path)
+            finally:
+                self._preparing.discard(path)
+
+    def _connect(self, path, readonly):
+        if not readonly:
+            # Ensure the directory exists
+            db_dir = os.path.dirname(path)
+            if not os.path.exists(db_dir):
+                try:
+                    os.makedirs(db_dir, exist_ok=True)
+                    logger.info("Created database directory: %s", db_dir)
+                except Exception as e:
+                    logger.error("Error creating database directory: %s", e)
         try:
-            db = g._database = sqlite3.connect(DATABASE)
-            db.row_factory = sqlite3.Row
-            db.execute("PRAGMA foreign_keys = ON") # Enforce foreign key constraints
-            print(f"Successfully connected to database at: {DATABASE}")
+            db = open_connection(path, readonly)
+            logger.debug("Opened %s database connection to: %s", 'read-only' if readonly else 'read-write', path)
+            return db
         except Exception as e:
-            print(f"Database connection error: {e}")
-            # Fallback to in-memory database if file database fails
-            print("Falling back to in-memory database")
-            db = g._database = sqlite3.connect(':memory:')
+            # Fallback to in-memory database if file database fails; it is shared
+            # by every thread because a private one would be empty.
+            logger.error("Database connection error: %s. Falling back to in-memory database", e)
+            db = sqlite3.connect(':memory:', check_same_thread=False)
             db.row_factory = sqlite3.Row
             db.execute("PRAGMA foreign_keys = ON")
+            register_text_functions(db, ':memory:')
+            self.memory_fallback = db
+            return db
+
+    def close_thread_connections(self):
+        """Close this thread's connections (they are reopened on next use)."""
+        for db in getattr(self._local, 'connections', {}).values():
+            db.close()
+        self._local.connections = {}
+
+db_pool = ConnectionPool()
+
+def get_db():
+    """Read-write connection for the current request."""
+    db = getattr(g, '_database', None)
+    if db is None:
+        db = g._database = db_pool.acquire(database_path())
+    return db
+
+def connection_path():
+    """Database file behind the pooled connections of this process: database_path(), or ':memory:'
+    once the pool has fallen back to its shared in-memory database. Keys per-database caches."""
+    return database_path() if db_pool.memory_fallback is None else ':memory:'
+
+def get_read_db():
+    """Read-only connection for the current request; it never takes the write lock."""
+    db = getattr(g, '_read_database', None)
+    if db is None:
+        db = g._read_database = db_pool.acquire(database_path(), readonly=True)
     return db
 
 @app.teardown_appcontext
 def close_connection(exception):
-    db = getattr(g, '_database', None)
-    if db is not None:
-        db.close()
+    # Pooled connections stay open for the next request, on whichever thread serves it
+    for name in ('_database', '_read_database'):
+        db = g.pop(name, None)
+        if db is not None:
+            db_pool.release(db)
 
-def init_db():
-    """Initializes the database with the new schema."""
-    with app.app_context():
-        db = get_db()
-        cursor = db.cursor()
-        print("Initializing database schema...")
-
-        # Drop existing tables if they exist (for easier re-initialization)
-        # Use with caution in production
-        # cursor.execute("DROP TABLE IF EXISTS featured;")
-        # cursor.execute("DROP TABLE IF EXISTS recommendations;")
-        # cursor.execute("DROP TABLE IF EXISTS skills;")
-        # cursor.execute("DROP TABLE IF EXISTS education;")
-        # cursor.execute("DROP TABLE IF EXISTS experience;")
-        # cursor.execute("DROP TABLE IF EXISTS profiles;")
-
-        # Profiles Table (Core Info)
-        cursor.execute("""
-        CREATE TABLE IF NOT EXISTS profiles (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            linkedin_url TEXT UNIQUE NOT NULL,
-            name TEXT,
-            headline TEXT,
-            location TEXT,
-            about TEXT,
-            profile_pic_url TEXT,
-            banner_pic_url TEXT,
-            followers TEXT,
-            connections TEXT,
-            website TEXT,
-            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
-        );
-        """)
-        print("Created profiles table.")
-
-        # Experience Table
-        cursor.execute("""
-        CREATE TABLE IF NOT EXISTS experience (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            profile_id INTEGER NOT NULL,
-            title TEXT,
-            company_name TEXT,
-            company_linkedin_url TEXT,
-            employment_type TEXT, -- e.g., Full-time, Part-time, Self-employed
-            location TEXT,
-            start_date TEXT,
-            end_date TEXT,
-            duration TEXT,
-            description TEXT,
-            is_multi_role INTEGER DEFAULT 0, -- Flag if part of a multi-role entry
-            parent_experience_id INTEGER, -- Link sub-roles to main company entry
-            FOREIGN KEY (profile_id) REFERENCES profiles (id) ON DELETE CASCADE
-        );
-        """)
-        print("Created experience table.")
-
-        # Education Table
-        cursor.execute("""
-        CREATE TABLE IF NOT EXISTS education (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            profile_id INTEGER NOT NULL,
-            school_name TEXT,
-            school_linkedin_url TEXT,
-            degree_name TEXT,
-            field_of_study TEXT,
-            start_date TEXT,
-            end_date TEXT,
-            grade TEXT,
-            activities TEXT,
-            description TEXT,
-            FOREIGN KEY (profile_id) REFERENCES profiles (id) ON DELETE CASCADE
-        );
-        """)
-        print("Created education table.")
-
-        # Skills Table
-        cursor.execute("""
-        CREATE TABLE IF NOT EXISTS skills (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            profile_id INTEGER NOT NULL,
-            skill_name TEXT NOT NULL,
-            UNIQUE(profile_id, skill_name), -- Avoid duplicate skills per profile
-            FOREIGN KEY (profile_id) REFERENCES profiles (id) ON DELETE CASCADE
-        );
-        """)
-        print("Created skills table.")
-
-        # Recommendations Table (Received)
-        cursor.execute("""
-        CREATE TABLE IF NOT EXISTS recommendations (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            profile_id INTEGER NOT NULL,
-            recommender_name TEXT,
-            recommender_headline TEXT,
-            recommender_linkedin_url TEXT,
-            relationship TEXT,
-            recommendation_text TEXT,
-            FOREIGN KEY (profile_id) REFERENCES profiles (id) ON DELETE CASCADE
-        );
-        """)
-        print("Created recommendations table.")
-
-         # Featured Table
-        cursor.execute("""
-        CREATE TABLE IF NOT EXISTS featured (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            profile_id INTEGER NOT NULL,
-            title TEXT,
-            link TEXT,
-            description TEXT,
-            image_url TEXT,
-            type TEXT, -- e.g., Link, Post, Article
-            FOREIGN KEY (profile_id) REFERENCES profiles (id) ON DELETE CASCADE
+# --- Instrumentation ---
+#
+# Request latency, SQL statement timings and rows written are counted in
+# process memory and served in Prometheus text format at /metrics. Under a
+# multi-process server each worker reports its own numbers. CRM_METRICS=0
+# opens plain connections, removing the per-statement wrapper entirely.
+
+METRICS_ENABLED = os.environ.get('CRM_METRICS', '1') != '0'
+SLOW_REQUEST_MS = float(os.environ.get('CRM_SLOW_REQUEST_MS', 0)) # 0 disables the slow-request log
+SLOW_QUERY_MS = float(os.environ.get('CRM_SLOW_QUERY_MS', 0))     # 0 disables the slow-query log
+# Sampling profiler, started per request by sending an X-CRM-Profile header
+PROFILER_ENABLED = os.environ.get('CRM_PROFILER') == '1'
+PROFILER_INTERVAL_SECONDS = float(os.environ.get('CRM_PROFILER_INTERVAL_MS', 5)) / 1000
+
+REQUEST_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SQL_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1)
+
+METRIC_HELP = {
+    'crm_http_request_duration_seconds': ('histogram', 'Request latency by route, method and status.'),
+    'crm_sql_statement_duration_seconds': ('histogram', 'SQL statement execution time by statement type.'),
+    'crm_sql_rows_written_total': ('counter', 'Rows inserted, updated or deleted, by table.'),
+    'crm_slow_requests_total': ('counter', 'Requests slower than CRM_SLOW_REQUEST_MS.'),
+    'crm_slow_queries_total': ('counter', 'SQL statements slower than CRM_SLOW_QUERY_MS.'),
+    'crm_image_fetches_total': ('counter', 'Picture downloads by the image proxy, by result.'),
+}
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    escape = lambda value: str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return '{' + ','.join(f'{key}="{escape(value)}"' for key, value in labels) + '}'
+
+class Metrics:
+    """Thread-safe counters and histograms keyed by (name, labels); labels is a tuple of pairs."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = collections.defaultdict(float)
+        self.histograms = {} # (name, labels) -> [count per bucket..., count above the last, sum]
+        self.buckets = {}
+
+    def inc(self, name, labels=(), value=1):
+        with self._lock:
+            self.counters[(name, labels)] += value
+
+    def observe(self, name, labels, value, buckets):
+        with self._lock:
+            series = self.histograms.get((name, labels))
+            if series is None:
+                self.buckets[name] = buckets
+                series = self.histograms[(name, labels)] = [0] * (len(buckets) + 1) + [0.0]
+            series[bisect.bisect_left(buckets, value)] += 1
+            series[-1] += value
+
+    def render(self):
+        """Everything recorded so far in the Prometheus text exposition format."""
+        with self._lock:
+            counters = sorted(self.counters.items())
+            histograms = sorted((key, list(series)) for key, series in self.histograms.items())
+        lines = []
+        described = set()
+        def describe(name):
+            if name not in described:
+                described.add(name)
+                kind, text = METRIC_HELP[name]
+                lines.extend([f'# HELP {name} {text}', f'# TYPE {name} {kind}'])
+        for (name, labels), value in counters:
+            describe(name)
+            lines.append(f'{name}{format_labels(labels)} {value:g}')
+        for (name, labels), series in histograms:
+            describe(name)
+            cumulative = 0
+            for bound, count in zip(self.buckets[name] + (float('inf'),), series):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else f'{bound:g}'
+                lines.append(f'{name}_bucket{format_labels(labels + (("le", le),))} {cumulative}')
+            lines.append(f'{name}_sum{format_labels(labels)} {series[-1]:.6f}')
+            lines.append(f'{name}_count{format_labels(labels)} {cumulative}')
+        return '\n'.join(lines) + '\n'
+
+metrics = Metrics()
+
+# Per-thread trace of the request being handled (None outside requests, e.g. the ingest writer)
+request_trace = threading.local()
+
+WRITE_STATEMENT = re.compile(r'\s*(?:INSERT|REPLACE|UPDATE|DELETE)(?:\s+OR\s+\w+)?\s+(?:INTO\s+|FROM\s+)?(\w+)', re.I)
+
+@functools.lru_cache(maxsize=1024)
+def statement_info(sql):
+    """(statement type, table written or None) for a SQL string."""
+    keyword = re.match(r'\s*(\w+)', sql)
+    written = WRITE_STATEMENT.match(sql)
+    return (keyword.group(1).lower() if keyword else 'other'), (written.group(1) if written else None)
+
+def explain_query_plan(db, sql, parameters):
+    """EXPLAIN QUERY PLAN output as indented lines ('' for statements without a plan)."""
+    try:
+        # The base class method skips the instrumented cursor's execute()
+        rows = sqlite3.Connection.execute(db, f"EXPLAIN QUERY PLAN {sql}", parameters).fetchall()
+    except sqlite3.Error:
+        return ''
+    depth = {0: 0}
+    lines = []
+    for node_id, parent, _, detail in rows:
+        depth[node_id] = depth.get(parent, 0) + 1
+        lines.append('  ' * depth[node_id] + detail)
+    return '\n'.join(lines)
+
+def record_statement(cursor, sql, parameters, elapsed):
+    kind, table = statement_info(sql)
+    metrics.observe('crm_sql_statement_duration_seconds', (('statement', kind),), elapsed, SQL_BUCKETS)
+    if table and cursor.rowcount > 0:
+        metrics.inc('crm_sql_rows_written_total', (('table', table),), cursor.rowcount)
+    trace = getattr(request_trace, 'current', None)
+    if trace is not None:
+        trace['statements'] += 1
+        trace['sql_seconds'] += elapsed
+        if trace['slowest'] is None or elapsed > trace['slowest'][0]:
+            trace['slowest'] = (elapsed, sql, parameters, cursor.connection)
+    if SLOW_QUERY_MS and elapsed * 1000 >= SLOW_QUERY_MS:
+        metrics.inc('crm_slow_queries_total')
+        logger.warning("Slow query (%.1f ms): %s\n%s", elapsed * 1000, sql.strip(),
+                       explain_query_plan(cursor.connection, sql, parameters))
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """Cursor that records every statement with record_statement().
+
+    Only execution is timed; for SELECTs that is the first step, not the fetch.
+    """
+
+    def execute(self, sql, parameters=()):
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            record_statement(self, sql, parameters, time.perf_counter() - started)
+
+    def executemany(self, sql, seq_of_parameters):
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            # Only a materialized parameter list can be re-used for EXPLAIN
+            first = seq_of_parameters[0] if isinstance(seq_of_parameters, (list, tuple)) and seq_of_parameters else ()
+            record_statement(self, sql, first, time.perf_counter() - started)
+
+class InstrumentedConnection(sqlite3.Connection):
+    """Connection whose cursors, including the execute() shortcuts, are instrumented."""
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+class SamplingProfiler:
+    """Samples one thread's Python stack at a fixed interval.
+
+    The result is in collapsed-stack format ("outer;inner;leaf count" per
+    line), which flamegraph.pl and speedscope read directly.
+    """
+
+    def __init__(self, thread_id, interval=PROFILER_INTERVAL_SECONDS):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples = collections.Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='crm-profiler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                module = frame.f_globals.get('__name__', os.path.basename(code.co_filename))
+                stack.append(f"{getattr(code, 'co_qualname', code.co_name)} ({module}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if stack:
+                self.samples[';'.join(reversed(stack))] += 1
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        return ''.join(f'{stack} {count}\n' for stack, count in self.samples.most_common())
+
+def profiles_dir():
+    """Directory holding sampling-profiler output, next to the database."""
+    return os.path.join(os.path.dirname(database_path()), 'profiles')
+
+@app.before_request
+def start_request_instrumentation():
+    g.request_started = time.perf_counter()
+    request_trace.current = {'statements': 0, 'sql_seconds': 0.0, 'slowest': None}
+    if PROFILER_ENABLED and 'X-CRM-Profile' in request.headers:
+        stamp = datetime.datetime.now().strftime('%Y%m%d-%H%M%S')
+        g.profile_name = f"{stamp}-{request.endpoint or 'unmatched'}-{uuid.uuid4().hex[:8]}.folded"
+        g.profiler = SamplingProfiler(threading.get_ident()).start()
+
+@app.after_request
+def note_response_status(response):
+    g.response_status = response.status_code
+    if 'profile_name' in g:
+        response.headers['X-CRM-Profile'] = g.profile_name
+    return response
+
+@app.teardown_request
+def finish_request_instrumentation(exception):
+    # Runs after a streamed body has been sent, so exports are timed in full
+    started = g.pop('request_started', None)
+    trace = getattr(request_trace, 'current', None)
+    request_trace.current = None
+    if started is None:
+        return
+    elapsed = time.perf_counter() - started
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    status = g.pop('response_status', 500 if exception else 200)
+    metrics.observe('crm_http_request_duration_seconds',
+                    (('route', route), ('method', request.method), ('status', str(status))),
+                    elapsed, REQUEST_BUCKETS)
+    profiler = g.pop('profiler', None)
+    if profiler is not None:
+        path = os.path.join(profiles_dir(), g.pop('profile_name'))
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'w') as f:
+                f.write(profiler.stop())
+            logger.info("Wrote request profile: %s", path)
+        except OSError as e:
+            logger.error("Could not write request profile %s: %s", path, e)
+    if SLOW_REQUEST_MS and elapsed * 1000 >= SLOW_REQUEST_MS:
+        metrics.inc('crm_slow_requests_total', (('route', route),))
+        message = f"Slow request ({elapsed * 1000:.1f} ms): {request.method} {request.full_path.rstrip('?')} -> {status}"
+        if trace is not None:
+            message += f", {trace['statements']} SQL statements in {trace['sql_seconds'] * 1000:.1f} ms"
+            if trace['slowest'] is not None:
+                slowest_elapsed, sql, parameters, db = trace['slowest']
+                message += f"\nSlowest statement ({slowest_elapsed * 1000:.1f} ms): {sql.strip()}\n"
+                message += explain_query_plan(db, sql, parameters)
+        logger.warning(message)
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Prometheus scrape endpoint."""
+    return app.response_class(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+# --- Schema migrations ---
+#
+# The schema version lives in PRAGMA user_version. Each migration runs once,
+# in order, inside one transaction with the version bump, so a worker that
+# finds the database current does no DDL at all. Databases created before
+# versioning start at 0 and may already contain parts of the schema, so
+# migrations must be idempotent (IF NOT EXISTS, ensure_column). A migration
+# that fills tables through the app's own readers returns that step instead
+# of running it; it runs after the last migration, once the readers' schema
+# exists.
+
+MIGRATIONS = []
+
+def schema_migration(func):
+    """Register a migration; its position in MIGRATIONS is its version number."""
+    MIGRATIONS.append(func)
+    return func
+
+def ensure_column(cursor, table, column, decl):
+    """Add a column to an existing table if it is not there yet."""
+    columns = [row[1] for row in cursor.execute(f"PRAGMA table_info({table})")]
+    if column not in columns:
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {decl}")
+        logger.info("Added column %s.%s", table, column)
+
+@schema_migration
+def create_base_tables(cursor):
+    """Profiles and their related tables."""
+    # Profiles Table (Core Info)
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS profiles (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        linkedin_url TEXT UNIQUE NOT NULL,
+        name TEXT,
+        headline TEXT,
+        location TEXT,
+        about TEXT,
+        profile_pic_url TEXT,
+        banner_pic_url TEXT,
+        followers TEXT,
+        connections TEXT,
+        website TEXT,
+        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+    );
+    """)
+
+    # Experience Table
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS experience (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        profile_id INTEGER NOT NULL,
+        title TEXT,
+        company_name TEXT,
+        company_linkedin_url TEXT,
+        employment_type TEXT, -- e.g., Full-time, Part-time, Self-employed
+        location TEXT,
+        start_date TEXT,
+        end_date TEXT,
+        duration TEXT,
+        description TEXT,
+        is_multi_role INTEGER DEFAULT 0, -- Flag if part of a multi-role entry
+        parent_experience_id INTEGER, -- Link sub-roles to main company entry
+        FOREIGN KEY (profile_id) REFERENCES profiles (id) ON DELETE CASCADE
+    );
+    """)
+
+    # Education Table
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS education (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        profile_id INTEGER NOT NULL,
+        school_name TEXT,
+        school_linkedin_url TEXT,
+        degree_name TEXT,
+        field_of_study TEXT,
+        start_date TEXT,
+        end_date TEXT,
+        grade TEXT,
+        activities TEXT,
+        description TEXT,
+        FOREIGN KEY (profile_id) REFERENCES profiles (id) ON DELETE CASCADE
+    );
+    """)
+
+    # Skills Table
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS skills (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        profile_id INTEGER NOT NULL,
+        skill_name TEXT NOT NULL,
+        UNIQUE(profile_id, skill_name), -- Avoid duplicate skills per profile
+        FOREIGN KEY (profile_id) REFERENCES profiles (id) ON DELETE CASCADE
+    );
+    """)
+
+    # Recommendations Table (Received)
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS recommendations (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        profile_id INTEGER NOT NULL,
+        recommender_name TEXT,
+        recommender_headline TEXT,
+        recommender_linkedin_url TEXT,
+        relationship TEXT,
+        recommendation_text TEXT,
+        FOREIGN KEY (profile_id) REFERENCES profiles (id) ON DELETE CASCADE
+    );
+    """)
+
+    # Featured Table
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS featured (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        profile_id INTEGER NOT NULL,
+        title TEXT,
+        link TEXT,
+        description TEXT,
+        image_url TEXT,
+        type TEXT, -- e.g., Link, Post, Article
+        FOREIGN KEY (profile_id) REFERENCES profiles (id) ON DELETE CASCADE
+    );
+    """)
+
+@schema_migration
+def add_content_hashes(cursor):
+    """Content hashes and ordering used to diff re-saves (see write_profile)."""
+    ensure_column(cursor, 'profiles', 'content_hash', 'TEXT') # Hash of the last saved payload
+    for table in CHILD_TABLES:
+        ensure_column(cursor, table, 'position', 'INTEGER') # Order within the profile as scraped
+        ensure_column(cursor, table, 'row_hash', 'TEXT') # Content hash used to diff re-saves
+
+@schema_migration
+def add_listing_index(cursor):
+    """Keyset pagination index for the listing (see fetch_profile_page)."""
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_profiles_timestamp_id ON profiles (timestamp, id);")
+
+@schema_migration
+def add_search_index(cursor):
+    """Full-text search index; rowid is the profile id (see index_profile_search)."""
+    exists = cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'profile_search'").fetchone()
+    cursor.execute("""
+    CREATE VIRTUAL TABLE IF NOT EXISTS profile_search USING fts5(
+        name, headline, about, location, experience, skills, recommendations,
+        tokenize = 'unicode61 remove_diacritics 2',
+        prefix = '2 3'
+    );
+    """)
+    if not exists:
+        return populate_search_index
+
+@schema_migration
+def add_child_indexes(cursor):
+    """Child lookups by profile in display order.
+
+    skills is already covered by its UNIQUE(profile_id, skill_name) index,
+    which matches its order.
+    """
+    for table in ('experience', 'education', 'recommendations', 'featured'):
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_profile ON {table} (profile_id, position);")
+
+@schema_migration
+def add_ingest_tickets(cursor):
+    """Outcomes of queued saves, written in the same transaction as the profile (see IngestQueue)."""
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS ingest_tickets (
+        ticket TEXT PRIMARY KEY,
+        status TEXT NOT NULL, -- done or failed
+        profile_id INTEGER,
+        error TEXT,
+        created_at DATETIME, -- When the save was queued
+        processed_at DATETIME DEFAULT CURRENT_TIMESTAMP
+    );
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_ingest_tickets_processed ON ingest_tickets (processed_at);")
+
+@schema_migration
+def add_dimension_tables(cursor):
+    """Interned companies, schools and skill names referenced by id from the related tables."""
+    for spec in DIMENSIONS.values():
+        cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {spec['table']} (
+            id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL, -- As first seen, whitespace collapsed
+            name_key TEXT NOT NULL UNIQUE, -- See name_key()
+            linkedin_url TEXT
         );
         """)
-        print("Created featured table.")
+        ensure_column(cursor, spec['child'], spec['fk'], f"INTEGER REFERENCES {spec['table']} (id)")
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_{spec['child']}_{spec['fk']} ON {spec['child']} ({spec['fk']}, profile_id);")
+        backfill_dimension(cursor, spec)
+
+@schema_migration
+def add_duplicate_index(cursor):
+    """URL aliases, the duplicate-detection index and its candidate pairs (see index_profile_duplicates)."""
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS profile_aliases (
+        alias_url TEXT PRIMARY KEY, -- A canonical URL merged into profile_id
+        profile_id INTEGER NOT NULL,
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (profile_id) REFERENCES profiles (id) ON DELETE CASCADE
+    );
+    """)
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS profile_block_keys (
+        block_key TEXT NOT NULL, -- See duplicate_block_keys()
+        profile_id INTEGER NOT NULL,
+        PRIMARY KEY (block_key, profile_id),
+        FOREIGN KEY (profile_id) REFERENCES profiles (id) ON DELETE CASCADE
+    ) WITHOUT ROWID;
+    """)
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS profile_signatures (
+        profile_id INTEGER PRIMARY KEY,
+        signature BLOB NOT NULL, -- MinHash values, see minhash_signature()
+        FOREIGN KEY (profile_id) REFERENCES profiles (id) ON DELETE CASCADE
+    );
+    """)
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS profile_lsh (
+        band INTEGER NOT NULL,
+        bucket INTEGER NOT NULL, -- Hash of the signature values in the band
+        profile_id INTEGER NOT NULL,
+        PRIMARY KEY (band, bucket, profile_id),
+        FOREIGN KEY (profile_id) REFERENCES profiles (id) ON DELETE CASCADE
+    ) WITHOUT ROWID;
+    """)
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS duplicate_candidates (
+        profile_id INTEGER NOT NULL, -- Always the lower id of the pair
+        other_id INTEGER NOT NULL,
+        reason TEXT NOT NULL, -- url, name_company, name_location or content
+        similarity REAL NOT NULL, -- Estimated Jaccard similarity of headline/about/skills
+        status TEXT NOT NULL DEFAULT 'open', -- open or dismissed
+        detected_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (profile_id, other_id),
+        FOREIGN KEY (profile_id) REFERENCES profiles (id) ON DELETE CASCADE,
+        FOREIGN KEY (other_id) REFERENCES profiles (id) ON DELETE CASCADE
+    );
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_profile_aliases_profile ON profile_aliases (profile_id);")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_profile_block_keys_profile ON profile_block_keys (profile_id);")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_profile_lsh_profile ON profile_lsh (profile_id);")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_duplicate_candidates_other ON duplicate_candidates (other_id);")
+    canonicalize_profile_urls(cursor)
 
+@schema_migration
+def add_stats_tables(cursor):
+    """Dashboard aggregates maintained by every save (see update_profile_stats)."""
+    ensure_column(cursor, 'profiles', 'created_at', 'DATETIME') # First save; timestamp is the last one
+    cursor.execute("UPDATE profiles SET created_at = timestamp WHERE created_at IS NULL")
+    for spec in DIMENSIONS.values():
+        ensure_column(cursor, spec['table'], 'profile_count', 'INTEGER NOT NULL DEFAULT 0') # Profiles linked at least once
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_{spec['table']}_profile_count ON {spec['table']} (profile_count);")
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS stats_locations (
+        id INTEGER PRIMARY KEY,
+        name TEXT NOT NULL, -- As first seen, whitespace collapsed
+        name_key TEXT NOT NULL UNIQUE, -- See name_key()
+        profile_count INTEGER NOT NULL DEFAULT 0
+    );
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_stats_locations_profile_count ON stats_locations (profile_count);")
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS stats_daily (
+        day TEXT PRIMARY KEY, -- date(created_at), UTC
+        profiles_added INTEGER NOT NULL DEFAULT 0
+    );
+    """)
+    rebuild_stats(cursor)
+
+@schema_migration
+def add_compressed_text(cursor):
+    """Side table for profiles.about and the dictionaries of compressed text (see TextCodec)."""
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS profile_about (
+        profile_id INTEGER PRIMARY KEY,
+        about TEXT, -- Compressed BLOB or plain TEXT; read with inflate()
+        FOREIGN KEY (profile_id) REFERENCES profiles (id) ON DELETE CASCADE
+    );
+    """)
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS compression_dictionaries (
+        id INTEGER PRIMARY KEY,
+        codec TEXT NOT NULL, -- zlib or zstd
+        dictionary BLOB NOT NULL,
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+    );
+    """)
+    # profiles.about is left in place, always NULL, for older SQLite versions without DROP COLUMN
+    cursor.execute("INSERT OR IGNORE INTO profile_about (profile_id, about) SELECT id, deflate(about) FROM profiles WHERE about IS NOT NULL")
+    cursor.execute("UPDATE profiles SET about = NULL WHERE about IS NOT NULL")
+
+@schema_migration
+def add_profile_history(cursor):
+    """Versions of changed profiles, one per content change (see record_profile_history)."""
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS profile_history (
+        id INTEGER PRIMARY KEY,
+        profile_id INTEGER NOT NULL,
+        version INTEGER NOT NULL, -- 1 is the profile before its first change, then one per change
+        keyframe INTEGER NOT NULL DEFAULT 0, -- 1: snapshot is the whole profile; 0: a delta against the previous version
+        snapshot BLOB NOT NULL, -- JSON, written with deflate()
+        changes TEXT, -- JSON summary of what changed; NULL for the first version
+        changed_at DATETIME NOT NULL,
+        UNIQUE (profile_id, version),
+        FOREIGN KEY (profile_id) REFERENCES profiles (id) ON DELETE CASCADE
+    );
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_profile_history_changed_at ON profile_history (changed_at);")
+
+@schema_migration
+def add_change_sequence(cursor):
+    """Per-save sequence number of profiles, the incremental export's high-water mark (see iter_table_chunks)."""
+    ensure_column(cursor, 'profiles', 'change_seq', 'INTEGER')
+    rows = cursor.execute("SELECT id FROM profiles WHERE change_seq IS NULL ORDER BY timestamp, id").fetchall()
+    start = cursor.execute("SELECT coalesce(max(change_seq), 0) FROM profiles").fetchone()[0]
+    cursor.executemany("UPDATE profiles SET change_seq = ? WHERE id = ?", [(start + number, row[0]) for number, row in enumerate(rows, 1)])
+    cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_profiles_change_seq ON profiles (change_seq);")
+
+@schema_migration
+def use_external_search_content(cursor):
+    """Make profile_search read its text from the profile tables instead of storing a copy (see search_source_sql)."""
+    cursor.execute("DROP TABLE IF EXISTS profile_search")
+    cursor.execute("DROP VIEW IF EXISTS profile_search_source")
+    cursor.execute(f"CREATE VIEW profile_search_source AS {search_source_sql()}")
+    cursor.execute(f"""
+    CREATE VIRTUAL TABLE profile_search USING fts5(
+        {', '.join(SEARCH_COLUMNS)},
+        content = 'profile_search_source',
+        content_rowid = 'id',
+        tokenize = 'unicode61 remove_diacritics 2',
+        prefix = '2 3'
+    );
+    """)
+    return populate_search_index
+
+def migrate_db(db):
+    """Apply pending migrations. Returns how many ran (0 when the schema is current)."""
+    target = len(MIGRATIONS)
+    if db.execute("PRAGMA user_version").fetchone()[0] >= target:
+        return 0
+    cursor = db.cursor()
+    cursor.execute("BEGIN IMMEDIATE")
+    try:
+        # Re-read under the write lock; another worker may have just migrated
+        version = cursor.execute("PRAGMA user_version").fetchone()[0]
+        deferred = []
+        for number in range(version, target):
+            migration = MIGRATIONS[number]
+            logger.info("Applying migration %d: %s", number + 1, migration.__name__)
+            deferred.append(migration(cursor))
+        for step in dict.fromkeys(filter(None, deferred)): # Each step once, in order
+            step(cursor)
+        cursor.execute(f"PRAGMA user_version = {target}")
         db.commit()
-        print("Database initialized successfully.")
+    except Exception:
+        db.rollback()
+        raise
+    return max(0, target - version)
+
+def prepare_database(db, path):
+    """First use of the database in this process: migrate, load text dictionaries, then replay queued saves."""
+    started = time.perf_counter()
+    applied = migrate_db(db)
+    text_codec(path if db is not db_pool.memory_fallback else ':memory:').load(db)
+    migrated = time.perf_counter()
+    replayed = ingest_queue.recover()
+    finished = time.perf_counter()
+    STARTUP_TIMINGS.update({
+        'schema_check_ms': round((migrated - started) * 1000, 2),
+        'migrations_applied': applied,
+        'ingest_recovery_ms': round((finished - migrated) * 1000, 2),
+        'ingest_replayed': replayed,
+        'first_db_use_ms': round((finished - STARTUP_STARTED) * 1000, 2),
+    })
+    logger.info("Startup timings: %s", ', '.join(f"{key}={value}" for key, value in STARTUP_TIMINGS.items()))
+
+def init_db():
+    """Bring the database schema up to date (normally done lazily on first connection)."""
+    migrate_db(db_pool.connection(database_path()))
+
+# Page-size controls for the profile listing
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+PAGE_SIZE_CHOICES = (25, 50, 100, 200)
+
+LISTING_COLUMNS = 'id, name, headline, location, linkedin_url, profile_pic_url, banner_pic_url, timestamp'
+
+def encode_page_cursor(timestamp, profile_id):
+    """Encode a (timestamp, id) keyset position as an opaque URL-safe token."""
+    raw = json.dumps([timestamp, profile_id], separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def decode_page_cursor(token):
+    """Decode a token from encode_page_cursor; raises ValueError if it is malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        timestamp, profile_id = json.loads(raw)
+    except Exception:
+        raise ValueError("Invalid page cursor")
+    if not isinstance(timestamp, str) or not isinstance(profile_id, int) or isinstance(profile_id, bool):
+        raise ValueError("Invalid page cursor")
+    return timestamp, profile_id
+
+def parse_page_size(value):
+    """Clamp a requested page size to 1..MAX_PAGE_SIZE, defaulting when absent or invalid."""
+    try:
+        size = int(value)
+    except (TypeError, ValueError):
+        return DEFAULT_PAGE_SIZE
+    return max(1, min(size, MAX_PAGE_SIZE))
+
+def fetch_profile_page(db, cursor_token=None, page_size=DEFAULT_PAGE_SIZE):
+    """Return one page of profiles, newest first, and the cursor for the next page.
+
+    Uses keyset pagination on (timestamp, id) so every page is a range scan of
+    idx_profiles_timestamp_id, however deep into the list it is.
+    """
+    params = []
+    where = ''
+    if cursor_token:
+        where = 'WHERE (timestamp, id) < (?, ?)'
+        params.extend(decode_page_cursor(cursor_token))
+    # Fetch one extra row to know whether another page exists
+    params.append(page_size + 1)
+    rows = db.execute(f'SELECT {LISTING_COLUMNS} FROM profiles {where} ORDER BY timestamp DESC, id DESC LIMIT ?', params).fetchall()
+    profiles = [dict(row) for row in rows[:page_size]]
+    next_cursor = None
+    if len(rows) > page_size:
+        last = profiles[-1]
+        next_cursor = encode_page_cursor(last['timestamp'], last['id'])
+    return profiles, next_cursor
 
 @app.route('/')
 def index():
-    """Show minimal list of saved profiles."""
-    db = get_db()
-    profiles_data = []
+    """Show a page of saved profiles with minimal data."""
+    db = get_read_db()
+    page_size = parse_page_size(request.args.get('per_page'))
+    cursor_token = request.args.get('cursor')
+    try:
+        profiles_data, next_cursor = fetch_profile_page(db, cursor_token, page_size)
+    except ValueError as e:
+        return render_template('index.html', profiles=[], error=str(e), per_page=page_size, page_sizes=PAGE_SIZE_CHOICES)
+    except sqlite3.Error as e:
+        logger.error("Database error fetching profiles: %s", e)
+        return render_template('index.html', profiles=[], error=f"Database Error: {e}", per_page=page_size, page_sizes=PAGE_SIZE_CHOICES)
+
+    return render_template('index.html', profiles=profiles_data, next_cursor=next_cursor, is_first_page=not cursor_token,
+                           per_page=page_size, page_sizes=PAGE_SIZE_CHOICES)
+
+@app.route('/api/profiles')
+def list_profiles():
+    """JSON listing of profiles, newest first, paginated with ?cursor=&per_page=."""
+    db = get_read_db()
     try:
-        # Fetch all profiles with minimal data (remove industry column which doesn't exist)
-        profiles_cursor = db.execute('SELECT id, name, headline, location, linkedin_url, profile_pic_url, banner_pic_url, timestamp FROM profiles ORDER BY timestamp DESC')
-        profiles = profiles_cursor.fetchall()
-        profiles_data = [dict(profile) for profile in profiles]
+        profiles_data, next_cursor = fetch_profile_page(db, request.args.get('cursor'), parse_page_size(request.args.get('per_page')))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except sqlite3.Error as e:
-        print(f"Database error fetching profiles: {e}")
-        return render_template('index.html', profiles=[], error=f"Database Error: {e}")
+        logger.error("Database error fetching profiles: %s", e)
+        return jsonify({"error": "Database error", "details": str(e)}), 500
+    return jsonify({"profiles": profiles_data, "next_cursor": next_cursor})
+
+# --- Profile detail loading and caching ---
+
+# Bounds for the in-process cache of rendered detail pages and JSON payloads
+PROFILE_CACHE_MAX_ENTRIES = 512
+PROFILE_CACHE_MAX_BYTES = 32 * 1024 * 1024
+
+class LRUCache:
+    """Thread-safe LRU cache bounded by entry count and total value size in bytes."""
+
+    def __init__(self, max_entries, max_bytes):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = collections.OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key, value):
+        """Store bytes under key, evicting least recently used entries to stay in bounds."""
+        size = len(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old)
+            self._entries[key] = value
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
 
-    return render_template('index.html', profiles=profiles_data)
+    def invalidate(self, match):
+        """Drop every entry whose key satisfies match(key)."""
+        with self._lock:
+            for key in [key for key in self._entries if match(key)]:
+                self._bytes -= len(self._entries.pop(key))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+# Keys are (kind, profile_id, version); the version is checked on every hit
+# so an entry can never outlive the row it was built from, even one changed
+# by another worker process.
+profile_cache = LRUCache(PROFILE_CACHE_MAX_ENTRIES, PROFILE_CACHE_MAX_BYTES)
+
+def invalidate_profile_cache(profile_id):
+    """Forget cached pages and payloads for one profile."""
+    profile_cache.invalidate(lambda key: key[1] == profile_id)
+
+def json_object_sql(table, columns, alias):
+    """SQL json_object(...) expression over the given columns of a table alias."""
+    return 'json_object(' + ', '.join(f"'{col}', {column_sql(table, col, alias)}" for col in columns) + ')'
+
+@functools.lru_cache(maxsize=None)
+def profile_graph_sql():
+    """One statement that loads a profile and all its related rows as a JSON document."""
+    child_order = {'skills': 'skill_name'}
+    profile_columns = ('id',) + PROFILE_FIELDS + ('timestamp',)
+    parts = [f"'{col}', {column_sql('profiles', col, 'p')}" for col in profile_columns]
+    for table, columns in CHILD_COLUMNS.items():
+        order = child_order.get(table, 'position, id')
+        # json() restores the JSON subtype, which is lost through a scalar subquery
+        parts.append(f"""'{table}', json((SELECT json_group_array({json_object_sql(table, ('id',) + columns, 'c')})
+                          FROM (SELECT * FROM {table} WHERE profile_id = p.id ORDER BY {order}) c))""")
+    return f"SELECT json_object({', '.join(parts)}) FROM profiles p WHERE p.id = ?"
+
+def load_profile_graph(db, profile_id):
+    """Load a profile with experience, education, skills, recommendations and featured in one query."""
+    row = db.execute(profile_graph_sql(), (profile_id,)).fetchone()
+    if row is None or row[0] is None:
+        return None
+    return json.loads(row[0])
+
+def profile_version(db, profile_id):
+    """Return (etag, last_modified) for a profile, or None if it does not exist."""
+    row = db.execute("SELECT content_hash, timestamp FROM profiles WHERE id = ?", (profile_id,)).fetchone()
+    if row is None:
+        return None
+    etag = content_hash([profile_id, row['content_hash'], row['timestamp']])
+    last_modified = None
+    if row['timestamp']:
+        try:
+            last_modified = datetime.datetime.strptime(row['timestamp'], '%Y-%m-%d %H:%M:%S').replace(tzinfo=datetime.timezone.utc)
+        except ValueError:
+            pass
+    return etag, last_modified
+
+def is_not_modified(etag, last_modified):
+    """True if the request's conditional headers show the client already has this version."""
+    if request.if_none_match:
+        return request.if_none_match.contains(etag)
+    if request.if_modified_since and last_modified:
+        return last_modified <= request.if_modified_since
+    return False
+
+def cached_profile_response(profile_id, kind, build, mimetype):
+    """Serve a profile representation with ETag/Last-Modified, from cache when possible.
+
+    build(db) returns the body as bytes, or None if the profile vanished.
+    Returns None when the profile does not exist.
+    """
+    db = get_read_db()
+    version = profile_version(db, profile_id)
+    if version is None:
+        return None
+    etag, last_modified = version
+
+    if is_not_modified(etag, last_modified):
+        response = app.response_class(status=304)
+    else:
+        key = (kind, profile_id, etag)
+        body = profile_cache.get(key)
+        if body is None:
+            body = build(db)
+            if body is None:
+                return None
+            profile_cache.set(key, body)
+        response = app.response_class(body, mimetype=mimetype)
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    # Let browsers keep a copy but revalidate it on every view
+    response.cache_control.no_cache = True
+    return response
 
 @app.route('/profile/<int:profile_id>')
 def view_profile(profile_id):
     """Show detailed view of a single profile."""
-    db = get_db()
+    def build(db):
+        profile_dict = load_profile_graph(db, profile_id)
+        if profile_dict is None:
+            return None
+        return render_template('index_detailed.html', profiles=[profile_dict]).encode('utf-8')
+
     try:
-        # Fetch the profile
-        profile_cursor = db.execute('SELECT * FROM profiles WHERE id = ?', (profile_id,))
-        profile = profile_cursor.fetchone()
-        
-        if not profile:
-            return render_template('index_detailed.html', profiles=[], error=f"Profile not found")
-        
-        profile_dict = dict(profile)
-        
-        # Fetch related data for the profile
-        exp_cursor = db.execute('SELECT * FROM experience WHERE profile_id = ? ORDER BY id', (profile_id,))
-        profile_dict['experience'] = [dict(row) for row in exp_cursor.fetchall()]
-
-        edu_cursor = db.execute('SELECT * FROM education WHERE profile_id = ? ORDER BY id', (profile_id,))
-        profile_dict['education'] = [dict(row) for row in edu_cursor.fetchall()]
-
-        skills_cursor = db.execute('SELECT * FROM skills WHERE profile_id = ? ORDER BY skill_name', (profile_id,))
-        profile_dict['skills'] = [dict(row) for row in skills_cursor.fetchall()]
-
-        rec_cursor = db.execute('SELECT * FROM recommendations WHERE profile_id = ? ORDER BY id', (profile_id,))
-        profile_dict['recommendations'] = [dict(row) for row in rec_cursor.fetchall()]
-
-        feat_cursor = db.execute('SELECT * FROM featured WHERE profile_id = ? ORDER BY id', (profile_id,))
-        profile_dict['featured'] = [dict(row) for row in feat_cursor.fetchall()]
-
-        return render_template('index_detailed.html', profiles=[profile_dict])
-        
+        response = cached_profile_response(profile_id, 'html', build, 'text/html')
     except sqlite3.Error as e:
-        print(f"Database error fetching profile: {e}")
+        logger.error("Database error fetching profile: %s", e)
         return render_template('index_detailed.html', profiles=[], error=f"Database Error: {e}")
+    if response is None:
+        return render_template('index_detailed.html', profiles=[], error=f"Profile not found"), 404
+    return response
+
+@app.route('/api/profiles/<int:profile_id>')
+def get_profile(profile_id):
+    """JSON document for one profile including all related rows."""
+    def build(db):
+        profile_dict = load_profile_graph(db, profile_id)
+        if profile_dict is None:
+            return None
+        return json.dumps(profile_dict, ensure_ascii=False).encode('utf-8')
+
+    try:
+        response = cached_profile_response(profile_id, 'json', build, 'application/json')
+    except sqlite3.Error as e:
+        logger.error("Database error fetching profile: %s", e)
+        return jsonify({"error": "Database error", "details": str(e)}), 500
+    if response is None:
+        return jsonify({"error": "Profile not found"}), 404
+    return response
+
+REQUIRED_PROFILE_FIELDS = ['name', 'headline', 'linkedin_url']
+
+# Number of profiles grouped into one transaction by /api/save_profiles
+BULK_BATCH_SIZE = 500
+
+PROFILE_FIELDS = ('linkedin_url', 'name', 'headline', 'location', 'about', 'profile_pic_url', 'banner_pic_url', 'followers', 'connections', 'website')
+
+PROFILE_UPSERT_SQL = '''
+    INSERT INTO profiles (linkedin_url, name, headline, location, profile_pic_url, banner_pic_url, followers, connections, website, content_hash, timestamp, created_at, change_seq)
+    VALUES (:linkedin_url, :name, :headline, :location, :profile_pic_url, :banner_pic_url, :followers, :connections, :website, :content_hash, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP,
+            (SELECT coalesce(max(change_seq), 0) + 1 FROM profiles))
+    ON CONFLICT(linkedin_url) DO UPDATE SET
+        name=excluded.name,
+        headline=excluded.headline,
+        location=excluded.location,
+        profile_pic_url=excluded.profile_pic_url,
+        banner_pic_url=excluded.banner_pic_url,
+        followers=excluded.followers,
+        connections=excluded.connections,
+        website=excluded.website,
+        content_hash=excluded.content_hash,
+        timestamp=CURRENT_TIMESTAMP,
+        change_seq=excluded.change_seq;
+'''
+
+def missing_profile_fields(data):
+    """Return the required fields that are absent (or null) in a profile payload."""
+    if not isinstance(data, dict):
+        return list(REQUIRED_PROFILE_FIELDS)
+    return [field for field in REQUIRED_PROFILE_FIELDS if not (field in data and data[field] is not None)]
+
+# Columns written for each related table, in payload order. position and
+# row_hash are maintained by sync_child_rows and are not listed here; the
+# *_id dimension columns are filled by resolve_dimensions.
+CHILD_COLUMNS = {
+    'experience': ('title', 'company_name', 'company_linkedin_url', 'employment_type', 'location', 'start_date', 'end_date', 'duration', 'description', 'is_multi_role', 'parent_experience_id', 'company_id'),
+    'education': ('school_name', 'school_linkedin_url', 'degree_name', 'field_of_study', 'start_date', 'end_date', 'grade', 'activities', 'description', 'school_id'),
+    'skills': ('skill_name', 'skill_id'),
+    'recommendations': ('recommender_name', 'recommender_headline', 'recommender_linkedin_url', 'relationship', 'recommendation_text'),
+    'featured': ('title', 'link', 'description', 'image_url', 'type'),
+}
+CHILD_TABLES = tuple(CHILD_COLUMNS)
+
+LINKEDIN_HOST = re.compile(r'(?:[\w-]+\.)*linkedin\.com', re.I)
+
+def canonical_linkedin_url(url):
+    """Canonical form of a LinkedIn URL, so one person maps to one profiles row.
+
+    Scheme, country/mobile subdomains, query strings, fragments and trailing
+    slashes are normalised, and /in/<vanity> URLs drop locale and sub-page
+    suffixes and are lower-cased. Other URLs are only trimmed.
+    """
+    if not isinstance(url, str):
+        return url
+    url = url.strip()
+    parts = urllib.parse.urlsplit(url if '//' in url else '//' + url)
+    if not LINKEDIN_HOST.fullmatch(parts.hostname or ''):
+        return url
+    segments = [urllib.parse.unquote(segment) for segment in parts.path.split('/') if segment]
+    if len(segments) >= 2 and segments[0].lower() == 'in':
+        segments = ['in', segments[1].lower()]
+    path = '/'.join(urllib.parse.quote(segment, safe='') for segment in segments)
+    return f"https://www.linkedin.com/{path}/" if path else "https://www.linkedin.com/"
+
+def content_hash(value):
+    """Stable short hash of a JSON-serialisable value."""
+    encoded = json.dumps(value, sort_keys=True, separators=(',', ':'), ensure_ascii=False, default=str)
+    return hashlib.blake2b(encoded.encode('utf-8'), digest_size=16).hexdigest()
+
+def normalize_profile(data):
+    """Reduce a payload to exactly what gets stored: (base fields, {table: [row tuples]})."""
+    base = {field: data.get(field) for field in PROFILE_FIELDS}
+    base['linkedin_url'] = canonical_linkedin_url(base['linkedin_url'])
+
+    # Experience (simple check for required fields in each entry)
+    experience = [exp for exp in data.get('experience') or [] if isinstance(exp, dict) and exp.get('title') and exp.get('company_name')]
+    # Education
+    education = [edu for edu in data.get('education') or [] if isinstance(edu, dict) and edu.get('school_name')]
+    # Skills (non-empty strings only, duplicates dropped like the UNIQUE constraint would)
+    skills = list(dict.fromkeys(skill for skill in data.get('skills') or [] if isinstance(skill, str) and skill))
+    # Recommendations (Received)
+    recommendations = [rec for rec in data.get('recommendations') or [] if isinstance(rec, dict) and rec.get('recommender_name') and rec.get('recommendation_text')]
+    # Featured
+    featured = [feat for feat in data.get('featured') or [] if isinstance(feat, dict) and (feat.get('title') or feat.get('description'))]
+
+    def child_row(item, table):
+        # Dimension ids are never taken from the payload
+        return tuple(None if col in DIMENSION_COLUMNS else item.get(col, 0) if col == 'is_multi_role' else item.get(col)
+                     for col in CHILD_COLUMNS[table])
+
+    children = {
+        'experience': [child_row(exp, 'experience') for exp in experience],
+        'education': [child_row(edu, 'education') for edu in education],
+        'skills': [(skill, None) for skill in skills],
+        'recommendations': [child_row(rec, 'recommendations') for rec in recommendations],
+        'featured': [child_row(feat, 'featured') for feat in featured],
+    }
+    return base, children
+
+def sync_child_rows(cursor, table, profile_id, new_rows, is_new=False):
+    """Bring one related table in line with new_rows, touching only rows that differ.
+
+    Existing rows are matched to new rows by content hash. Matches are left
+    alone (or just re-positioned), leftover old rows are rewritten in place
+    with leftover new content, and only the surplus is inserted or deleted.
+    is_new skips looking for rows a new profile cannot have.
+    Returns a dict of inserted/updated/deleted/unchanged counts.
+    """
+    columns = CHILD_COLUMNS[table]
+    counts = {'inserted': 0, 'updated': 0, 'deleted': 0, 'unchanged': 0}
+
+    existing = {}
+    if not is_new:
+        for row_id, row_hash, position in cursor.execute(
+                f"SELECT id, row_hash, position FROM {table} WHERE profile_id = ? ORDER BY position, id", (profile_id,)):
+            existing.setdefault(row_hash, []).append((row_id, position))
+
+    moved = []   # (position, id) for unchanged rows whose order changed
+    added = []   # (position, row_hash, values) for content not stored yet
+    for position, values in enumerate(new_rows):
+        row_hash = content_hash(values)
+        matches = existing.get(row_hash)
+        if matches:
+            row_id, old_position = matches.pop(0)
+            if old_position == position:
+                counts['unchanged'] += 1
+            else:
+                moved.append((position, row_id))
+        else:
+            added.append((position, row_hash, values))
+    stale = [row_id for matches in existing.values() for row_id, _ in matches]
+
+    if moved:
+        cursor.executemany(f"UPDATE {table} SET position = ? WHERE id = ?", moved)
+        counts['updated'] += len(moved)
+
+    # Reuse stale rows for changed content so ids stay stable and pages are rewritten in place.
+    # Skills are skipped: renaming rows one by one can collide with UNIQUE(profile_id, skill_name).
+    reused = list(zip(stale, added)) if table != 'skills' else []
+    if reused:
+        assignments = ', '.join(f"{col} = {value_sql(table, col)}" for col in columns)
+        cursor.executemany(f"UPDATE {table} SET {assignments}, position = ?, row_hash = ? WHERE id = ?",
+                           [values + (position, row_hash, row_id) for row_id, (position, row_hash, values) in reused])
+        counts['updated'] += len(reused)
+
+    to_delete = stale[len(reused):]
+    if to_delete:
+        cursor.executemany(f"DELETE FROM {table} WHERE id = ?", [(row_id,) for row_id in to_delete])
+        counts['deleted'] = len(to_delete)
+
+    to_insert = added[len(reused):]
+    if to_insert:
+        placeholders = ', '.join(['?'] + [value_sql(table, col) for col in columns] + ['?', '?'])
+        cursor.executemany(f"INSERT INTO {table} (profile_id, {', '.join(columns)}, position, row_hash) VALUES ({placeholders})",
+                           [(profile_id,) + values + (position, row_hash) for position, row_hash, values in to_insert])
+        counts['inserted'] = len(to_insert)
+    return counts
+
+def write_profile(cursor, data, batch=None):
+    """Upsert one profile and bring its related rows up to date.
+
+    The caller owns the transaction; nothing is committed here. A payload whose
+    content hash matches the stored one is a no-op, otherwise only the child
+    rows that differ are written (see sync_child_rows). With a WriteBatch the
+    search and duplicate indexes and the statistics are left to its flush().
+    Returns (profile_id, changes) where changes has a 'profile' status
+    ('inserted', 'updated' or 'unchanged') and per-table row counts, plus,
+    when anything was written without a batch, the ids of 'possible_duplicates'.
+    """
+    base, children = normalize_profile(data)
+    cursor.execute("SELECT id, content_hash FROM profiles WHERE linkedin_url = ?", (base['linkedin_url'],))
+    profile_row = cursor.fetchone()
+    if profile_row is None:
+        # A URL that was merged into another profile keeps saving onto that profile
+        merged_into = cursor.execute('''
+            SELECT p.id, p.content_hash, p.linkedin_url FROM profile_aliases a JOIN profiles p ON p.id = a.profile_id
+            WHERE a.alias_url = ?''', (base['linkedin_url'],)).fetchone()
+        if merged_into:
+            profile_row = tuple(merged_into)[:2]
+            base['linkedin_url'] = merged_into[2]
+    profile_hash = content_hash([base, children])
+
+    if profile_row and profile_row[1] == profile_hash:
+        changes = {'profile': 'unchanged'}
+        changes.update({table: {'inserted': 0, 'updated': 0, 'deleted': 0, 'unchanged': len(rows)} for table, rows in children.items()})
+        return profile_row[0], changes
+
+    # 1. Insert or Update Profile (Base Info)
+    if profile_row and (batch is None or profile_row[0] not in batch):
+        unindex_profile_search(cursor, profile_row[0])
+    old_stats = stored_profile_stats(cursor, profile_row[0]) if profile_row else {}
+    latest = latest_history(cursor, profile_row[0]) if profile_row else None
+    cursor.execute(PROFILE_UPSERT_SQL, dict(base, content_hash=profile_hash))
+    if profile_row:
+        profile_id = profile_row[0]
+        days_added = old_stats['days']
+    else:
+        cursor.execute("SELECT id, date(created_at) FROM profiles WHERE linkedin_url = ?", (base['linkedin_url'],))
+        inserted_row = cursor.fetchone()
+        if not inserted_row:
+            raise Exception("Failed to retrieve profile ID after insert/update.")
+        profile_id = inserted_row[0]
+        days_added = {inserted_row[1]}
+    store_profile_about(cursor, profile_id, base['about'])
+
+    # 2. Diff related data against what is stored for this profile_id
+    resolve_dimensions(cursor, children)
+    changes = {'profile': 'updated' if profile_row else 'inserted'}
+    for table in CHILD_TABLES:
+        changes[table] = sync_child_rows(cursor, table, profile_id, children[table], is_new=not profile_row)
+    new_stats = profile_stats(base, children, days_added)
+
+    # 3. Record the new version, and keep the statistics, the full-text and duplicate indexes, the detail cache and the picture cache in step
+    if latest:
+        record_profile_history(cursor, profile_id, latest, base, children)
+    if batch is not None:
+        batch.add(profile_id, base, children, old_stats, new_stats, is_new=not profile_row)
+    else:
+        update_profile_stats(cursor, old_stats, new_stats)
+        index_profile_search(cursor, [profile_id])
+        changes['possible_duplicates'] = index_profile_duplicates(cursor, profile_id, base, children, is_new=not profile_row)
+    invalidate_profile_cache(profile_id)
+    image_cache.stage(base['profile_pic_url'], base['banner_pic_url'])
+    return profile_id, changes
+
+def summarize_changes(changes):
+    """Total the per-table row counts of a write_profile result."""
+    totals = {'inserted': 0, 'updated': 0, 'deleted': 0, 'unchanged': 0}
+    for table in CHILD_TABLES:
+        for key in totals:
+            totals[key] += changes[table][key]
+    return totals
+
+class WriteBatch:
+    """Statistics and search and duplicate index updates of many write_profile() calls.
+
+    Bulk and queued saves pass one to write_profile() and call flush() just
+    before each commit, so those updates cost a few statements per
+    transaction instead of several per profile.
+    """
+
+    def __init__(self):
+        self.profiles = {} # profile id -> (base, children, is_new)
+        self.stats = stats_delta()
+
+    def add(self, profile_id, base, children, old_stats, new_stats, is_new):
+        # A profile saved twice keeps its first is_new: its index rows are only written by flush()
+        if profile_id in self.profiles:
+            is_new = self.profiles[profile_id][2]
+        self.profiles[profile_id] = (base, children, is_new)
+        add_stats_delta(self.stats, old_stats, new_stats)
+
+    def __contains__(self, profile_id):
+        return profile_id in self.profiles
+
+    def flush(self, cursor):
+        """Write everything collected so far and start afresh."""
+        profiles, stats = self.profiles, self.stats
+        self.profiles, self.stats = {}, stats_delta()
+        if not profiles:
+            return
+        apply_stats_delta(cursor, stats)
+        index_profile_search(cursor, list(profiles))
+        index_duplicates(cursor, [(profile_id, base, children, is_new) for profile_id, (base, children, is_new) in profiles.items()])
+
+# --- Queued (write-behind) ingest ---
+
+# 'sync' writes in the request; 'queued' journals the payload and answers 202.
+# A single request can opt in with ?mode=queued or "Prefer: respond-async".
+INGEST_MODE = os.environ.get('CRM_INGEST_MODE', 'sync')
+INGEST_BATCH_SIZE = 200        # Profiles group-committed per writer transaction
+INGEST_LINGER_SECONDS = 0.05   # How long the writer waits to fill a batch
+INGEST_RETRY_SECONDS = 1.0     # Back-off after a failed batch commit
+INGEST_TICKET_RETENTION_DAYS = 7
+
+def ingest_queue_dir():
+    """Directory holding the ingest journals, next to the database."""
+    return os.path.join(os.path.dirname(database_path()), 'ingest_queue')
+
+def pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+class IngestQueue:
+    """Durable write-behind queue for profile saves.
+
+    enqueue() appends the payload to this process's append-only journal and
+    fsyncs it before the request is answered, so an accepted save survives a
+    crash. One background thread drains the queue in group-committed batches
+    and records each ticket's outcome in ingest_tickets inside the same
+    transaction as the profile rows, which makes replays idempotent. A batch
+    that fails with anything but a (retried) database error has all its
+    tickets recorded as failed. The journal is truncated whenever everything
+    in it has been committed.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._pending = set()
+        self._unrecorded = {} # ticket -> error of failures ingest_tickets could not take either
+        self._thread = None
+        self._journal = None
+        self._journal_pid = None
+        self._last_prune = 0
+
+    def journal_path(self):
+        return os.path.join(ingest_queue_dir(), f'journal-{os.getpid()}.ndjson')
+
+    def _open_journal(self):
+        # Re-open after a fork so each process appends to its own journal
+        if self._journal is None or self._journal_pid != os.getpid():
+            os.makedirs(ingest_queue_dir(), exist_ok=True)
+            self._journal = open(self.journal_path(), 'ab')
+            self._journal_pid = os.getpid()
+            self._pending = set()
+            self._queue = queue.Queue()
+            self._thread = None
+        return self._journal
+
+    def enqueue(self, data, ticket=None, queued_at=None):
+        """Journal a validated payload and queue it for the writer. Returns the ticket id."""
+        ticket = ticket or uuid.uuid4().hex
+        queued_at = queued_at or datetime.datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')
+        entry = {'ticket': ticket, 'queued_at': queued_at, 'payload': data}
+        line = json.dumps(entry, separators=(',', ':'), ensure_ascii=False).encode('utf-8') + b'\n'
+        with self._lock:
+            journal = self._open_journal()
+            journal.write(line)
+            journal.flush()
+            os.fsync(journal.fileno())
+            self._pending.add(ticket)
+            self._queue.put((ticket, queued_at, data))
+            self._ensure_writer()
+        return ticket
+
+    def is_pending(self, ticket):
+        with self._lock:
+            return ticket in self._pending
+
+    def unrecorded_failure(self, ticket):
+        with self._lock:
+            return self._unrecorded.get(ticket)
+
+    def _ensure_writer(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name='ingest-writer', daemon=True)
+            self._thread.start()
+
+    def _next_batch(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + INGEST_LINGER_SECONDS
+        while len(batch) < INGEST_BATCH_SIZE:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            while True:
+                try:
+                    self._write_batch(batch)
+                except sqlite3.Error as e:
+                    logger.warning("Ingest writer: batch of %d failed, retrying: %s", len(batch), e)
+                    time.sleep(INGEST_RETRY_SECONDS)
+                    continue
+                except Exception as e:
+                    # Not retryable; retrying would block every save queued behind this batch
+                    logger.exception("Ingest writer: batch of %d failed: %s", len(batch), e)
+                    self._fail_batch(batch, e)
+                break
+            with self._lock:
+                self._pending.difference_update(ticket for ticket, _, _ in batch)
+                if not self._pending and self._journal is not None:
+                    # Everything journaled so far is committed; start the journal afresh
+                    self._journal.truncate(0)
+
+    def _write_batch(self, batch):
+        db = db_pool.connection(database_path())
+        cursor = db.cursor()
+        try:
+            cursor.execute("BEGIN IMMEDIATE")
+            tickets = [ticket for ticket, _, _ in batch]
+            done = {row[0] for row in cursor.execute(
+                f"SELECT ticket FROM ingest_tickets WHERE ticket IN ({', '.join('?' for _ in tickets)})", tickets)}
+            outcomes = []
+            side_work = WriteBatch()
+            for ticket, queued_at, data in batch:
+                if ticket in done:
+                    continue # Already written before a crash or by a duplicate replay
+                mark = open_savepoint(cursor, 'ingest_item')
+                try:
+                    profile_id, _ = write_profile(cursor, data, side_work)
+                except Exception as e:
+                    rollback_savepoint(cursor, 'ingest_item', mark)
+                    outcomes.append((ticket, 'failed', None, str(e), queued_at))
+                else:
+                    outcomes.append((ticket, 'done', profile_id, None, queued_at))
+                cursor.execute("RELEASE ingest_item")
+            cursor.executemany("INSERT INTO ingest_tickets (ticket, status, profile_id, error, created_at) VALUES (?, ?, ?, ?, ?)", outcomes)
+            side_work.flush(cursor)
+            commit_write(db)
+        except Exception:
+            rollback_write(db)
+            raise
+        logger.debug("Ingest writer: committed %d queued profiles.", len(outcomes))
+        self._prune_tickets(db)
+
+    def _fail_batch(self, batch, error):
+        """Record every ticket of a batch that was rolled back as failed."""
+        outcomes = [(ticket, 'failed', None, f"Batch failed: {error}", queued_at) for ticket, queued_at, _ in batch]
+        db = db_pool.connection(database_path())
+        try:
+            # Tickets written before a crash keep their outcome
+            db.executemany("INSERT OR IGNORE INTO ingest_tickets (ticket, status, profile_id, error, created_at) VALUES (?, ?, ?, ?, ?)", outcomes)
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logger.error("Ingest writer: could not record %d failed tickets: %s", len(outcomes), e)
+            with self._lock:
+                self._unrecorded.update((ticket, message) for ticket, _, _, message, _ in outcomes)
+
+    def _prune_tickets(self, db):
+        if time.monotonic() - self._last_prune < 3600:
+            return
+        self._last_prune = time.monotonic()
+        db.execute("DELETE FROM ingest_tickets WHERE processed_at < datetime('now', ?)", (f'-{INGEST_TICKET_RETENTION_DAYS} days',))
+        db.commit()
+
+    def recover(self):
+        """Replay journal entries left behind by processes that are no longer running.
+
+        Each orphaned journal is re-journaled into this process (skipping
+        tickets that were already committed) before it is deleted, so a crash
+        part-way through recovery loses nothing.
+        """
+        queue_dir = ingest_queue_dir()
+        if not os.path.isdir(queue_dir):
+            return 0
+        db = db_pool.connection(database_path())
+        replayed = 0
+        for name in sorted(os.listdir(queue_dir)):
+            match = re.fullmatch(r'journal-(\d+)\.ndjson', name)
+            if not match:
+                continue
+            pid = int(match.group(1))
+            if pid != os.getpid() and pid_alive(pid):
+                continue
+            if pid == os.getpid() and self._journal_pid == pid:
+                continue
+            path = os.path.join(queue_dir, name)
+            claimed = os.path.join(queue_dir, f'recovering-{os.getpid()}-{name}')
+            try:
+                os.rename(path, claimed)
+            except OSError:
+                continue # Another worker claimed it first
+            entries = []
+            with open(claimed, 'rb') as journal:
+                for line in journal:
+                    try:
+                        entries.append(json.loads(line))
+                    except ValueError:
+                        continue # Torn final line from a crash mid-append
+            committed = set()
+            if entries:
+                tickets = [entry['ticket'] for entry in entries]
+                for start in range(0, len(tickets), 500):
+                    chunk = tickets[start:start + 500]
+                    committed.update(row[0] for row in db.execute(
+                        f"SELECT ticket FROM ingest_tickets WHERE ticket IN ({', '.join('?' for _ in chunk)})", chunk))
+            for entry in entries:
+                if entry['ticket'] not in committed:
+                    self.enqueue(entry['payload'], ticket=entry['ticket'], queued_at=entry.get('queued_at'))
+                    replayed += 1
+            os.remove(claimed)
+        if replayed:
+            logger.info("Ingest queue: replayed %d unprocessed journal entries.", replayed)
+        return replayed
+
+ingest_queue = IngestQueue()
+
+def wants_queued_ingest():
+    """Whether this save should go through the write-behind queue."""
+    mode = request.args.get('mode', INGEST_MODE)
+    return mode == 'queued' or 'respond-async' in request.headers.get('Prefer', '')
+
+@app.route('/api/ingest_status/<ticket>')
+def ingest_status(ticket):
+    """Outcome of a queued save: queued, done (with profile_id) or failed (with error)."""
+    row = get_read_db().execute("SELECT status, profile_id, error, created_at, processed_at FROM ingest_tickets WHERE ticket = ?", (ticket,)).fetchone()
+    if row is not None:
+        return jsonify(dict(row, ticket=ticket))
+    if ingest_queue.is_pending(ticket):
+        return jsonify({"ticket": ticket, "status": "queued"})
+    error = ingest_queue.unrecorded_failure(ticket)
+    if error is not None:
+        return jsonify({"ticket": ticket, "status": "failed", "error": error})
+    return jsonify({"error": "Unknown ticket", "ticket": ticket}), 404
 
 @app.route('/api/save_profile', methods=['POST'])
 def save_profile():
@@ -250,199 +1682,2084 @@ def save_profile():
     data = request.get_json()
     # print("Received data:", json.dumps(data, indent=2)) # Extensive Debugging
 
-    required_fields = ['name', 'headline', 'linkedin_url']
-    if not all(field in data and data[field] is not None for field in required_fields):
-        missing = [field for field in required_fields if not (field in data and data[field] is not None)]
-        print(f"Missing required fields: {missing}")
+    missing = missing_profile_fields(data)
+    if missing:
+        logger.info("Missing required fields: %s", missing)
         return jsonify({"error": "Missing required fields", "missing": missing}), 400
 
+    if wants_queued_ingest():
+        ticket = ingest_queue.enqueue(data)
+        return jsonify({"success": True, "queued": True, "message": "Profile queued for saving.",
+                        "ticket": ticket, "status_url": f"/api/ingest_status/{ticket}"}), 202
+
     db = get_db()
     cursor = db.cursor()
     profile_id = None
 
     try:
         # --- Start Transaction ---
-        cursor.execute("BEGIN")
-
-        # 1. Insert or Update Profile (Base Info)
-        profile_base_sql = '''
-            INSERT INTO profiles (linkedin_url, name, headline, location, about, profile_pic_url, banner_pic_url, followers, connections, website, timestamp)
-            VALUES (:linkedin_url, :name, :headline, :location, :about, :profile_pic_url, :banner_pic_url, :followers, :connections, :website, CURRENT_TIMESTAMP)
-            ON CONFLICT(linkedin_url) DO UPDATE SET
-                name=excluded.name,
-                headline=excluded.headline,
-                location=excluded.location,
-                about=excluded.about,
-                profile_pic_url=excluded.profile_pic_url,
-                banner_pic_url=excluded.banner_pic_url,
-                followers=excluded.followers,
-                connections=excluded.connections,
-                website=excluded.website,
-                timestamp=CURRENT_TIMESTAMP;
-        '''
-        profile_base_data = {
-            'linkedin_url': data.get('linkedin_url'),
-            'name': data.get('name'),
-            'headline': data.get('headline'),
-            'location': data.get('location'),
-            'about': data.get('about'),
-            'profile_pic_url': data.get('profile_pic_url'),
-            'banner_pic_url': data.get('banner_pic_url'),
-            'followers': data.get('followers'),
-            'connections': data.get('connections'),
-            'website': data.get('website')
-        }
-        cursor.execute(profile_base_sql, profile_base_data)
-
-        # Get the ID of the inserted/updated profile
-        cursor.execute("SELECT id FROM profiles WHERE linkedin_url = ?", (data['linkedin_url'],))
-        profile_row = cursor.fetchone()
-        if not profile_row:
-             raise Exception("Failed to retrieve profile ID after insert/update.")
-        profile_id = profile_row['id']
-        print(f"Profile ID: {profile_id}")
-
-        # 2. Clear existing related data for this profile_id
-        cursor.execute("DELETE FROM experience WHERE profile_id = ?", (profile_id,))
-        cursor.execute("DELETE FROM education WHERE profile_id = ?", (profile_id,))
-        cursor.execute("DELETE FROM skills WHERE profile_id = ?", (profile_id,))
-        cursor.execute("DELETE FROM recommendations WHERE profile_id = ?", (profile_id,))
-        cursor.execute("DELETE FROM featured WHERE profile_id = ?", (profile_id,))
-        print("Cleared old related data.")
-
-        # 3. Insert Experience
-        exp_sql = '''INSERT INTO experience (profile_id, title, company_name, company_linkedin_url, employment_type, location, start_date, end_date, duration, description, is_multi_role, parent_experience_id)
-                     VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)'''
-        if data.get('experience'):
-            for exp in data['experience']:
-                # Simple check for required fields in experience entry
-                if exp.get('title') and exp.get('company_name'):
-                    cursor.execute(exp_sql, (
-                        profile_id,
-                        exp.get('title'),
-                        exp.get('company_name'),
-                        exp.get('company_linkedin_url'),
-                        exp.get('employment_type'),
-                        exp.get('location'),
-                        exp.get('start_date'),
-                        exp.get('end_date'),
-                        exp.get('duration'),
-                        exp.get('description'),
-                        exp.get('is_multi_role', 0),
-                        exp.get('parent_experience_id') # This needs careful handling in scraping logic
-                    ))
-            print(f"Inserted {len(data['experience'])} experience entries.")
-
-        # 4. Insert Education
-        edu_sql = '''INSERT INTO education (profile_id, school_name, school_linkedin_url, degree_name, field_of_study, start_date, end_date, grade, activities, description)
-                     VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)'''
-        if data.get('education'):
-             for edu in data['education']:
-                 if edu.get('school_name'): # Basic check
-                     cursor.execute(edu_sql, (
-                         profile_id,
-                         edu.get('school_name'),
-                         edu.get('school_linkedin_url'),
-                         edu.get('degree_name'),
-                         edu.get('field_of_study'),
-                         edu.get('start_date'),
-                         edu.get('end_date'),
-                         edu.get('grade'),
-                         edu.get('activities'),
-                         edu.get('description')
-                     ))
-             print(f"Inserted {len(data['education'])} education entries.")
-
-        # 5. Insert Skills
-        skill_sql = 'INSERT INTO skills (profile_id, skill_name) VALUES (?, ?)'
-        if data.get('skills'):
-            for skill in data['skills']:
-                if isinstance(skill, str) and skill: # Ensure it's a non-empty string
-                     # Use INSERT OR IGNORE to handle potential duplicates from UNIQUE constraint
-                     cursor.execute('INSERT OR IGNORE INTO skills (profile_id, skill_name) VALUES (?, ?)', (profile_id, skill))
-            print(f"Inserted/ignored {len(data['skills'])} skill entries.")
-
-        # 6. Insert Recommendations (Received)
-        rec_sql = '''INSERT INTO recommendations (profile_id, recommender_name, recommender_headline, recommender_linkedin_url, relationship, recommendation_text)
-                     VALUES (?, ?, ?, ?, ?, ?)'''
-        if data.get('recommendations'):
-             for rec in data['recommendations']:
-                 if rec.get('recommender_name') and rec.get('recommendation_text'): # Basic check
-                     cursor.execute(rec_sql, (
-                         profile_id,
-                         rec.get('recommender_name'),
-                         rec.get('recommender_headline'),
-                         rec.get('recommender_linkedin_url'),
-                         rec.get('relationship'),
-                         rec.get('recommendation_text')
-                     ))
-             print(f"Inserted {len(data['recommendations'])} recommendation entries.")
-
-        # 7. Insert Featured
-        feat_sql = '''INSERT INTO featured (profile_id, title, link, description, image_url, type)
-                      VALUES (?, ?, ?, ?, ?, ?)'''
-        if data.get('featured'):
-            for feat in data['featured']:
-                if feat.get('title') or feat.get('description'): # Basic check
-                    cursor.execute(feat_sql, (
-                        profile_id,
-                        feat.get('title'),
-                        feat.get('link'),
-                        feat.get('description'),
-                        feat.get('image_url'),
-                        feat.get('type')
-                    ))
-            print(f"Inserted {len(data['featured'])} featured entries.")
-
+        cursor.execute("BEGIN IMMEDIATE")
+        profile_id, changes = write_profile(cursor, data)
+        logger.debug("Profile ID: %s (%s)", profile_id, changes['profile'])
 
         # --- Commit Transaction ---
-        db.commit()
-        print("Transaction committed.")
-        return jsonify({"success": True, "message": "Profile saved/updated successfully.", "profile_id": profile_id}), 201
+        commit_write(db)
+        changes['total'] = summarize_changes(changes)
+        message = "Profile unchanged." if changes['profile'] == 'unchanged' else "Profile saved/updated successfully."
+        return jsonify({"success": True, "message": message, "profile_id": profile_id, "changes": changes}), 201
 
     except sqlite3.Error as e:
-        db.rollback() # Rollback on error
-        print(f"Database error during save: {e}")
-        print(f"Failed SQL Data (example): {profile_base_data if 'profile_base_data' in locals() else 'N/A'}")
+        rollback_write(db) # Rollback on error
+        logger.error("Database error during save of %s: %s", data.get('linkedin_url'), e)
         return jsonify({"error": "Database error", "details": str(e)}), 500
     except Exception as e:
-        db.rollback() # Rollback on unexpected error
-        print(f"An unexpected error occurred: {e}")
-        import traceback
-        traceback.print_exc()
+        rollback_write(db) # Rollback on unexpected error
+        logger.exception("An unexpected error occurred: %s", e)
         return jsonify({"error": "An unexpected server error occurred", "details": str(e)}), 500
 
-@app.route('/download-extension')
-def download_extension():
-    """Create a zip file of the extension directory and send it for download."""
+def iter_bulk_payload():
+    """Yield (index, profile, parse_error) for each record in a bulk request body.
+
+    Accepts either a JSON array (optionally wrapped as {"profiles": [...]}) or an
+    NDJSON stream (one profile per line). NDJSON is read line by line from the
+    request stream, so large uploads are never held in memory as one document.
+    """
+    if request.mimetype in ('application/x-ndjson', 'application/ndjson', 'application/jsonl'):
+        index = 0
+        for raw_line in request.stream:
+            line = raw_line.strip()
+            if not line:
+                continue
+            try:
+                yield index, json.loads(line), None
+            except ValueError as e:
+                yield index, None, f"Invalid JSON: {e}"
+            index += 1
+        return
+
+    data = request.get_json(silent=True)
+    if isinstance(data, dict):
+        data = data.get('profiles')
+    if not isinstance(data, list):
+        raise ValueError("Request must be a JSON array of profiles or an NDJSON stream")
+    for index, item in enumerate(data):
+        yield index, item, None
+
+@app.route('/api/save_profiles', methods=['POST'])
+def save_profiles():
+    """Save many profiles in one request.
+
+    Profiles are grouped BULK_BATCH_SIZE to a transaction and each one runs
+    inside its own SAVEPOINT, so a bad record is rolled back and reported
+    without aborting the rest of the batch. A batch is read in full before
+    its transaction starts, so a slow upload never holds the write lock.
+    Statistics and the search and duplicate indexes are brought up to date
+    once per transaction (WriteBatch).
+    """
+    db = get_db()
+    cursor = db.cursor()
+    results = []
+    pending = [] # Results for the batch being read or written
+    batch = [] # (result, profile) read but not yet written
+    side_work = WriteBatch()
+
+    def write_batch():
+        if batch:
+            cursor.execute("BEGIN IMMEDIATE")
+            for result, data in batch:
+                mark = open_savepoint(cursor, 'bulk_item')
+                try:
+                    profile_id, changes = write_profile(cursor, data, side_work)
+                except Exception as e:
+                    rollback_savepoint(cursor, 'bulk_item', mark)
+                    cursor.execute("RELEASE bulk_item")
+                    error = "Database error" if isinstance(e, sqlite3.Error) else "Invalid profile"
+                    result.update({"success": False, "error": error, "details": str(e)})
+                    continue
+                cursor.execute("RELEASE bulk_item")
+                result.update({"success": True, "profile_id": profile_id, "status": changes['profile']})
+            batch.clear()
+            try:
+                side_work.flush(cursor)
+                commit_write(db)
+            except sqlite3.Error as e:
+                rollback_write(db)
+                logger.error("Database error committing bulk batch: %s", e)
+                fail_batch("Database error", e)
+        results.extend(pending)
+        pending.clear()
+
+    def fail_batch(error, exc):
+        # Everything in the open batch was rolled back together, or never written
+        for result in pending:
+            if result.get('success', True):
+                result.update({"success": False, "error": error, "details": str(exc)})
+                result.pop('profile_id', None)
+                result.pop('status', None)
+
+    try:
+        for index, data, parse_error in iter_bulk_payload():
+            if parse_error:
+                pending.append({"index": index, "success": False, "error": parse_error})
+                continue
+            missing = missing_profile_fields(data)
+            if missing:
+                pending.append({"index": index, "success": False, "error": "Missing required fields", "missing": missing})
+                continue
+            result = {"index": index}
+            pending.append(result)
+            batch.append((result, data))
+            if len(batch) >= BULK_BATCH_SIZE:
+                write_batch()
+        write_batch()
+    except ValueError as e:
+        rollback_write(db)
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        rollback_write(db)
+        logger.exception("An unexpected error occurred during bulk save: %s", e)
+        fail_batch("Batch aborted", e)
+        results.extend(pending)
+
+    saved = sum(1 for result in results if result['success'])
+    logger.info("Bulk save: %d/%d profiles saved.", saved, len(results))
+    return jsonify({
+        "success": saved == len(results),
+        "total": len(results),
+        "saved": saved,
+        "failed": len(results) - saved,
+        "results": results,
+    }), 200
+
+# --- Interned companies, schools and skills ---
+
+# Dimension tables referenced by related rows. Each maps the name used in
+# URLs to a singular label for responses, the dimension table, and the
+# related table's name, URL and foreign key columns.
+DIMENSIONS = {
+    'companies': {'label': 'company', 'table': 'companies', 'child': 'experience', 'name': 'company_name', 'url': 'company_linkedin_url', 'fk': 'company_id'},
+    'schools': {'label': 'school', 'table': 'schools', 'child': 'education', 'name': 'school_name', 'url': 'school_linkedin_url', 'fk': 'school_id'},
+    'skills': {'label': 'skill', 'table': 'skill_names', 'child': 'skills', 'name': 'skill_name', 'url': None, 'fk': 'skill_id'},
+}
+DIMENSION_COLUMNS = {spec['fk'] for spec in DIMENSIONS.values()}
+DIMENSION_CACHE_SIZE = 100000 # Names cached per dimension
+
+def name_key(name):
+    """Normalised lookup key for a company, school or skill name."""
+    return ' '.join(str(name).split()).casefold() if name else ''
+
+class DimensionInterner:
+    """Resolves names to ids in one dimension table through an in-process LRU cache.
+
+    Ids seen inside a transaction are held back per thread and only cached
+    by publish() after the commit, once they are confirmed to exist, so a
+    rolled-back insert (whole transaction or one SAVEPOINT) is never cached.
+    Both are kept per database file (see connection_path()).
+    """
+
+    def __init__(self, table, max_entries=DIMENSION_CACHE_SIZE):
+        self.table = table
+        self.max_entries = max_entries
+        self._caches = {} # Database path -> OrderedDict of name key -> id
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _pending(self):
+        if not hasattr(self._local, 'pending'):
+            self._local.pending = {}
+        return self._local.pending.setdefault(connection_path(), {})
+
+    def resolve(self, cursor, name, linkedin_url=None):
+        """Return the id for name, inserting it if new; None for an empty name."""
+        key = name_key(name)
+        if not key:
+            return None
+        with self._lock:
+            cache = self._caches.get(connection_path(), {})
+            dim_id = cache.get(key)
+            if dim_id is not None:
+                cache.move_to_end(key)
+                return dim_id
+        pending = self._pending()
+        if key in pending:
+            return pending[key]
+        row = cursor.execute(f"SELECT id FROM {self.table} WHERE name_key = ?", (key,)).fetchone()
+        if row:
+            dim_id = row[0]
+        else:
+            cursor.execute(f"INSERT INTO {self.table} (name, name_key, linkedin_url) VALUES (?, ?, ?)", (' '.join(str(name).split()), key, linkedin_url))
+            dim_id = cursor.lastrowid
+        pending[key] = dim_id
+        return dim_id
+
+    def publish(self, db):
+        """After a commit: cache the ids this thread saw that really were committed."""
+        pending = self._pending()
+        if not pending:
+            return
+        items = list(pending.items())
+        pending.clear()
+        confirmed = []
+        for start in range(0, len(items), 500):
+            chunk = dict(items[start:start + 500])
+            rows = db.execute(f"SELECT id, name_key FROM {self.table} WHERE id IN ({', '.join('?' for _ in chunk)})", list(chunk.values()))
+            confirmed.extend((key, dim_id) for dim_id, key in rows if chunk.get(key) == dim_id)
+        with self._lock:
+            cache = self._caches.setdefault(connection_path(), collections.OrderedDict())
+            for key, dim_id in confirmed:
+                cache[key] = dim_id
+                cache.move_to_end(key)
+            while len(cache) > self.max_entries:
+                cache.popitem(last=False)
+
+    def discard(self):
+        """After a rollback: forget ids seen in the transaction."""
+        self._pending().clear()
+
+    def mark(self):
+        """Position to return to with rollback_to() when a SAVEPOINT is rolled back."""
+        return len(self._pending())
+
+    def rollback_to(self, mark):
+        """After ROLLBACK TO: forget ids seen since mark() so a reused rowid is never taken for them."""
+        pending = self._pending()
+        for key in list(pending)[mark:]:
+            del pending[key]
+
+interners = {dimension: DimensionInterner(spec['table']) for dimension, spec in DIMENSIONS.items()}
+
+def resolve_dimensions(cursor, children):
+    """Fill the company_id/school_id/skill_id columns of normalised child rows."""
+    for dimension, spec in DIMENSIONS.items():
+        columns = CHILD_COLUMNS[spec['child']]
+        name_index = columns.index(spec['name'])
+        url_index = columns.index(spec['url']) if spec['url'] else None
+        fk_index = columns.index(spec['fk'])
+        interner = interners[dimension]
+        children[spec['child']] = [
+            row[:fk_index] + (interner.resolve(cursor, row[name_index], row[url_index] if url_index is not None else None),) + row[fk_index + 1:]
+            for row in children[spec['child']]
+        ]
+
+def commit_write(db):
+    """Commit a write transaction, then publish what it made safe to cache and download its pictures."""
+    db.commit()
+    for interner in interners.values():
+        interner.publish(db)
+    image_cache.publish()
+
+def rollback_write(db):
+    """Roll back a write transaction and drop anything it staged for caching."""
+    db.rollback()
+    for interner in interners.values():
+        interner.discard()
+    image_cache.discard()
+
+def open_savepoint(cursor, name):
+    """Open a SAVEPOINT for one item of a batch; returns the mark rollback_savepoint() needs."""
+    cursor.execute(f"SAVEPOINT {name}")
+    return [interner.mark() for interner in interners.values()], image_cache.mark()
+
+def rollback_savepoint(cursor, name, mark):
+    """Roll back to a SAVEPOINT and drop what was staged for caching since it was opened."""
+    cursor.execute(f"ROLLBACK TO {name}")
+    interner_marks, image_mark = mark
+    for interner, interner_mark in zip(interners.values(), interner_marks):
+        interner.rollback_to(interner_mark)
+    image_cache.rollback_to(image_mark)
+
+def backfill_dimension(cursor, spec, chunk_size=5000):
+    """Intern every name in an existing related table and set its foreign key."""
+    child, table = spec['child'], spec['table']
+    url_column = spec['url'] or 'NULL'
+    known = {}
+    last_id = 0
+    while True:
+        rows = cursor.execute(f"SELECT id, {spec['name']}, {url_column} FROM {child} WHERE id > ? ORDER BY id LIMIT ?", (last_id, chunk_size)).fetchall()
+        if not rows:
+            return
+        updates = []
+        for row_id, name, url in rows:
+            key = name_key(name)
+            if not key:
+                continue
+            if key not in known:
+                found = cursor.execute(f"SELECT id FROM {table} WHERE name_key = ?", (key,)).fetchone()
+                if found:
+                    known[key] = found[0]
+                else:
+                    cursor.execute(f"INSERT INTO {table} (name, name_key, linkedin_url) VALUES (?, ?, ?)", (' '.join(str(name).split()), key, url))
+                    known[key] = cursor.lastrowid
+            updates.append((known[key], row_id))
+        cursor.executemany(f"UPDATE {child} SET {spec['fk']} = ? WHERE id = ?", updates)
+        last_id = rows[-1][0]
+
+@app.route('/api/<any(companies, schools, skills):dimension>')
+def list_dimension(dimension):
+    """Find company, school or skill ids by name prefix: /api/companies?q=acme."""
+    spec = DIMENSIONS[dimension]
+    prefix = name_key(request.args.get('q', ''))
+    page_size = parse_page_size(request.args.get('per_page'))
+    rows = get_read_db().execute(f"SELECT id, name, linkedin_url FROM {spec['table']} WHERE name_key >= ? AND name_key < ? ORDER BY name_key LIMIT ?",
+                                 (prefix, prefix + '\uffff', page_size)).fetchall()
+    return jsonify({dimension: [dict(row) for row in rows]})
+
+@app.route('/api/<any(companies, schools, skills):dimension>/<int:dim_id>/profiles')
+def dimension_profiles(dimension, dim_id):
+    """Profiles linked to one company, school or skill, in id order: ?cursor=<last id>&per_page=."""
+    spec = DIMENSIONS[dimension]
+    db = get_read_db()
+    entry = db.execute(f"SELECT id, name, linkedin_url FROM {spec['table']} WHERE id = ?", (dim_id,)).fetchone()
+    if entry is None:
+        return jsonify({"error": f"Unknown {dimension} id"}), 404
+    page_size = parse_page_size(request.args.get('per_page'))
+    try:
+        after = int(request.args.get('cursor', 0))
+    except ValueError:
+        return jsonify({"error": "Invalid page cursor"}), 400
+    # Walks idx_<child>_<fk> (fk, profile_id), so cost is proportional to the page, not the table
+    rows = db.execute(f'''
+        SELECT {LISTING_COLUMNS} FROM profiles
+        WHERE id IN (SELECT DISTINCT profile_id FROM {spec['child']} WHERE {spec['fk']} = ? AND profile_id > ? ORDER BY profile_id LIMIT ?)
+        ORDER BY id''', (dim_id, after, page_size + 1)).fetchall()
+    profiles = [dict(row) for row in rows[:page_size]]
+    next_cursor = profiles[-1]['id'] if len(rows) > page_size else None
+    return jsonify({spec['label']: dict(entry), "profiles": profiles, "next_cursor": next_cursor})
+
+# --- Full-text search ---
+
+SEARCH_COLUMNS = ('name', 'headline', 'about', 'location', 'experience', 'skills', 'recommendations')
+# Column weights for bm25(), in SEARCH_COLUMNS order
+SEARCH_WEIGHTS = (10.0, 5.0, 1.0, 2.0, 4.0, 4.0, 1.0)
+SEARCH_REBUILD_BATCH = 1000
+
+def search_source_sql():
+    """SELECT behind the profile_search_source view: one row of search text per profile.
+
+    profile_search is an external-content FTS5 table over this view, so the
+    text is only stored once, compressed, in the profile tables. Related rows
+    become one line each.
+    """
+    def lines(table, *columns):
+        line = " || ' ' || ".join(f"coalesce({column_sql(table, column, 'c')}, '')" for column in columns)
+        return f"(SELECT group_concat(line, char(10)) FROM (SELECT {line} AS line FROM {table} c WHERE c.profile_id = p.id ORDER BY c.position, c.id))"
+
+    return f"""SELECT p.id, p.name, p.headline, {column_sql('profiles', 'about', 'p')} AS about, p.location,
+        {lines('experience', 'title', 'company_name', 'description')} AS experience,
+        {lines('skills', 'skill_name')} AS skills,
+        {lines('recommendations', 'recommendation_text')} AS recommendations
+    FROM profiles p"""
+
+def unindex_profile_search(cursor, profile_id):
+    """Remove one profile from the search index.
+
+    FTS5 finds the words to remove by reading profile_search_source, so this
+    must run before the profile's stored rows change or are deleted.
+    """
+    cursor.execute("DELETE FROM profile_search WHERE rowid = ?", (profile_id,))
+
+def index_profile_search(cursor, profile_ids):
+    """Add profiles, as they are now stored, to the search index; each must not be in it already."""
+    cursor.executemany(f"INSERT INTO profile_search (rowid, {', '.join(SEARCH_COLUMNS)}) SELECT id, {', '.join(SEARCH_COLUMNS)} FROM profile_search_source WHERE id = ?",
+                       [(profile_id,) for profile_id in profile_ids])
+
+def load_profile_children(db, first_id, last_id):
+    """Load normalised child rows for every profile with first_id <= id <= last_id."""
+    children = {}
+    for table, columns in CHILD_COLUMNS.items():
+        rows = db.execute(f"SELECT profile_id, {select_list(table, columns)} FROM {table} WHERE profile_id BETWEEN ? AND ? ORDER BY profile_id, position, id",
+                          (first_id, last_id))
+        for row in rows:
+            children.setdefault(row[0], {t: [] for t in CHILD_TABLES})[table].append(tuple(row[1:]))
+    return children
+
+def rebuild_search_index(db):
+    """Rebuild profile_search from the stored profiles. Returns the number indexed."""
+    cursor = db.cursor()
+    cursor.execute("BEGIN IMMEDIATE")
+    indexed = populate_search_index(cursor)
+    db.commit()
+    return indexed
+
+def populate_search_index(cursor):
+    """Re-index every stored profile from profile_search_source; the caller owns the transaction."""
+    cursor.execute("INSERT INTO profile_search (profile_search) VALUES ('rebuild')")
+    cursor.execute("INSERT INTO profile_search (profile_search) VALUES ('optimize')")
+    return cursor.execute("SELECT count(*) FROM profiles").fetchone()[0]
+
+def build_search_query(text):
+    """Turn free text into a safe FTS5 query: every word must match, the last one as a prefix."""
+    terms = re.findall(r'\w+', text or '', re.UNICODE)
+    if not terms:
+        return None
+    quoted = [f'"{term}"' for term in terms]
+    quoted[-1] += '*'
+    return ' '.join(quoted)
+
+@app.route('/api/search')
+def search_profiles():
+    """Ranked full-text search over profiles: /api/search?q=...&page=1&per_page=20."""
+    match = build_search_query(request.args.get('q'))
+    if not match:
+        return jsonify({"error": "Missing search query", "results": []}), 400
+    page_size = parse_page_size(request.args.get('per_page'))
+    try:
+        page = max(1, int(request.args.get('page', 1)))
+    except ValueError:
+        page = 1
+
+    db = get_read_db()
+    try:
+        # Ranking only needs the index; snippets read the stored text, so they are made for the page alone
+        rows = db.execute(f'''
+            WITH page AS (
+                SELECT rowid AS id, bm25(profile_search, {', '.join(str(w) for w in SEARCH_WEIGHTS)}) AS score
+                FROM profile_search WHERE profile_search MATCH :match
+                ORDER BY score LIMIT :limit OFFSET :offset)
+            SELECT p.id, p.name, p.headline, p.location, p.linkedin_url, p.profile_pic_url, p.timestamp,
+                   snippet(profile_search, -1, '[', ']', '…', 12) AS snippet, page.score
+            FROM page
+            JOIN profile_search ON profile_search.rowid = page.id AND profile_search MATCH :match
+            JOIN profiles p ON p.id = page.id
+            ORDER BY page.score''', {'match': match, 'limit': page_size + 1, 'offset': (page - 1) * page_size}).fetchall()
+    except sqlite3.Error as e:
+        logger.error("Database error during search: %s", e)
+        return jsonify({"error": "Database error", "details": str(e)}), 500
+
+    results = [dict(row) for row in rows[:page_size]]
+    return jsonify({
+        "query": request.args.get('q'),
+        "page": page,
+        "per_page": page_size,
+        "next_page": page + 1 if len(rows) > page_size else None,
+        "results": results,
+    })
+
+@app.cli.command('rebuild-search')
+def rebuild_search_command():
+    """Rebuild the full-text search index from the profiles tables."""
+    started = datetime.datetime.now()
+    indexed = rebuild_search_index(get_db())
+    elapsed = (datetime.datetime.now() - started).total_seconds()
+    click.echo(f"Indexed {indexed} profiles in {elapsed:.1f}s.")
+
+# --- Duplicate detection ---
+#
+# Each save indexes the profile under a few blocking keys (exact matches on
+# canonical URL, name + current company, name + location) and under LSH
+# buckets of a MinHash signature over its headline, about and skills. A
+# save then only compares against profiles sharing a key or a bucket, so
+# the cost does not grow with the table. Pairs worth a look are kept in
+# duplicate_candidates for /api/duplicates; find-duplicates rebuilds the
+# index for existing data.
+
+MINHASH_PERMUTATIONS = 32
+LSH_BANDS = 8                   # Of MINHASH_PERMUTATIONS // LSH_BANDS rows; pairs above ~0.7 similarity collide ~90% of the time
+MINHASH_MIN_FEATURES = 4        # Profiles with less text than this are matched by blocking keys only
+DUPLICATE_MIN_SIMILARITY = 0.7  # Weaker matches (name_location, content) below this are not reported
+DUPLICATE_MAX_CANDIDATES = 20   # Per blocking key or LSH bucket, bounding the cost of very common ones
+DUPLICATE_REASONS = ('url', 'name_company', 'name_location', 'content') # Strongest first
+DUPLICATE_STRONG_REASONS = ('url', 'name_company') # Reported whatever the content similarity
+
+def stable_hash(text):
+    """64-bit hash of a string that is the same in every process."""
+    return int.from_bytes(hashlib.blake2b(text.encode('utf-8'), digest_size=8).digest(), 'big')
+
+def current_company(children):
+    """Company of the first experience without an end date, else of the first experience."""
+    columns = CHILD_COLUMNS['experience']
+    name, end = columns.index('company_name'), columns.index('end_date')
+    rows = children['experience']
+    for row in rows:
+        if not row[end] or 'present' in str(row[end]).lower():
+            return row[name]
+    return rows[0][name] if rows else None
+
+def duplicate_block_keys(base, children):
+    """Exact-match keys; profiles sharing one are compared."""
+    keys = []
+    if base.get('linkedin_url'):
+        keys.append('url:' + canonical_linkedin_url(base['linkedin_url']))
+    name = name_key(base.get('name'))
+    if name:
+        company = name_key(current_company(children))
+        if company:
+            keys.append(f'name_company:{name}|{company}')
+        location = name_key(base.get('location'))
+        if location:
+            keys.append(f'name_location:{name}|{location}')
+    return keys
+
+def duplicate_features(base, children):
+    """Word 3-shingles of the headline and about text, plus the skill names."""
+    words = re.findall(r'\w+', f"{base.get('headline') or ''} {base.get('about') or ''}".casefold())
+    features = {' '.join(words[i:i + 3]) for i in range(max(1, len(words) - 2))} if words else set()
+    features.update('skill:' + name_key(row[0]) for row in children['skills'])
+    return features
+
+def minhash_signature(features):
+    """MinHash signature of a feature set, or None when there is too little to compare.
+
+    One-permutation hashing: each feature hash is sent to one of
+    MINHASH_PERMUTATIONS bins and each bin keeps its minimum, so a profile
+    costs one hash per feature rather than one per feature and permutation.
+    Empty bins borrow the next filled bin's value, tagged with the distance
+    (densification by rotation), which keeps the estimate unbiased.
+    """
+    if len(features) < MINHASH_MIN_FEATURES:
+        return None
+    bins = [None] * MINHASH_PERMUTATIONS
+    for feature in features:
+        value = stable_hash(feature)
+        slot, value = value % MINHASH_PERMUTATIONS, value >> 6 # Leaves the top bits for the distance tag
+        if bins[slot] is None or value < bins[slot]:
+            bins[slot] = value
+    signature = []
+    for slot in range(MINHASH_PERMUTATIONS):
+        distance = 0
+        while bins[(slot + distance) % MINHASH_PERMUTATIONS] is None:
+            distance += 1
+        signature.append(bins[(slot + distance) % MINHASH_PERMUTATIONS] | (distance << 58))
+    return signature
+
+def lsh_buckets(signature):
+    """(band, bucket) pairs for a signature; similar signatures share at least one with high probability."""
+    rows = MINHASH_PERMUTATIONS // LSH_BANDS
+    return [(band, int.from_bytes(hashlib.blake2b(struct.pack(f'<{rows}Q', *signature[band * rows:(band + 1) * rows]), digest_size=8).digest(), 'big', signed=True))
+            for band in range(LSH_BANDS)]
+
+def pack_signature(signature):
+    return struct.pack(f'<{MINHASH_PERMUTATIONS}Q', *signature)
+
+def signature_similarity(signature, packed):
+    """Estimated Jaccard similarity: the share of MinHash values two signatures agree on."""
+    other = struct.unpack(f'<{MINHASH_PERMUTATIONS}Q', packed)
+    return sum(1 for x, y in zip(signature, other) if x == y) / MINHASH_PERMUTATIONS
+
+@functools.lru_cache(maxsize=None)
+def duplicate_probe_sql(key_count, band_count):
+    """One query for every blocking-key and LSH-bucket probe of a save, with the candidates' signatures."""
+    probes = ["SELECT block_key AS source, profile_id FROM profile_block_keys WHERE block_key = ? LIMIT ?"] * key_count
+    probes += ["SELECT 'content:', profile_id FROM profile_lsh WHERE band = ? AND bucket = ? LIMIT ?"] * band_count
+    union = ' UNION ALL '.join(f"SELECT * FROM ({probe})" for probe in probes)
+    return f"SELECT c.source, c.profile_id, s.signature FROM ({union}) c LEFT JOIN profile_signatures s ON s.profile_id = c.profile_id"
+
+def index_profile_duplicates(cursor, profile_id, base, children, is_new=False):
+    """Replace one profile's duplicate-index rows and record its candidate pairs.
+
+    Returns the ids of the profiles it matched, including pairs a user
+    dismissed (those stay dismissed). is_new skips clearing rows a new
+    profile cannot have.
+    """
+    return index_duplicates(cursor, [(profile_id, base, children, is_new)])[profile_id]
+
+def index_duplicates(cursor, profiles):
+    """index_profile_duplicates() for a list of (profile_id, base, children, is_new), with one
+    statement per index table; returns {profile_id: matched ids}.
+
+    Every profile's rows are written before any is probed, so profiles in
+    the same list also find each other.
+    """
+    indexed = []
+    for profile_id, base, children, _ in profiles:
+        signature = minhash_signature(duplicate_features(base, children))
+        indexed.append((profile_id, duplicate_block_keys(base, children), signature, lsh_buckets(signature) if signature is not None else []))
+    stale = [(profile_id,) for profile_id, _, _, is_new in profiles if not is_new]
+    if stale:
+        for table in ('profile_block_keys', 'profile_lsh', 'profile_signatures'):
+            cursor.executemany(f"DELETE FROM {table} WHERE profile_id = ?", stale)
+        cursor.executemany("DELETE FROM duplicate_candidates WHERE status = 'open' AND (profile_id = ?1 OR other_id = ?1)", stale)
+    cursor.executemany("INSERT INTO profile_block_keys (block_key, profile_id) VALUES (?, ?)",
+                       [(key, profile_id) for profile_id, keys, _, _ in indexed for key in keys])
+    cursor.executemany("INSERT INTO profile_signatures (profile_id, signature) VALUES (?, ?)",
+                       [(profile_id, pack_signature(signature)) for profile_id, _, signature, _ in indexed if signature is not None])
+    cursor.executemany("INSERT INTO profile_lsh (band, bucket, profile_id) VALUES (?, ?, ?)",
+                       [(band, bucket, profile_id) for profile_id, _, _, buckets in indexed for band, bucket in buckets])
+
+    pairs = {} # (lower id, higher id) -> (reason, similarity)
+    matches = {}
+    for profile_id, keys, signature, buckets in indexed:
+        # 1. Candidates sharing a blocking key or an LSH bucket, scored by signature similarity
+        candidates = {} # other id -> (reason, similarity)
+        if keys or buckets:
+            limit = DUPLICATE_MAX_CANDIDATES + 1 # The profile's own rows are among them
+            parameters = [value for key in keys for value in (key, limit)]
+            parameters += [value for band, bucket in buckets for value in (band, bucket, limit)]
+            for source, other_id, packed in cursor.execute(duplicate_probe_sql(len(keys), len(buckets)), parameters).fetchall():
+                reason = source.split(':', 1)[0]
+                if other_id == profile_id or (other_id in candidates and DUPLICATE_REASONS.index(candidates[other_id][0]) <= DUPLICATE_REASONS.index(reason)):
+                    continue
+                similarity = signature_similarity(signature, packed) if signature is not None and packed is not None else 0.0
+                candidates[other_id] = (reason, similarity)
+
+        # 2. Keep strong matches and close content
+        matches[profile_id] = []
+        for other_id, (reason, similarity) in candidates.items():
+            if reason in DUPLICATE_STRONG_REASONS or similarity >= DUPLICATE_MIN_SIMILARITY:
+                pair = (min(profile_id, other_id), max(profile_id, other_id))
+                if pair not in pairs or DUPLICATE_REASONS.index(reason) < DUPLICATE_REASONS.index(pairs[pair][0]):
+                    pairs[pair] = (reason, round(similarity, 3))
+                matches[profile_id].append(other_id)
+    if pairs:
+        cursor.executemany('''
+            INSERT INTO duplicate_candidates (profile_id, other_id, reason, similarity) VALUES (?, ?, ?, ?)
+            ON CONFLICT (profile_id, other_id) DO UPDATE SET
+                reason = excluded.reason, similarity = excluded.similarity, detected_at = CURRENT_TIMESTAMP
+            WHERE status = 'open';''', [pair + value for pair, value in pairs.items()])
+    return {profile_id: sorted(other_ids) for profile_id, other_ids in matches.items()}
+
+def canonicalize_profile_urls(cursor):
+    """Rewrite stored profile URLs to canonical form where that does not collide with another row.
+
+    Rows that would collide are left alone; their shared 'url:' blocking key
+    reports them as duplicates once find-duplicates has run.
+    """
+    rows = cursor.execute("SELECT id, linkedin_url FROM profiles").fetchall()
+    taken = {url for _, url in rows}
+    updates = []
+    for profile_id, url in rows:
+        canonical = canonical_linkedin_url(url)
+        if canonical != url and canonical not in taken:
+            taken.add(canonical)
+            updates.append((canonical, profile_id))
+    cursor.executemany("UPDATE profiles SET linkedin_url = ? WHERE id = ?", updates)
+    return len(updates)
+
+def load_profile(db, profile_id):
+    """Normalised (base, children) of one stored profile, or None."""
+    row = db.execute(f"SELECT {select_list('profiles', PROFILE_FIELDS)} FROM profiles WHERE id = ?", (profile_id,)).fetchone()
+    if row is None:
+        return None
+    children = load_profile_children(db, profile_id, profile_id)
+    return dict(row), children.get(profile_id, {table: [] for table in CHILD_TABLES})
+
+def rebuild_duplicate_index(db, batch_size=SEARCH_REBUILD_BATCH):
+    """Re-index every profile for duplicate detection. Returns (profiles indexed, open candidates).
+
+    Profiles are indexed in id order a batch at a time, each batch compared
+    against itself and the batches before it. Each batch commits on its own
+    so saves are not blocked for the whole run.
+    """
+    cursor = db.cursor()
+    cursor.execute("BEGIN IMMEDIATE")
+    for table in ('profile_block_keys', 'profile_lsh', 'profile_signatures'):
+        cursor.execute(f"DELETE FROM {table}")
+    cursor.execute("DELETE FROM duplicate_candidates WHERE status = 'open'")
+    db.commit()
+    indexed = 0
+    last_id = 0
+    while True:
+        cursor.execute("BEGIN IMMEDIATE")
+        profiles = cursor.execute(f"SELECT id, {select_list('profiles', PROFILE_FIELDS)} FROM profiles WHERE id > ? ORDER BY id LIMIT ?",
+                                  (last_id, batch_size)).fetchall()
+        if not profiles:
+            db.commit()
+            break
+        children = load_profile_children(db, profiles[0]['id'], profiles[-1]['id'])
+        empty = {table: [] for table in CHILD_TABLES}
+        index_duplicates(cursor, [(row['id'], dict(row), children.get(row['id'], empty), True) for row in profiles])
+        db.commit()
+        indexed += len(profiles)
+        last_id = profiles[-1]['id']
+    candidates = db.execute("SELECT count(*) FROM duplicate_candidates WHERE status = 'open'").fetchone()[0]
+    return indexed, candidates
+
+def merge_profiles(cursor, keep_id, merge_id):
+    """Fold profile merge_id into keep_id; the caller owns the transaction.
+
+    keep_id's fields win, empty ones are filled from merge_id. Related rows
+    keep_id lacks are moved over, the rest are deleted with merge_id, and
+    merge_id's URL (and its aliases) become aliases of keep_id so later
+    saves of it update keep_id. merge_id's history goes with it; the merged
+    keep_id is recorded as a new version.
+    """
+    db = cursor.connection
+    keep, merge = load_profile(db, keep_id), load_profile(db, merge_id)
+    if keep is None or merge is None:
+        raise LookupError("Profile not found")
+    old_keep_stats, merge_stats = stored_profile_stats(cursor, keep_id), stored_profile_stats(cursor, merge_id)
+    latest = latest_history(cursor, keep_id)
+    unindex_profile_search(cursor, keep_id)
+    unindex_profile_search(cursor, merge_id)
+
+    # 1. Profile fields; the content hash is cleared so the next save rewrites everything
+    fields = [field for field in PROFILE_FIELDS if field not in ('linkedin_url', 'about')]
+    merged = {field: keep[0][field] if keep[0][field] not in (None, '') else merge[0][field] for field in fields + ['about']}
+    cursor.execute(f"UPDATE profiles SET {', '.join(f'{field} = :{field}' for field in fields)}, content_hash = NULL, timestamp = CURRENT_TIMESTAMP, "
+                   "change_seq = (SELECT max(change_seq) + 1 FROM profiles) WHERE id = :id", dict(merged, id=keep_id))
+    store_profile_about(cursor, keep_id, merged['about'])
+
+    # 2. Related rows keep_id does not have yet, appended after its own
+    moved = {}
+    for table in CHILD_TABLES:
+        kept = cursor.execute(f"SELECT row_hash, {CHILD_COLUMNS[table][0]}, position FROM {table} WHERE profile_id = ?", (keep_id,)).fetchall()
+        hashes = {row[0] for row in kept if row[0]}
+        names = {row[1] for row in kept} if table == 'skills' else set() # UNIQUE(profile_id, skill_name)
+        position = max((row[2] for row in kept if row[2] is not None), default=-1)
+        updates = []
+        for row_id, row_hash, first_column in cursor.execute(f"SELECT id, row_hash, {CHILD_COLUMNS[table][0]} FROM {table} WHERE profile_id = ? ORDER BY position, id", (merge_id,)).fetchall():
+            if (row_hash and row_hash in hashes) or first_column in names:
+                continue
+            position += 1
+            updates.append((keep_id, position, row_id))
+        cursor.executemany(f"UPDATE {table} SET profile_id = ?, position = ? WHERE id = ?", updates)
+        moved[table] = len(updates)
+
+    # 3. URL aliases, then drop the merged profile (related rows and index entries cascade)
+    cursor.execute("UPDATE profile_aliases SET profile_id = ? WHERE profile_id = ?", (keep_id, merge_id))
+    cursor.execute("INSERT OR REPLACE INTO profile_aliases (alias_url, profile_id) VALUES (?, ?)", (merge[0]['linkedin_url'], keep_id))
+    cursor.execute("DELETE FROM profiles WHERE id = ?", (merge_id,))
+
+    # 4. Re-index the survivor as it now stands, record it as a new version and move the dashboard counters
+    base, children = load_profile(db, keep_id)
+    update_profile_stats(cursor, merge_stats, {})
+    update_profile_stats(cursor, old_keep_stats, stored_profile_stats(cursor, keep_id))
+    record_profile_history(cursor, keep_id, latest, base, children)
+    index_profile_search(cursor, [keep_id])
+    index_profile_duplicates(cursor, keep_id, base, children)
+    invalidate_profile_cache(keep_id)
+    invalidate_profile_cache(merge_id)
+    return moved
+
+@app.route('/api/duplicates')
+def list_duplicates():
+    """Possible duplicate pairs, strongest first: /api/duplicates?status=open&profile_id=&page=1&per_page=50."""
+    status = request.args.get('status', 'open')
+    if status not in ('open', 'dismissed'):
+        return jsonify({"error": "status must be open or dismissed"}), 400
+    page_size = parse_page_size(request.args.get('per_page'))
+    try:
+        page = max(1, int(request.args.get('page', 1)))
+        profile_id = int(request.args['profile_id']) if request.args.get('profile_id') else None
+    except ValueError:
+        return jsonify({"error": "page and profile_id must be integers"}), 400
+    profile_filter = 'AND (d.profile_id = :profile_id OR d.other_id = :profile_id)' if profile_id else ''
+    reason_order = ' '.join(f"WHEN '{reason}' THEN {rank}" for rank, reason in enumerate(DUPLICATE_REASONS))
+    rows = get_read_db().execute(f'''
+        SELECT d.reason, d.similarity, d.status, d.detected_at,
+               a.id AS a_id, a.name AS a_name, a.headline AS a_headline, a.linkedin_url AS a_linkedin_url, a.timestamp AS a_timestamp,
+               b.id AS b_id, b.name AS b_name, b.headline AS b_headline, b.linkedin_url AS b_linkedin_url, b.timestamp AS b_timestamp
+        FROM duplicate_candidates d
+        JOIN profiles a ON a.id = d.profile_id
+        JOIN profiles b ON b.id = d.other_id
+        WHERE d.status = :status {profile_filter}
+        ORDER BY CASE d.reason {reason_order} END, d.similarity DESC, d.profile_id, d.other_id
+        LIMIT :limit OFFSET :offset''',
+        {'status': status, 'profile_id': profile_id, 'limit': page_size + 1, 'offset': (page - 1) * page_size}).fetchall()
+    side = lambda row, prefix: {key: row[f'{prefix}_{key}'] for key in ('id', 'name', 'headline', 'linkedin_url', 'timestamp')}
+    duplicates = [{"profiles": [side(row, 'a'), side(row, 'b')], "reason": row['reason'], "similarity": row['similarity'],
+                   "status": row['status'], "detected_at": row['detected_at']} for row in rows[:page_size]]
+    return jsonify({"page": page, "per_page": page_size, "next_page": page + 1 if len(rows) > page_size else None, "duplicates": duplicates})
+
+def duplicate_pair_ids(data, *names):
+    if not isinstance(data, dict):
+        raise ValueError("Request must be a JSON object")
+    try:
+        ids = [int(data[name]) for name in names]
+    except (KeyError, TypeError, ValueError):
+        raise ValueError(f"{' and '.join(names)} must be profile ids")
+    if ids[0] == ids[1]:
+        raise ValueError("A profile cannot duplicate itself")
+    return ids
+
+@app.route('/api/duplicates/merge', methods=['POST'])
+def merge_duplicates():
+    """Merge one profile into another: {"keep": id, "merge": id}."""
+    try:
+        keep_id, merge_id = duplicate_pair_ids(request.get_json(silent=True), 'keep', 'merge')
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    db = get_db()
+    cursor = db.cursor()
+    try:
+        cursor.execute("BEGIN IMMEDIATE")
+        moved = merge_profiles(cursor, keep_id, merge_id)
+        commit_write(db)
+    except LookupError as e:
+        rollback_write(db)
+        return jsonify({"error": str(e)}), 404
+    except sqlite3.Error as e:
+        rollback_write(db)
+        logger.error("Database error merging profile %s into %s: %s", merge_id, keep_id, e)
+        return jsonify({"error": "Database error", "details": str(e)}), 500
+    return jsonify({"success": True, "profile_id": keep_id, "merged": merge_id, "moved": moved})
+
+@app.route('/api/duplicates/dismiss', methods=['POST'])
+def dismiss_duplicate():
+    """Mark a pair as not duplicates so it is not reported again: {"profile_id": id, "other_id": id}."""
+    try:
+        first, second = duplicate_pair_ids(request.get_json(silent=True), 'profile_id', 'other_id')
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    db = get_db()
+    cursor = db.execute("UPDATE duplicate_candidates SET status = 'dismissed' WHERE profile_id = ? AND other_id = ?",
+                        (min(first, second), max(first, second)))
+    db.commit()
+    if cursor.rowcount == 0:
+        return jsonify({"error": "Unknown duplicate pair"}), 404
+    return jsonify({"success": True})
+
+@app.cli.command('find-duplicates')
+def find_duplicates_command():
+    """Rebuild the duplicate-detection index and report possible duplicate profiles."""
+    started = datetime.datetime.now()
+    indexed, candidates = rebuild_duplicate_index(get_db())
+    elapsed = (datetime.datetime.now() - started).total_seconds()
+    click.echo(f"Indexed {indexed} profiles in {elapsed:.1f}s; {candidates} possible duplicate pairs (see /api/duplicates).")
+
+# --- Dashboard statistics ---
+#
+# Profiles per company, school, skill and location, and profiles added per
+# day, are kept as counters: profile_count on the dimension tables and the
+# stats_* tables. write_profile and merge_profiles adjust them inside their
+# own transaction from the difference between a profile's old and new
+# values, so /api/stats only reads a few index entries. rebuild-stats
+# recomputes everything with GROUP BY and reports any drift.
+
+STATS_DEFAULT_LIMIT = 10
+STATS_MAX_LIMIT = 100
+STATS_DEFAULT_DAYS = 30
+STATS_MAX_DAYS = 3660
+
+def profile_stats(base, children, days=()):
+    """What one profile contributes to the aggregates: a set of keys per aggregate."""
+    stats = {'days': set(days), 'locations': set()}
+    if name_key(base.get('location')):
+        stats['locations'].add((name_key(base['location']), ' '.join(str(base['location']).split())))
+    for dimension, spec in DIMENSIONS.items():
+        fk_index = CHILD_COLUMNS[spec['child']].index(spec['fk'])
+        stats[dimension] = {row[fk_index] for row in children[spec['child']] if row[fk_index] is not None}
+    return stats
+
+def stored_profile_stats(cursor, profile_id):
+    """profile_stats() of a profile as currently stored, read with one query."""
+    parts = ["SELECT 'days', date(coalesce(created_at, timestamp)) FROM profiles WHERE id = :id",
+             "SELECT 'locations', location FROM profiles WHERE id = :id"]
+    parts += [f"SELECT '{dimension}', {spec['fk']} FROM {spec['child']} WHERE profile_id = :id AND {spec['fk']} IS NOT NULL"
+              for dimension, spec in DIMENSIONS.items()]
+    stats = {aggregate: set() for aggregate in ('days', 'locations', *DIMENSIONS)}
+    for aggregate, value in cursor.execute(' UNION ALL '.join(parts), {'id': profile_id}).fetchall():
+        if aggregate == 'locations':
+            if name_key(value):
+                stats['locations'].add((name_key(value), ' '.join(str(value).split())))
+        elif value is not None:
+            stats[aggregate].add(value)
+    return stats
+
+def update_profile_stats(cursor, old, new):
+    """Apply the difference between a profile's old and new profile_stats() to the counters."""
+    delta = stats_delta()
+    add_stats_delta(delta, old, new)
+    apply_stats_delta(cursor, delta)
+
+def stats_delta():
+    """Empty counter changes: {aggregate: Counter of key -> change}; locations are keyed by (name_key, name)."""
+    return {aggregate: collections.Counter() for aggregate in ('days', 'locations', *DIMENSIONS)}
+
+def add_stats_delta(delta, old, new):
+    """Add the difference between a profile's old and new profile_stats() to delta."""
+    empty = set()
+    for aggregate, changes in delta.items():
+        changes.update(new.get(aggregate, empty) - old.get(aggregate, empty))
+        changes.subtract(old.get(aggregate, empty) - new.get(aggregate, empty))
+
+def apply_stats_delta(cursor, delta):
+    """Write the counter changes collected in delta, one statement per aggregate."""
+    for dimension, spec in DIMENSIONS.items():
+        deltas = [(change, dim_id) for dim_id, change in delta[dimension].items() if change]
+        if deltas:
+            cursor.executemany(f"UPDATE {spec['table']} SET profile_count = profile_count + ? WHERE id = ?", deltas)
+    locations = {} # name_key -> [change, name]
+    for (key, name), change in delta['locations'].items():
+        locations.setdefault(key, [0, name])[0] += change
+    deltas = [(name, key, change) for key, (change, name) in locations.items() if change]
+    if deltas:
+        cursor.executemany('''INSERT INTO stats_locations (name, name_key, profile_count) VALUES (?, ?, ?)
+                              ON CONFLICT (name_key) DO UPDATE SET profile_count = profile_count + excluded.profile_count''', deltas)
+    deltas = [(day, change) for day, change in delta['days'].items() if change]
+    if deltas:
+        cursor.executemany('''INSERT INTO stats_daily (day, profiles_added) VALUES (?, ?)
+                              ON CONFLICT (day) DO UPDATE SET profiles_added = profiles_added + excluded.profiles_added''', deltas)
+
+def compute_stats(db):
+    """Recompute every aggregate from the profile tables: ({aggregate: {key: count}}, location names)."""
+    computed = {'days': dict(db.execute("SELECT date(coalesce(created_at, timestamp)), count(*) FROM profiles GROUP BY 1").fetchall()),
+                'locations': {}}
+    location_names = {}
+    for location, count in db.execute("SELECT location, count(*) FROM profiles WHERE location IS NOT NULL GROUP BY location").fetchall():
+        key = name_key(location)
+        if key:
+            computed['locations'][key] = computed['locations'].get(key, 0) + count
+            location_names.setdefault(key, ' '.join(str(location).split()))
+    for dimension, spec in DIMENSIONS.items():
+        # Walks idx_<child>_<fk> (fk, profile_id)
+        computed[dimension] = dict(db.execute(f"SELECT {spec['fk']}, count(DISTINCT profile_id) FROM {spec['child']} WHERE {spec['fk']} IS NOT NULL GROUP BY {spec['fk']}").fetchall())
+    return computed, location_names
+
+def stored_stats(db):
+    """The incrementally maintained counters, in the shape compute_stats() returns."""
+    stored = {'days': dict(db.execute("SELECT day, profiles_added FROM stats_daily WHERE profiles_added != 0").fetchall()),
+              'locations': dict(db.execute("SELECT name_key, profile_count FROM stats_locations WHERE profile_count != 0").fetchall())}
+    for dimension, spec in DIMENSIONS.items():
+        stored[dimension] = dict(db.execute(f"SELECT id, profile_count FROM {spec['table']} WHERE profile_count != 0").fetchall())
+    return stored
+
+def rebuild_stats(cursor, write=True):
+    """Recompute the aggregates, compare them with the counters and (if write) replace the counters.
+
+    The caller owns the transaction. Returns {aggregate: [(key, stored, computed), ...]} for every
+    counter that had drifted.
+    """
+    db = cursor.connection
+    computed, location_names = compute_stats(db)
+    stored = stored_stats(db)
+    mismatches = {}
+    for aggregate, values in computed.items():
+        keys = set(values) | set(stored[aggregate])
+        drift = [(key, stored[aggregate].get(key, 0), values.get(key, 0)) for key in sorted(keys, key=str)
+                 if stored[aggregate].get(key, 0) != values.get(key, 0)]
+        if drift:
+            mismatches[aggregate] = drift
+    if not write:
+        return mismatches
+    for dimension, spec in DIMENSIONS.items():
+        cursor.execute(f"UPDATE {spec['table']} SET profile_count = 0 WHERE profile_count != 0")
+        cursor.executemany(f"UPDATE {spec['table']} SET profile_count = ? WHERE id = ?",
+                           [(count, dim_id) for dim_id, count in computed[dimension].items()])
+    cursor.execute("UPDATE stats_locations SET profile_count = 0 WHERE profile_count != 0")
+    cursor.executemany('''INSERT INTO stats_locations (name, name_key, profile_count) VALUES (?, ?, ?)
+                          ON CONFLICT (name_key) DO UPDATE SET profile_count = excluded.profile_count''',
+                       [(location_names[key], key, count) for key, count in computed['locations'].items()])
+    cursor.execute("DELETE FROM stats_daily")
+    cursor.executemany("INSERT INTO stats_daily (day, profiles_added) VALUES (?, ?)", list(computed['days'].items()))
+    return mismatches
+
+def bounded_int_arg(name, default, maximum):
+    try:
+        return min(max(int(request.args.get(name, default)), 1), maximum)
+    except ValueError:
+        return default
+
+def parse_since_timestamp(since):
+    """Check a since argument of the form 'YYYY-MM-DD' or 'YYYY-MM-DD HH:MM:SS'. Raises ValueError."""
+    try:
+        datetime.datetime.strptime(since, '%Y-%m-%d %H:%M:%S' if ' ' in since else '%Y-%m-%d')
+    except ValueError:
+        raise ValueError("since must be 'YYYY-MM-DD' or 'YYYY-MM-DD HH:MM:SS'")
+    return since
+
+@app.route('/api/stats')
+def dashboard_stats():
+    """Dashboard aggregates: /api/stats?limit=10&days=30."""
+    limit = bounded_int_arg('limit', STATS_DEFAULT_LIMIT, STATS_MAX_LIMIT)
+    days = bounded_int_arg('days', STATS_DEFAULT_DAYS, STATS_MAX_DAYS)
+    db = get_read_db()
+    stats = {
+        'total_profiles': db.execute("SELECT coalesce(sum(profiles_added), 0) FROM stats_daily").fetchone()[0],
+        'profiles_per_day': [dict(row) for row in db.execute(
+            "SELECT day, profiles_added FROM stats_daily WHERE day > date('now', ?) ORDER BY day", (f'-{days} days',))],
+    }
+    # Each list is the top of an index on profile_count, so its cost does not depend on the table size
+    for dimension, spec in DIMENSIONS.items():
+        stats[f'top_{dimension}'] = [dict(row) for row in db.execute(
+            f"SELECT id, name, profile_count AS profiles FROM {spec['table']} WHERE profile_count > 0 ORDER BY profile_count DESC LIMIT ?", (limit,))]
+    stats['top_locations'] = [dict(row) for row in db.execute(
+        "SELECT name, profile_count AS profiles FROM stats_locations WHERE profile_count > 0 ORDER BY profile_count DESC LIMIT ?", (limit,))]
+    return jsonify(stats)
+
+@app.cli.command('rebuild-stats')
+@click.option('--check-only', is_flag=True, help='Report drift without rewriting the counters; exits 1 if any is found.')
+def rebuild_stats_command(check_only):
+    """Recompute the dashboard aggregates and check them against the incremental counters."""
+    db = get_db()
+    cursor = db.cursor()
+    cursor.execute("BEGIN IMMEDIATE")
+    try:
+        mismatches = rebuild_stats(cursor, write=not check_only)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    if not mismatches:
+        click.echo("Incremental statistics match a full recomputation.")
+        return
+    for aggregate, drift in mismatches.items():
+        examples = ', '.join(f"{key}: {stored} != {computed}" for key, stored, computed in drift[:5])
+        click.echo(f"{aggregate}: {len(drift)} counters differ (stored != recomputed), e.g. {examples}")
+    if check_only:
+        raise SystemExit(1)
+    click.echo("Counters replaced with the recomputed values.")
+
+# --- Profile history ---
+#
+# Every save that changes a profile's content hash records a version in
+# profile_history. A version stores either a keyframe (the whole profile as
+# JSON) or a delta against the version before it: changed fields, plus for
+# each changed related table the new row list, where rows carried over are
+# referenced by their index in the old list. A keyframe is written at least
+# every HISTORY_KEYFRAME_INTERVAL versions, so rebuilding any version reads
+# one keyframe and a bounded number of deltas. Snapshots are compressed like
+# the other long text (see COMPRESSED_COLUMNS). Each version also keeps a
+# small summary of what changed, which "changed since" queries filter on
+# through the index on changed_at.
+#
+# A profile that never changed has no rows: its only version is the stored
+# profile. The first change writes that as version 1, so unchanged profiles
+# (most of them) are not stored twice.
+
+HISTORY_KEYFRAME_INTERVAL = 10
+HISTORY_DEFAULT_DAYS = 30
+HISTORY_MAX_DAYS = 3660
+# Keys of a version's summary: profile fields, the current role, and the related tables
+HISTORY_CHANGE_FIELDS = PROFILE_FIELDS + ('company', 'title') + CHILD_TABLES
+
+def history_document(base, children):
+    """The JSON-ready form of a profile stored in history; empty values and dimension ids are left out."""
+    document = {field: base[field] for field in PROFILE_FIELDS if base.get(field) is not None}
+    for table, columns in CHILD_COLUMNS.items():
+        document[table] = [{col: value for col, value in zip(columns, row) if value is not None and col not in DIMENSION_COLUMNS}
+                           for row in children[table]]
+    return document
+
+def current_role(document):
+    """(title, company) of the first current experience, else of the first one."""
+    rows = document.get('experience') or [{}]
+    row = next((row for row in rows if not row.get('end_date') or 'present' in str(row['end_date']).lower()), rows[0])
+    return row.get('title'), row.get('company_name')
+
+def history_delta(old, new):
+    """Delta that turns document old into new; {} when they are equal."""
+    delta = {}
+    for field in PROFILE_FIELDS:
+        if old.get(field) != new.get(field):
+            delta.setdefault('set', {})[field] = new.get(field)
+    for table in CHILD_TABLES:
+        old_rows, new_rows = old.get(table, []), new.get(table, [])
+        if old_rows == new_rows:
+            continue
+        positions = {}
+        for index, row in enumerate(old_rows):
+            positions.setdefault(content_hash(row), []).append(index)
+        delta.setdefault('rows', {})[table] = [positions[key].pop(0) if positions.get(key) else row
+                                               for row, key in ((row, content_hash(row)) for row in new_rows)]
+    return delta
+
+def apply_history_delta(document, delta):
+    document = dict(document)
+    for field, value in delta.get('set', {}).items():
+        if value is None:
+            document.pop(field, None)
+        else:
+            document[field] = value
+    for table, rows in delta.get('rows', {}).items():
+        old_rows = document.get(table, [])
+        document[table] = [old_rows[row] if isinstance(row, int) else row for row in rows]
+    return document
+
+def history_changes(old, new, delta):
+    """Summary of a delta: [old, new] for fields and the current role, row counts for related tables."""
+    changes = {}
+    for field, value in delta.get('set', {}).items():
+        changes[field] = True if field == 'about' else [old.get(field), value]
+    for key, old_value, new_value in zip(('title', 'company'), current_role(old), current_role(new)):
+        if old_value != new_value:
+            changes[key] = [old_value, new_value]
+    for table, rows in delta.get('rows', {}).items():
+        kept = sum(1 for row in rows if isinstance(row, int))
+        changes[table] = {'added': len(rows) - kept, 'removed': len(old.get(table, [])) - kept}
+    return changes
+
+def load_history_version(db, profile_id, version=None):
+    """(version, document) of a profile as of a recorded version (default: the latest), or None."""
+    rows = db.execute('''
+        SELECT version, keyframe, inflate(snapshot) FROM profile_history
+        WHERE profile_id = :id AND version <= :version
+          AND version >= (SELECT max(version) FROM profile_history WHERE profile_id = :id AND keyframe = 1 AND version <= :version)
+        ORDER BY version''', {'id': profile_id, 'version': version or 2 ** 62}).fetchall()
+    document = None
+    for _, keyframe, snapshot in rows:
+        document = json.loads(snapshot) if keyframe else apply_history_delta(document, json.loads(snapshot))
+    return (rows[-1][0], document) if rows else None
+
+def latest_history(cursor, profile_id):
+    """(version, document) of the latest version of a stored profile, recording it as version 1 if it has none.
+
+    Called before a change is written, while the stored profile is still the old one.
+    """
+    latest = load_history_version(cursor.connection, profile_id)
+    if latest is None:
+        document = history_document(*load_profile(cursor.connection, profile_id))
+        cursor.execute('''
+            INSERT INTO profile_history (profile_id, version, keyframe, snapshot, changed_at)
+            SELECT id, 1, 1, deflate(?), coalesce(timestamp, CURRENT_TIMESTAMP) FROM profiles WHERE id = ?''',
+            (json.dumps(document, separators=(',', ':'), ensure_ascii=False), profile_id))
+        latest = (1, document)
+    return latest
+
+def record_profile_history(cursor, profile_id, latest, base, children):
+    """Record the profile as just written as the version after latest (from latest_history()).
+
+    Returns the summary of changes, or None if nothing differs from latest.
+    """
+    version, previous = latest
+    document = history_document(base, children)
+    delta = history_delta(previous, document)
+    if not delta:
+        return None
+    encoded = json.dumps(delta, separators=(',', ':'), ensure_ascii=False)
+    last_keyframe = cursor.execute("SELECT max(version) FROM profile_history WHERE profile_id = ? AND keyframe = 1", (profile_id,)).fetchone()[0]
+    keyframe = version + 1 - last_keyframe >= HISTORY_KEYFRAME_INTERVAL or len(encoded) >= len(json.dumps(document, ensure_ascii=False))
+    if keyframe:
+        encoded = json.dumps(document, separators=(',', ':'), ensure_ascii=False)
+    changes = history_changes(previous, document, delta)
+    cursor.execute('''
+        INSERT INTO profile_history (profile_id, version, keyframe, snapshot, changes, changed_at)
+        VALUES (?, ?, ?, deflate(?), ?, CURRENT_TIMESTAMP)''',
+        (profile_id, version + 1, int(keyframe), encoded, json.dumps(changes, ensure_ascii=False)))
+    return changes
+
+@app.route('/api/profiles/<int:profile_id>/history')
+def profile_history(profile_id):
+    """Versions of one profile, newest first, with what each changed: ?page=1&per_page=50."""
+    page_size = parse_page_size(request.args.get('per_page'))
+    try:
+        page = max(1, int(request.args.get('page', 1)))
+    except ValueError:
+        return jsonify({"error": "page must be an integer"}), 400
+    db = get_read_db()
+    profile = db.execute("SELECT timestamp FROM profiles WHERE id = ?", (profile_id,)).fetchone()
+    if profile is None:
+        return jsonify({"error": "Profile not found"}), 404
+    rows = db.execute('''
+        SELECT version, changed_at, changes FROM profile_history WHERE profile_id = ?
+        ORDER BY version DESC LIMIT ? OFFSET ?''', (profile_id, page_size + 1, (page - 1) * page_size)).fetchall()
+    if not rows and page == 1:
+        rows = [{'version': 1, 'changed_at': profile['timestamp'], 'changes': None}] # Never changed
+    versions = [{"version": row['version'], "changed_at": row['changed_at'],
+                 "changes": json.loads(row['changes']) if row['changes'] else None} for row in rows[:page_size]]
+    return jsonify({"profile_id": profile_id, "page": page, "per_page": page_size,
+                    "next_page": page + 1 if len(rows) > page_size else None, "versions": versions})
+
+@app.route('/api/profiles/<int:profile_id>/history/<int:version>')
+def profile_history_version(profile_id, version):
+    """The profile as it was saved in one version."""
+    db = get_read_db()
+    found = load_history_version(db, profile_id, version)
+    if found is None and version == 1:
+        stored = load_profile(db, profile_id) # Never changed: the stored profile is version 1
+        found = (1, history_document(*stored)) if stored else None
+    if found is None or found[0] != version:
+        return jsonify({"error": "Version not found"}), 404
+    return jsonify({"profile_id": profile_id, "version": version, "profile": found[1]})
+
+@app.route('/api/history/changes')
+def history_changes_since():
+    """Profiles changed recently: /api/history/changes?field=company&days=30 (or since=YYYY-MM-DD HH:MM:SS)&page=1."""
+    field = request.args.get('field')
+    if field is not None and field not in HISTORY_CHANGE_FIELDS:
+        return jsonify({"error": f"field must be one of {', '.join(HISTORY_CHANGE_FIELDS)}"}), 400
+    page_size = parse_page_size(request.args.get('per_page'))
+    try:
+        page = max(1, int(request.args.get('page', 1)))
+    except ValueError:
+        return jsonify({"error": "page must be an integer"}), 400
+    since = request.args.get('since')
+    if since:
+        try:
+            parse_since_timestamp(since)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+    else:
+        days = bounded_int_arg('days', HISTORY_DEFAULT_DAYS, HISTORY_MAX_DAYS)
+        since = (datetime.datetime.utcnow() - datetime.timedelta(days=days)).strftime('%Y-%m-%d %H:%M:%S')
+    # changed_at is the index range; the field test only runs on the versions inside it
+    field_filter = "AND json_type(h.changes, '$.' || :field) IS NOT NULL" if field else "AND h.changes IS NOT NULL"
+    rows = get_read_db().execute(f'''
+        SELECT h.profile_id, p.name, p.headline, p.linkedin_url, h.version, h.changed_at, h.changes
+        FROM profile_history h JOIN profiles p ON p.id = h.profile_id
+        WHERE h.changed_at >= :since {field_filter}
+        ORDER BY h.changed_at DESC, h.id DESC
+        LIMIT :limit OFFSET :offset''',
+        {'since': since, 'field': field, 'limit': page_size + 1, 'offset': (page - 1) * page_size}).fetchall()
+    changes = []
+    for row in rows[:page_size]:
+        summary = json.loads(row['changes'])
+        changes.append({"profile_id": row['profile_id'], "name": row['name'], "headline": row['headline'],
+                        "linkedin_url": row['linkedin_url'], "version": row['version'], "changed_at": row['changed_at'],
+                        "changes": {field: summary[field]} if field else summary})
+    return jsonify({"since": since, "field": field, "page": page, "per_page": page_size,
+                    "next_page": page + 1 if len(rows) > page_size else None, "changes": changes})
+
+# --- Compressed text ---
+#
+# The long free-text columns in COMPRESSED_COLUMNS are stored as a BLOB: a
+# codec tag byte, for dictionary codecs the dictionary id, then the
+# compressed UTF-8 text. Short values, values that do not shrink and rows
+# written before compression stay TEXT. Every connection has two SQL
+# functions for them: deflate() to compress on write and inflate(), which
+# returns either form as text. Queries read these columns through
+# column_sql(). profiles.about moved to the profile_about side table, so
+# the rows scanned by the listing stay small.
+#
+# `flask recompress --train` builds a dictionary from the stored text (zstd
+# when the optional zstandard package is installed, a zlib preset
+# dictionary otherwise) and rewrites existing rows with it. Dictionaries are
+# never changed or deleted, so every stored value stays readable.
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+COMPRESSED_COLUMNS = {
+    'profile_about': ('about',),
+    'experience': ('description',),
+    'education': ('description',),
+    'recommendations': ('recommendation_text',),
+    'profile_history': ('snapshot',),
+}
+COMPRESSION_MIN_BYTES = 64      # Shorter values are stored as plain TEXT
+COMPRESSION_LEVEL = 6
+COMPRESSION_CHUNK_SIZE = 2000   # Rows rewritten per transaction by recompress
+DICTIONARY_SIZE = 32768         # zlib uses at most its 32 KiB window of a preset dictionary
+DICTIONARY_SAMPLES = 2000       # Stored values sampled per column for training
+CODEC_ZLIB, CODEC_ZLIB_DICTIONARY, CODEC_ZSTD_DICTIONARY = 1, 2, 3
+
+class TextCodec:
+    """Compression of one database's text values, with its dictionaries cached by id."""
+
+    def __init__(self, path):
+        self.path = path
+        self.dictionaries = {} # id -> (codec name, dictionary bytes)
+        self.active = None     # Dictionary id used for new values; None is plain zlib
+        self._local = threading.local() # zstd (de)compressors are not thread-safe
+
+    def load(self, db):
+        """Cache the stored dictionaries and write with the newest one this process can use."""
+        for dict_id, codec, dictionary in db.execute("SELECT id, codec, dictionary FROM compression_dictionaries ORDER BY id"):
+            self.dictionaries[dict_id] = (codec, bytes(dictionary))
+            if codec == 'zlib' or zstandard is not None:
+                self.active = dict_id
+
+    def dictionary(self, dict_id):
+        entry = self.dictionaries.get(dict_id)
+        if entry is None:
+            row = None
+            if self.path != ':memory:':
+                # Trained by another process after this one loaded its dictionaries; an in-memory database has no other process
+                db = sqlite3.connect(read_only_uri(self.path), uri=True)
+                try:
+                    row = db.execute("SELECT codec, dictionary FROM compression_dictionaries WHERE id = ?", (dict_id,)).fetchone()
+                finally:
+                    db.close()
+            if row is None:
+                raise ValueError(f"Unknown compression dictionary {dict_id}")
+            entry = self.dictionaries[dict_id] = (row[0], bytes(row[1]))
+        return entry
+
+    def _zstd(self, dict_id):
+        if zstandard is None:
+            raise RuntimeError("The zstandard package is needed to read zstd-compressed text")
+        cache = self._local.__dict__.setdefault('zstd', {})
+        if dict_id not in cache:
+            dictionary = zstandard.ZstdCompressionDict(self.dictionary(dict_id)[1])
+            cache[dict_id] = (zstandard.ZstdCompressor(level=COMPRESSION_LEVEL, dict_data=dictionary),
+                              zstandard.ZstdDecompressor(dict_data=dictionary))
+        return cache[dict_id]
+
+    def compress(self, text):
+        """Stored form of a text value. Registered as the deflate() SQL function."""
+        if not isinstance(text, str) or len(text) < COMPRESSION_MIN_BYTES:
+            return text
+        data = text.encode('utf-8')
+        codec, dictionary = self.dictionary(self.active) if self.active else (None, None)
+        if codec == 'zstd':
+            packed = struct.pack('<BI', CODEC_ZSTD_DICTIONARY, self.active) + self._zstd(self.active)[0].compress(data)
+        else:
+            compressor = zlib.compressobj(COMPRESSION_LEVEL, zlib.DEFLATED, -15, **({'zdict': dictionary} if dictionary else {}))
+            header = struct.pack('<BI', CODEC_ZLIB_DICTIONARY, self.active) if dictionary else bytes([CODEC_ZLIB])
+            packed = header + compressor.compress(data) + compressor.flush()
+        return packed if len(packed) < len(data) else text
+
+    def decompress(self, value):
+        """Text of a stored value, compressed or not. Registered as the inflate() SQL function."""
+        if not isinstance(value, bytes) or not value:
+            return value
+        if value[0] == CODEC_ZLIB:
+            return zlib.decompress(value[1:], -15).decode('utf-8')
+        if value[0] == CODEC_ZLIB_DICTIONARY:
+            decompressor = zlib.decompressobj(-15, zdict=self.dictionary(struct.unpack_from('<I', value, 1)[0])[1])
+            return (decompressor.decompress(value[5:]) + decompressor.flush()).decode('utf-8')
+        if value[0] == CODEC_ZSTD_DICTIONARY:
+            return self._zstd(struct.unpack_from('<I', value, 1)[0])[1].decompress(value[5:]).decode('utf-8')
+        raise ValueError(f"Unknown text codec {value[0]}")
+
+text_codecs = {}
+
+def text_codec(path):
+    """The TextCodec of a database file, shared by all its connections in this process."""
+    codec = text_codecs.get(path)
+    if codec is None:
+        codec = text_codecs.setdefault(path, TextCodec(path))
+    return codec
+
+def register_text_functions(db, path):
+    codec = text_codec(path)
+    db.create_function('deflate', 1, codec.compress)
+    db.create_function('inflate', 1, codec.decompress)
+
+def column_sql(table, column, qualifier=None):
+    """SQL expression that reads table.column as text: compressed columns go through inflate(), and
+    profiles.about comes from profile_about."""
+    prefix = f'{qualifier}.' if qualifier else ''
+    if table == 'profiles' and column == 'about':
+        return f"(SELECT inflate(about) FROM profile_about WHERE profile_id = {qualifier or 'profiles'}.id)"
+    if column in COMPRESSED_COLUMNS.get(table, ()):
+        return f"inflate({prefix}{column})"
+    return prefix + column
+
+@functools.lru_cache(maxsize=None)
+def select_list(table, columns, qualifier=None):
+    """SELECT list for a tuple of columns of table, read as text and keeping their names."""
+    expressions = []
+    for column in columns:
+        expression = column_sql(table, column, qualifier)
+        expressions.append(expression if expression.endswith(f'.{column}') or expression == column else f"{expression} AS {column}")
+    return ', '.join(expressions)
+
+def value_sql(table, column):
+    """Placeholder for writing table.column: deflate(?) for compressed columns."""
+    return 'deflate(?)' if column in COMPRESSED_COLUMNS.get(table, ()) else '?'
+
+def store_profile_about(cursor, profile_id, about):
+    """Write a profile's about text to profile_about; None removes it."""
+    if about is None:
+        cursor.execute("DELETE FROM profile_about WHERE profile_id = ?", (profile_id,))
+    else:
+        cursor.execute('''
+            INSERT INTO profile_about (profile_id, about) VALUES (?, deflate(?))
+            ON CONFLICT (profile_id) DO UPDATE SET about = excluded.about WHERE about IS NOT excluded.about''',
+            (profile_id, about))
+
+def train_zlib_dictionary(samples, size=DICTIONARY_SIZE):
+    """A zlib preset dictionary of the word sequences that recur across samples.
+
+    Sequences are ranked by the bytes they would save (occurrences x length)
+    and the most valuable are placed last, where deflate reaches them with
+    the shortest distances.
+    """
+    counts = collections.Counter()
+    for text in samples:
+        words = text.split()
+        for n in (1, 2, 3, 4):
+            # Counted once per sample, so one long value cannot dominate
+            counts.update({' '.join(words[i:i + n]) for i in range(len(words) - n + 1)})
+    ranked = sorted(((count - 1) * (len(phrase) + 1), phrase) for phrase, count in counts.items() if count > 1 and len(phrase) > 3)
+    chosen, used = [], 0
+    for _, phrase in reversed(ranked):
+        length = len(phrase.encode('utf-8')) + 1
+        if used + length > size:
+            continue
+        if any(phrase in longer for longer in chosen[-50:]):
+            continue # Already covered by a longer sequence picked just before
+        chosen.append(phrase)
+        used += length
+    return ' '.join(reversed(chosen)).encode('utf-8')[:size]
+
+def train_text_dictionary(db):
+    """Train and store a dictionary from samples of the stored text. Returns its id, or None without samples."""
+    samples = []
+    for table, columns in COMPRESSED_COLUMNS.items():
+        for column in columns:
+            samples += [row[0] for row in db.execute(
+                f"SELECT inflate({column}) FROM {table} WHERE {column} IS NOT NULL ORDER BY random() LIMIT ?", (DICTIONARY_SAMPLES,))
+                if row[0] and len(row[0]) >= COMPRESSION_MIN_BYTES]
+    if not samples:
+        return None
+    if zstandard is not None and len(samples) >= 10:
+        codec = 'zstd'
+        dictionary = zstandard.train_dictionary(DICTIONARY_SIZE, [text.encode('utf-8') for text in samples]).as_bytes()
+    else:
+        codec = 'zlib'
+        dictionary = train_zlib_dictionary(samples)
+    cursor = db.cursor()
+    cursor.execute("BEGIN IMMEDIATE")
+    cursor.execute("INSERT INTO compression_dictionaries (codec, dictionary) VALUES (?, ?)", (codec, dictionary))
+    dict_id = cursor.lastrowid
+    db.commit()
+    codec_state = text_codec(connection_path())
+    codec_state.dictionaries[dict_id] = (codec, dictionary)
+    codec_state.active = dict_id
+    return dict_id
+
+def recompress_text(db, chunk_size=COMPRESSION_CHUNK_SIZE):
+    """Rewrite every compressed column with the current codec. Returns {table.column: rows rewritten}.
+
+    Rows go through in id order, one transaction per chunk, so saves are not
+    blocked for the whole run.
+    """
+    rewritten = {}
+    cursor = db.cursor()
+    for table, columns in COMPRESSED_COLUMNS.items():
+        key = 'profile_id' if table == 'profile_about' else 'id'
+        for column in columns:
+            count = 0
+            last_id = 0
+            while True:
+                cursor.execute("BEGIN IMMEDIATE")
+                row = cursor.execute(f"SELECT max({key}), count(*) FROM (SELECT {key} FROM {table} WHERE {key} > ? ORDER BY {key} LIMIT ?)",
+                                     (last_id, chunk_size)).fetchone()
+                if not row[1]:
+                    db.commit()
+                    break
+                cursor.execute(f"""UPDATE {table} SET {column} = deflate(inflate({column}))
+                                   WHERE {key} > ? AND {key} <= ? AND {column} IS NOT NULL""", (last_id, row[0]))
+                count += cursor.rowcount
+                db.commit()
+                last_id = row[0]
+            rewritten[f'{table}.{column}'] = count
+    return rewritten
+
+def compression_report(db):
+    """Rows, compressed rows, stored bytes and text bytes per compressed column."""
+    report = []
+    for table, columns in COMPRESSED_COLUMNS.items():
+        for column in columns:
+            rows, compressed, stored, logical = db.execute(f'''
+                SELECT count(*), count(CASE WHEN typeof({column}) = 'blob' THEN 1 END),
+                       coalesce(sum(length(CAST({column} AS BLOB))), 0), coalesce(sum(length(CAST(inflate({column}) AS BLOB))), 0)
+                FROM {table} WHERE {column} IS NOT NULL''').fetchone()
+            report.append({'column': f'{table}.{column}', 'rows': rows, 'compressed': compressed,
+                           'stored_bytes': stored, 'text_bytes': logical})
+    return report
+
+@app.cli.command('recompress')
+@click.option('--train', is_flag=True, help='Train a new dictionary from the stored text first.')
+@click.option('--report-only', is_flag=True, help='Only print how much space compression saves.')
+def recompress_command(train, report_only):
+    """Compress stored profile text with the current codec and report the bytes saved."""
+    db = db_pool.connection(database_path())
+    if not report_only:
+        if train:
+            dict_id = train_text_dictionary(db)
+            click.echo(f"Trained dictionary {dict_id}" if dict_id else "No stored text to train a dictionary on.")
+        for column, count in recompress_text(db).items():
+            click.echo(f"Rewrote {count} values of {column}")
+    total_stored = total_text = 0
+    for entry in compression_report(db):
+        total_stored += entry['stored_bytes']
+        total_text += entry['text_bytes']
+        click.echo(f"{entry['column']}: {entry['compressed']}/{entry['rows']} compressed, "
+                   f"{entry['stored_bytes']} bytes stored for {entry['text_bytes']} bytes of text")
+    saved = total_text - total_stored
+    click.echo(f"Saved {saved} bytes ({saved / total_text:.0%})" if total_text else "No text stored.")
+    page_size, free_pages = db.execute("PRAGMA page_size").fetchone()[0], db.execute("PRAGMA freelist_count").fetchone()[0]
+    if free_pages:
+        click.echo(f"{free_pages * page_size} bytes of the database file are free pages; run VACUUM to return them to the filesystem.")
+
+# --- Export ---
+
+EXPORT_CHUNK_SIZE = 1000
+EXPORT_FORMATS = ('ndjson', 'csv', 'columnar')
+# 'nested' is one document per profile with its related rows; 'flat' is one
+# row per profile with related rows folded into text columns.
+EXPORT_VIEWS = ('nested', 'flat', 'profiles') + CHILD_TABLES
+FLAT_COLUMNS = ('id',) + PROFILE_FIELDS + ('timestamp', 'experience', 'education', 'skills')
+
+def export_columns(view):
+    if view in ('profiles', 'nested'):
+        return ('id',) + PROFILE_FIELDS + ('timestamp',)
+    if view == 'flat':
+        return FLAT_COLUMNS
+    return ('id', 'profile_id') + CHILD_COLUMNS[view]
+
+def iter_table_chunks(db, table, columns, since=None, chunk_size=EXPORT_CHUNK_SIZE):
+    """Yield lists of rows from one table in id order, chunk_size at a time.
+
+    Each chunk is its own keyset query (id > last id), so no read transaction
+    or result set is held open across the whole export. since is either a
+    high-water mark (an int: profiles saved after it, by change_seq, which
+    every save increments) or a date or timestamp string (profiles saved at
+    or after it).
+    """
+    since_filter = ''
+    if since:
+        condition = 'change_seq > :since' if isinstance(since, int) else 'timestamp >= :since'
+        if table == 'profiles':
+            since_filter = f'AND {condition}'
+        else:
+            since_filter = f'AND profile_id IN (SELECT id FROM profiles WHERE {condition})'
+    sql = f"SELECT {select_list(table, tuple(columns))} FROM {table} WHERE id > :last_id {since_filter} ORDER BY id LIMIT :limit"
+    last_id = 0
+    while True:
+        rows = db.execute(sql, {'last_id': last_id, 'since': since, 'limit': chunk_size}).fetchall()
+        if not rows:
+            return
+        yield [tuple(row) for row in rows]
+        last_id = rows[-1][0]
+
+def iter_export_chunks(db, view, since=None, chunk_size=EXPORT_CHUNK_SIZE):
+    """Yield chunks of export records for a view: tuples for flat tables, dicts for 'nested'."""
+    if view not in ('nested', 'flat'):
+        yield from iter_table_chunks(db, view, export_columns(view), since, chunk_size)
+        return
+
+    profile_columns = export_columns('profiles')
+    for rows in iter_table_chunks(db, 'profiles', profile_columns, since, chunk_size):
+        children = load_profile_children(db, rows[0][0], rows[-1][0])
+        empty = {table: [] for table in CHILD_TABLES}
+        chunk = []
+        for row in rows:
+            related = children.get(row[0], empty)
+            if view == 'nested':
+                document = dict(zip(profile_columns, row))
+                for table, columns in CHILD_COLUMNS.items():
+                    document[table] = [dict(zip(columns, values)) for values in related[table]]
+                chunk.append(document)
+            else:
+                experience = CHILD_COLUMNS['experience']
+                chunk.append(row + (
+                    ' | '.join(f"{exp[experience.index('title')]} @ {exp[experience.index('company_name')]}" for exp in related['experience']),
+                    ' | '.join(edu[0] for edu in related['education']),
+                    '; '.join(skill[0] for skill in related['skills']),
+                ))
+        yield chunk
+
+def iter_export(db, fmt, view, since=None, chunk_size=EXPORT_CHUNK_SIZE):
+    """Yield the export as encoded byte chunks, one per database chunk."""
+    columns = export_columns(view)
+    if fmt == 'csv':
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(columns)
+        yield buffer.getvalue().encode('utf-8')
+    elif fmt == 'columnar':
+        yield (json.dumps({'view': view, 'columns': columns}) + '\n').encode('utf-8')
+
+    for chunk in iter_export_chunks(db, view, since, chunk_size):
+        if fmt == 'ndjson':
+            records = chunk if view == 'nested' else (dict(zip(columns, row)) for row in chunk)
+            yield ''.join(json.dumps(record, ensure_ascii=False) + '\n' for record in records).encode('utf-8')
+        elif fmt == 'csv':
+            buffer.seek(0)
+            buffer.truncate()
+            writer.writerows(chunk)
+            yield buffer.getvalue().encode('utf-8')
+        else:
+            # One record batch per chunk: a list of values for each column
+            yield (json.dumps({'rows': len(chunk), 'data': [list(values) for values in zip(*chunk)]}, ensure_ascii=False) + '\n').encode('utf-8')
+
+def gzip_stream(chunks):
+    """Gzip a stream of byte chunks without buffering it."""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+def parse_export_options(fmt, view, since):
+    """Validate export options, filling in the default view for the format. Raises ValueError."""
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown format {fmt!r}; expected one of {', '.join(EXPORT_FORMATS)}")
+    view = view or ('nested' if fmt == 'ndjson' else 'flat')
+    if view not in EXPORT_VIEWS:
+        raise ValueError(f"Unknown table {view!r}; expected one of {', '.join(EXPORT_VIEWS)}")
+    if view == 'nested' and fmt != 'ndjson':
+        raise ValueError("The nested view is only available as ndjson")
+    if since and since.isdigit():
+        since = int(since) # A high-water mark from an earlier export
+    elif since:
+        try:
+            parse_since_timestamp(since)
+        except ValueError:
+            raise ValueError("since must be a high-water mark from an earlier export, 'YYYY-MM-DD' or 'YYYY-MM-DD HH:MM:SS'")
+    return fmt, view, since
+
+@app.route('/api/export')
+def export_data():
+    """Stream the CRM as ndjson, csv or columnar batches.
+
+    Query parameters: format, table (a view from EXPORT_VIEWS), since (see
+    iter_table_chunks), gzip=1. The X-Export-High-Water-Mark header is the
+    value to pass as since on the next incremental run. Profiles saved while
+    an export streams can appear in it and in the next one, so readers
+    should keep the last record per id.
+    """
+    try:
+        fmt, view, since = parse_export_options(request.args.get('format', 'ndjson'), request.args.get('table'), request.args.get('since'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    # Read the high-water mark before streaming so rows saved during the export are picked up next time
+    high_water_mark = get_read_db().execute("SELECT max(change_seq) FROM profiles").fetchone()[0]
+    chunks = iter_export(get_read_db(), fmt, view, since)
+    extension = {'ndjson': 'ndjson', 'csv': 'csv', 'columnar': 'columnar.ndjson'}[fmt]
+    filename = f"crm-{view}-{datetime.date.today().isoformat()}.{extension}"
+    mimetype = 'text/csv' if fmt == 'csv' else 'application/x-ndjson'
+    if request.args.get('gzip') in ('1', 'true'):
+        # Served as a .gz file rather than Content-Encoding, so clients keep it compressed
+        chunks = gzip_stream(chunks)
+        filename += '.gz'
+        mimetype = 'application/gzip'
+    headers = {
+        'X-Export-High-Water-Mark': str(high_water_mark or 0),
+        'Content-Disposition': f'attachment; filename="{filename}"',
+    }
+    return app.response_class(stream_with_context(chunks), mimetype=mimetype, headers=headers)
+
+@app.cli.command('export')
+@click.option('--format', 'fmt', type=click.Choice(EXPORT_FORMATS), default='ndjson', show_default=True)
+@click.option('--table', 'view', type=click.Choice(EXPORT_VIEWS), default=None, help='Defaults to nested for ndjson, flat otherwise.')
+@click.option('--since', default=None, help="Only profiles saved after an earlier export's high-water mark, or since 'YYYY-MM-DD[ HH:MM:SS]'.")
+@click.option('--output', '-o', type=click.File('wb'), default='-', help='Output file (default stdout).')
+@click.option('--gzip', 'compress', is_flag=True, help='Gzip the output.')
+def export_command(fmt, view, since, output, compress):
+    """Export profiles and related tables, streaming in fixed-size chunks."""
+    try:
+        fmt, view, since = parse_export_options(fmt, view, since)
+    except ValueError as e:
+        raise click.BadParameter(str(e))
+    db = get_read_db()
+    high_water_mark = db.execute("SELECT max(change_seq) FROM profiles").fetchone()[0] or 0
+    chunks = iter_export(db, fmt, view, since)
+    if compress:
+        chunks = gzip_stream(chunks)
+    for chunk in chunks:
+        output.write(chunk)
+    click.echo(f"Export complete; next incremental run: --since {high_water_mark}", err=True)
+
+# --- Image proxy ---
+#
+# Profile and banner pictures are served from /images/<profile_id>/<kind>
+# instead of being hot-linked from LinkedIn's CDN, whose signed URLs expire.
+# Each source URL is downloaded once by a small pool of background threads:
+# after a save that commits it, or on its first view, which is answered
+# with a placeholder until the download lands. The download is
+# resized (when Pillow is installed) and kept in a content-addressed cache
+# on disk, next to the database and capped at IMAGE_CACHE_MAX_BYTES by
+# evicting the least recently served files. Image URLs carry a version of
+# the source URL (v=), so responses can be cached by browsers for good.
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = None
+
+IMAGE_CACHE_MAX_BYTES = int(os.environ.get('CRM_IMAGE_CACHE_MB', 512)) * 1024 * 1024
+IMAGE_FETCH_WORKERS = int(os.environ.get('CRM_IMAGE_FETCH_WORKERS', 4))
+IMAGE_PREFETCH = os.environ.get('CRM_IMAGE_PREFETCH', '1') != '0' # Download pictures when a save commits
+IMAGE_ALLOWED_HOSTS = re.compile(os.environ.get('CRM_IMAGE_HOSTS', r'(?:[\w-]+\.)*licdn\.com'), re.I)
+IMAGE_FETCH_TIMEOUT_SECONDS = 10
+IMAGE_FETCH_BACKLOG = 1000      # Queued prefetches beyond this are dropped; they are fetched on first view
+IMAGE_RETRY_SECONDS = 900       # A failed URL is not fetched again for this long
+IMAGE_MAX_DOWNLOAD_BYTES = 10 * 1024 * 1024
+IMAGE_TOUCH_SECONDS = 3600      # Granularity of the last-served time used for eviction
+IMAGE_MAX_AGE_SECONDS = 365 * 24 * 3600
+IMAGE_JPEG_QUALITY = 85
+
+# Bounding boxes of the stored variants, twice the size they are displayed at
+IMAGE_SIZES = {
+    'thumb': (120, 120),    # Listing avatars
+    'avatar': (240, 240),   # Detail page avatar
+    'banner': (1800, 450),  # Detail page banner
+}
+IMAGE_DEFAULT_SIZES = {'profile': 'avatar', 'banner': 'banner'}
+IMAGE_SIGNATURES = ((b'\xff\xd8\xff', 'jpg'), (b'\x89PNG\r\n\x1a\n', 'png'), (b'GIF87a', 'gif'), (b'GIF89a', 'gif'))
+IMAGE_MIMETYPES = {'jpg': 'image/jpeg', 'png': 'image/png', 'gif': 'image/gif', 'webp': 'image/webp'}
+
+PLACEHOLDER_SVG = {
+    'profile': '<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 60 60"><rect width="60" height="60" fill="#cccccc"/>'
+               '<circle cx="30" cy="23" r="11" fill="#ffffff"/><path d="M10 56c2-12 10-18 20-18s18 6 20 18z" fill="#ffffff"/></svg>',
+    'banner': '<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 900 150"><rect width="900" height="150" fill="#e1e9ee"/></svg>',
+}
+
+def image_cache_dir():
+    """Directory holding downloaded pictures, next to the database."""
+    return os.path.join(os.path.dirname(database_path()), 'images')
+
+def image_type(data):
+    """File extension for the image format of data, or None if it is not a supported image."""
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return 'webp'
+    for signature, extension in IMAGE_SIGNATURES:
+        if data.startswith(signature):
+            return extension
+    return None
+
+def image_version(url):
+    """Short hash of a source URL; it changes whenever the picture does."""
+    return hashlib.blake2b(url.encode('utf-8'), digest_size=6).hexdigest()
+
+def check_image_url(url):
+    """Raise ValueError unless url is http(s) on a host matching IMAGE_ALLOWED_HOSTS."""
+    parts = urllib.parse.urlsplit(url)
+    if parts.scheme not in ('http', 'https') or not IMAGE_ALLOWED_HOSTS.fullmatch(parts.hostname or ''):
+        raise ValueError(f"Image host not allowed: {parts.hostname}")
+
+class ImageRedirectHandler(urllib.request.HTTPRedirectHandler):
+    """Follows a redirect only when its Location is an allowed image host too."""
+
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        try:
+            check_image_url(newurl)
+        except ValueError:
+            fp.close()
+            raise
+        return super().redirect_request(req, fp, code, msg, headers, newurl)
+
+image_opener = urllib.request.build_opener(ImageRedirectHandler)
+
+def fetch_image(url):
+    """Default fetcher: download an image from an allowed host, with a timeout and a size limit."""
+    check_image_url(url)
+    fetch = urllib.request.Request(url, headers={'User-Agent': 'Mozilla/5.0 (compatible; LinkedInCRM)', 'Accept': 'image/*'})
+    with image_opener.open(fetch, timeout=IMAGE_FETCH_TIMEOUT_SECONDS) as response:
+        data = response.read(IMAGE_MAX_DOWNLOAD_BYTES + 1)
+    if len(data) > IMAGE_MAX_DOWNLOAD_BYTES:
+        raise ValueError("Image too large")
+    return data
+
+def resize_image(data, box):
+    """(bytes, extension) of data scaled down to fit box, or None if it already fits."""
+    with Image.open(io.BytesIO(data)) as image:
+        image = ImageOps.exif_transpose(image)
+        if image.width <= box[0] and image.height <= box[1]:
+            return None
+        image.thumbnail(box, Image.LANCZOS)
+        output = io.BytesIO()
+        if image.mode in ('RGBA', 'LA', 'P'):
+            image.save(output, 'PNG', optimize=True)
+            return output.getvalue(), 'png'
+        image.convert('RGB').save(output, 'JPEG', quality=IMAGE_JPEG_QUALITY, optimize=True, progressive=True)
+        return output.getvalue(), 'jpg'
+
+def write_file_atomically(path, data):
+    # Write beside the target and rename, so other workers never see a partial file
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.partial')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+class ImageCache:
+    """Downloads pictures in background threads and keeps them in a content-addressed disk cache.
+
+    sources/<hash of URL>.json records which stored files a source URL
+    resolved to; the files themselves are named by a hash of the downloaded
+    bytes, so one picture reached through several signed URLs is stored
+    once. Everything lives on disk and is written atomically, so worker
+    processes share the cache. fetcher(url) -> bytes is replaceable, e.g. by
+    one that talks to a local fake server.
+    """
+
+    def __init__(self, fetcher=fetch_image, max_bytes=IMAGE_CACHE_MAX_BYTES, workers=IMAGE_FETCH_WORKERS):
+        self.fetcher = fetcher
+        self.max_bytes = max_bytes
+        self.workers = workers
+        self._lock = threading.Lock()
+        self._evict_lock = threading.Lock()
+        self._queue = None
+        self._pid = None
+        self._sequence = 0
+        self._inflight = {}   # url -> Event set when its download finishes
+        self._failed = {}     # url -> time.monotonic() of its last failed download
+        self._bytes = None    # Estimated size of the cache directory
+        self._local = threading.local()
+
+    def source_path(self, url):
+        return os.path.join(image_cache_dir(), 'sources', f"{hashlib.blake2b(url.encode('utf-8'), digest_size=16).hexdigest()}.json")
+
+    def lookup(self, url, size):
+        """(path, mimetype) of the cached size variant of url, or None if it has not been downloaded."""
+        source = self.source_path(url)
+        try:
+            with open(source) as f:
+                name = json.load(f)[size]
+            path = os.path.join(image_cache_dir(), name)
+            if time.time() - os.stat(path).st_mtime > IMAGE_TOUCH_SECONDS:
+                os.utime(path)
+                os.utime(source)
+        except (OSError, ValueError, KeyError):
+            return None # Never downloaded, evicted, or written by an older version
+        return path, IMAGE_MIMETYPES[name.rsplit('.', 1)[1]]
+
+    def request(self, url, prefetch=False):
+        """Queue url for download unless it is in flight or failed recently.
+
+        Views go ahead of prefetches. Returns an Event set when the download
+        finishes, or None if nothing was queued.
+        """
+        with self._lock:
+            if self._pid != os.getpid():
+                # First use, or a forked worker whose parent's threads did not survive
+                self._pid = os.getpid()
+                self._queue = queue.PriorityQueue()
+                self._inflight = {}
+                for number in range(self.workers):
+                    threading.Thread(target=self._run, name=f'image-fetch-{number}', daemon=True).start()
+            event = self._inflight.get(url)
+            if event is not None:
+                return event
+            failed = self._failed.get(url)
+            if failed is not None and time.monotonic() - failed < IMAGE_RETRY_SECONDS:
+                return None
+            if prefetch and self._queue.qsize() >= IMAGE_FETCH_BACKLOG:
+                return None
+            event = self._inflight[url] = threading.Event()
+            self._sequence += 1
+            self._queue.put((1 if prefetch else 0, self._sequence, url))
+        return event
+
+    def _run(self):
+        while True:
+            _, _, url = self._queue.get()
+            try:
+                self.store(url, self.fetcher(url))
+                metrics.inc('crm_image_fetches_total', (('result', 'ok'),))
+            except Exception as e:
+                logger.warning("Could not download image %s: %s", url, e)
+                metrics.inc('crm_image_fetches_total', (('result', 'failed'),))
+                with self._lock:
+                    now = time.monotonic()
+                    if len(self._failed) > 10000:
+                        self._failed = {key: value for key, value in self._failed.items() if now - value < IMAGE_RETRY_SECONDS}
+                    self._failed[url] = now
+            finally:
+                with self._lock:
+                    event = self._inflight.pop(url, None)
+                if event is not None:
+                    event.set()
+
+    def store(self, url, data):
+        """Store downloaded bytes for url as one file per size (the original when Pillow is missing)."""
+        extension = image_type(data)
+        if extension is None:
+            raise ValueError("Not a supported image")
+        digest = hashlib.blake2b(data, digest_size=16).hexdigest()
+        files = {}
+        names = {}
+        for size, box in IMAGE_SIZES.items():
+            resized = resize_image(data, box) if Image is not None else None
+            if resized is None:
+                names[size] = f"{digest[:2]}/{digest}.{extension}"
+                files[names[size]] = data
+            else:
+                names[size] = f"{digest[:2]}/{digest}-{size}.{resized[1]}"
+                files[names[size]] = resized[0]
+        added = 0
+        for name, content in files.items():
+            path = os.path.join(image_cache_dir(), name)
+            if not os.path.exists(path): # Content-addressed: an existing file already holds these bytes
+                write_file_atomically(path, content)
+                added += len(content)
+        write_file_atomically(self.source_path(url), json.dumps(names).encode('utf-8'))
+        self._account(added)
+
+    def _account(self, added):
+        with self._evict_lock:
+            if self._bytes is None:
+                self._bytes = sum(size for _, size, _ in self._scan())
+            self._bytes += added
+            if self._bytes > self.max_bytes:
+                self._bytes = self.evict()
+
+    def _scan(self):
+        for root, _, names in os.walk(image_cache_dir()):
+            for name in names:
+                try:
+                    stat = os.stat(os.path.join(root, name))
+                except OSError:
+                    continue
+                yield stat.st_mtime, stat.st_size, os.path.join(root, name)
+
+    def evict(self, target=None):
+        """Delete the least recently served files until the cache is below target (90% of the cap). Returns its size."""
+        target = self.max_bytes * 0.9 if target is None else target
+        files = sorted(self._scan())
+        total = sum(size for _, size, _ in files)
+        removed = 0
+        for _, size, path in files:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass # Already evicted by another worker
+            total -= size
+            removed += 1
+        if removed:
+            logger.info("Evicted %d cached images; %d bytes remain", removed, total)
+        return total
+
+    def stage(self, *urls):
+        """Remember pictures of a profile being written; publish() downloads them after the commit."""
+        if IMAGE_PREFETCH:
+            self._local.__dict__.setdefault('staged', {}).update(dict.fromkeys(url for url in urls if url))
+
+    def publish(self):
+        staged = self._local.__dict__.pop('staged', ())
+        for url in staged:
+            if self.lookup(url, next(iter(IMAGE_SIZES))) is None:
+                self.request(url, prefetch=True)
+
+    def discard(self):
+        self._local.__dict__.pop('staged', None)
+
+    def mark(self):
+        return len(self._local.__dict__.get('staged', ()))
+
+    def rollback_to(self, mark):
+        staged = self._local.__dict__.get('staged', {})
+        for url in list(staged)[mark:]:
+            del staged[url]
+
+image_cache = ImageCache()
+
+@app.template_global()
+def image_src(profile, kind, size=None):
+    """URL of a profile's picture (kind 'profile' or 'banner') through the image proxy."""
+    url = profile.get(f'{kind}_pic_url')
+    if not url or 'id' not in profile:
+        return f'/images/placeholder/{kind}.svg'
+    return f"/images/{profile['id']}/{kind}?size={size or IMAGE_DEFAULT_SIZES[kind]}&v={image_version(url)}"
+
+@app.route('/images/placeholder/<any(profile, banner):kind>.svg')
+def image_placeholder(kind):
+    response = app.response_class(PLACEHOLDER_SVG[kind], mimetype='image/svg+xml')
+    response.cache_control.public = True
+    response.cache_control.max_age = IMAGE_MAX_AGE_SECONDS
+    return response
+
+@app.route('/images/<int:profile_id>/<any(profile, banner):kind>')
+def profile_image(profile_id, kind):
+    """Serve a profile's picture from the image cache, or a placeholder while it downloads."""
+    size = request.args.get('size', IMAGE_DEFAULT_SIZES[kind])
+    if size not in IMAGE_SIZES:
+        return jsonify({"error": f"size must be one of {', '.join(IMAGE_SIZES)}"}), 400
+    row = get_read_db().execute(f"SELECT {kind}_pic_url FROM profiles WHERE id = ?", (profile_id,)).fetchone()
+    if row is None:
+        return jsonify({"error": "Profile not found"}), 404
+    url = row[0]
+    cached = image_cache.lookup(url, size) if url else None
+    if cached is None and url:
+        # 1. First view: queue the download without holding the worker on it
+        image_cache.request(url)
+    if cached is None:
+        # 2. No picture (yet); the browser asks again next time
+        response = image_placeholder(kind)
+        response.cache_control.max_age = 0 if url else 3600
+        return response
+    # 3. The v= of image_src() pins the source URL, so that response never changes
+    pinned = request.args.get('v') == image_version(url)
+    response = send_file(cached[0], mimetype=cached[1], conditional=True, max_age=IMAGE_MAX_AGE_SECONDS if pinned else 300)
+    response.headers['X-Content-Type-Options'] = 'nosniff'
+    response.cache_control.immutable = pinned
+    return response
+
+@app.cli.command('prune-images')
+@click.option('--max-mb', type=int, default=None, help='Shrink the image cache to this size (default: the configured cap).')
+def prune_images_command(max_mb):
+    """Evict the least recently served images until the cache fits its size cap."""
+    target = max_mb * 1024 * 1024 if max_mb is not None else image_cache.max_bytes * 0.9
+    click.echo(f"Image cache holds {image_cache.evict(target)} bytes.")
+
+# --- Extension download ---
+
+EXTENSION_ZIP_NAME = 'linkedin_crm_extension.zip'
+
+extension_build_lock = threading.Lock()
+
+def find_extension_dir():
+    """Locate the extension sources, or None if they are missing."""
     # Try primary extension path
     extension_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'linkedin_crm/extension')
     if not os.path.exists(extension_dir):
         # Try alternative path
-        alt_extension_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'extension')
-        if os.path.exists(alt_extension_dir):
-            extension_dir = alt_extension_dir
-            print(f"Using alternative extension path: {extension_dir}")
-        else:
-            return jsonify({"error": "Extension directory not found"}), 404
-    
-    # Create a temporary directory
-    temp_dir = tempfile.mkdtemp()
-    zip_path = os.path.join(temp_dir, 'linkedin_crm_extension.zip')
-    
+        extension_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'extension')
+        if not os.path.exists(extension_dir):
+            return None
+    return extension_dir
+
+def extension_fingerprint(extension_dir):
+    """Hash of every file's relative path, size and mtime; changes whenever the sources do."""
+    digest = hashlib.blake2b(digest_size=12)
+    for root, dirs, files in os.walk(extension_dir):
+        dirs.sort()
+        for name in sorted(files):
+            path = os.path.join(root, name)
+            stat = os.stat(path)
+            digest.update(f"{os.path.relpath(path, extension_dir)}\0{stat.st_size}\0{stat.st_mtime_ns}\n".encode('utf-8'))
+    return digest.hexdigest()
+
+def extension_cache_dir():
+    """Directory of built extension zips, named by a fingerprint of the sources; next to the database."""
+    return os.path.join(os.path.dirname(database_path()), 'extension_cache')
+
+def build_extension_zip(extension_dir, fingerprint):
+    """Return the cached zip for this fingerprint, building it first if needed."""
+    cache_dir = extension_cache_dir()
+    zip_path = os.path.join(cache_dir, f'extension-{fingerprint}.zip')
+    if os.path.exists(zip_path):
+        return zip_path
+    with extension_build_lock:
+        if os.path.exists(zip_path):
+            return zip_path
+        os.makedirs(cache_dir, exist_ok=True)
+        # Build beside the target and rename, so other workers never see a partial file
+        fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix='.partial')
+        try:
+            with os.fdopen(fd, 'wb') as raw, zipfile.ZipFile(raw, 'w', zipfile.ZIP_DEFLATED) as archive:
+                for root, dirs, files in os.walk(extension_dir):
+                    dirs.sort()
+                    for name in sorted(files):
+                        path = os.path.join(root, name)
+                        archive.write(path, os.path.relpath(path, extension_dir))
+            os.replace(tmp_path, zip_path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        logger.info("Built extension zip: %s", zip_path)
+        # Older builds are no longer served
+        for name in os.listdir(cache_dir):
+            path = os.path.join(cache_dir, name)
+            if path != zip_path and name.startswith('extension-') and name.endswith('.zip'):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+    return zip_path
+
+@app.route('/download-extension')
+def download_extension():
+    """Send a zip of the extension directory, rebuilt only when its files change."""
+    extension_dir = find_extension_dir()
+    if extension_dir is None:
+        return jsonify({"error": "Extension directory not found"}), 404
+
     try:
-        # Create a zip file of the extension directory
-        shutil.make_archive(os.path.splitext(zip_path)[0], 'zip', extension_dir)
-        return send_file(zip_path, as_attachment=True, download_name='linkedin_crm_extension.zip')
+        fingerprint = extension_fingerprint(extension_dir)
+        zip_path = build_extension_zip(extension_dir, fingerprint)
+        # conditional=True gives If-None-Match/If-Modified-Since and Range support
+        return send_file(zip_path, mimetype='application/zip', as_attachment=True, download_name=EXTENSION_ZIP_NAME,
+                         conditional=True, etag=fingerprint, max_age=0)
     except Exception as e:
-        print(f"Error creating extension zip: {e}")
+        logger.error("Error creating extension zip: %s", e)
         return jsonify({"error": f"Error creating extension zip: {str(e)}"}), 500
 
+# WSGI entry point imported by passenger_wsgi.py
+application = app
+
+STARTUP_TIMINGS['import_ms'] = round((time.perf_counter() - STARTUP_STARTED) * 1000, 2)
+
 if __name__ == '__main__':
-    # Only run the built-in server when executed directly, not when imported by Passenger
+    # Only run the built-in server when executed directly. When imported (e.g.
+    # by Passenger) nothing touches the database until the first request.
     init_db() # Initialize DB schema
     app.run(host='0.0.0.0', port=7000, debug=False)
-else:
-    # When imported by Passenger, just initialize the database
-    with app.app_context():
-        init_db()
\ No newline at end of file
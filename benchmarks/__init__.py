@@ -0,0 +1 @@
+"""Performance benchmarks for the LinkedIn CRM backend (see run.py)."""
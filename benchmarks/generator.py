@@ -0,0 +1,145 @@
+"""Seeded generator of synthetic profile payloads.
+
+Payloads have the same shape as what extension/content.js posts to
+/api/save_profile: top card fields, long about text, featured items,
+experience including multi-role entries, education, skills as plain
+strings and received recommendations. Companies, schools and skills are
+drawn from skewed distributions so a few are very common, as on LinkedIn.
+"""
+import random
+import zlib
+
+FIRST_NAMES = ['Alex', 'Maria', 'Wei', 'Fatima', 'John', 'Priya', 'Lucas', 'Aisha', 'Kenji', 'Sofia', 'Omar', 'Emma',
+               'Carlos', 'Yuki', 'Daniel', 'Amara', 'Ivan', 'Chloe', 'Mateo', 'Zara', 'Noah', 'Leila', 'Samuel', 'Ingrid']
+LAST_NAMES = ['Smith', 'Garcia', 'Chen', 'Khan', 'Müller', 'Patel', 'Silva', 'Okafor', 'Tanaka', 'Rossi', 'Haddad', 'Johnson',
+              'Novak', 'Kim', 'Dubois', 'Nguyen', 'Andersson', 'Kowalski', 'Lopez', 'Ivanova', 'Mensah', 'Cohen', "O'Brien", 'Sato']
+CITIES = ['Berlin, Germany', 'London, England, United Kingdom', 'San Francisco Bay Area', 'New York, New York, United States',
+          'Bengaluru, Karnataka, India', 'Lagos, Nigeria', 'São Paulo, Brazil', 'Toronto, Ontario, Canada', 'Singapore',
+          'Paris, Île-de-France, France', 'Addis Ababa, Ethiopia', 'Sydney, New South Wales, Australia']
+TITLES = ['Software Engineer', 'Senior Software Engineer', 'Product Manager', 'Data Scientist', 'Engineering Manager',
+          'Sales Director', 'Account Executive', 'UX Designer', 'Marketing Manager', 'Founder', 'CTO', 'Recruiter',
+          'Business Analyst', 'DevOps Engineer', 'Customer Success Manager', 'Head of Growth', 'Research Scientist']
+COMPANY_WORDS = ['Acme', 'Globex', 'Initech', 'Umbrella', 'Stark', 'Wayne', 'Hooli', 'Pied Piper', 'Vandelay', 'Soylent',
+                 'Tyrell', 'Cyberdyne', 'Aperture', 'Massive Dynamic', 'Wonka', 'Gringotts', 'Oceanic', 'Monarch']
+COMPANY_SUFFIXES = ['', ' Inc.', ' Labs', ' Technologies', ' Group', ' GmbH', ' Ltd', ' Systems', ' Capital', ' Health']
+SCHOOL_WORDS = ['Stanford', 'Oxford', 'MIT', 'ETH Zürich', 'IIT Delhi', 'University of Lagos', 'Tsinghua', 'Sorbonne',
+                'Addis Ababa University', 'University of Toronto', 'NUS', 'TU München', 'UC Berkeley', 'USP']
+DEGREES = ["Bachelor of Science - BS", "Master of Science - MS", "Master of Business Administration - MBA",
+           "Doctor of Philosophy - PhD", "Bachelor of Arts - BA"]
+FIELDS = ['Computer Science', 'Economics', 'Electrical Engineering', 'Marketing', 'Mathematics', 'Design', 'Physics']
+SKILL_WORDS = ['Python', 'JavaScript', 'SQL', 'Leadership', 'Machine Learning', 'Project Management', 'React', 'AWS',
+               'Negotiation', 'Public Speaking', 'Docker', 'Kubernetes', 'Go', 'Rust', 'Figma', 'SaaS Sales', 'Excel',
+               'Data Analysis', 'Product Strategy', 'Agile Methodologies', 'Recruiting', 'SEO', 'Go-to-Market', 'Java']
+WORDS = ('the team built scalable platform customers revenue growth launched shipped led engineers designed improved '
+         'data pipeline reduced latency cost hiring strategy roadmap partnership enterprise market users mobile cloud '
+         'analytics security compliance onboarding retention experiments global product quality mentoring').split()
+MONTHS = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
+
+class PayloadGenerator:
+    """Deterministic stream of synthetic profile payloads for a given seed."""
+
+    def __init__(self, seed=0, companies=5000, schools=800, skills=3000):
+        self.seed = seed
+        self.random = random.Random(seed)
+        rnd = random.Random(seed + 1)
+        self.companies = [f"{rnd.choice(COMPANY_WORDS)}{' ' + str(i) if i >= len(COMPANY_WORDS) else ''}{rnd.choice(COMPANY_SUFFIXES)}"
+                          for i in range(companies)]
+        self.schools = [f"{SCHOOL_WORDS[i % len(SCHOOL_WORDS)]}{' Campus ' + str(i) if i >= len(SCHOOL_WORDS) else ''}" for i in range(schools)]
+        self.skills = [SKILL_WORDS[i] if i < len(SKILL_WORDS) else f"{rnd.choice(SKILL_WORDS)} {i}" for i in range(skills)]
+
+    def _skewed(self, items, alpha=1.2):
+        # Pareto-distributed index: a few items are picked very often, most rarely
+        index = int(self.random.paretovariate(alpha)) - 1
+        return items[index % len(items)]
+
+    def _text(self, min_words, max_words):
+        return ' '.join(self.random.choice(WORDS) for _ in range(self.random.randint(min_words, max_words))).capitalize() + '.'
+
+    def _date_range(self):
+        start_year = self.random.randint(1995, 2023)
+        start = f"{self.random.choice(MONTHS)} {start_year}"
+        if self.random.random() < 0.3:
+            return start, 'Present'
+        return start, f"{self.random.choice(MONTHS)} {self.random.randint(start_year, 2024)}"
+
+    def _experience(self):
+        entries = []
+        for _ in range(self.random.randint(1, 8)):
+            company = self._skewed(self.companies)
+            company_url = f"https://www.linkedin.com/company/{zlib.crc32(company.encode()) % 10**7}/"
+            roles = self.random.randint(2, 4) if self.random.random() < 0.2 else 1
+            for _ in range(roles):
+                start, end = self._date_range()
+                entries.append({
+                    'title': self.random.choice(TITLES),
+                    'company_name': company,
+                    'company_linkedin_url': company_url,
+                    'employment_type': self.random.choice(['Full-time', 'Part-time', 'Contract', 'Self-employed', None]),
+                    'location': self.random.choice(CITIES) if self.random.random() < 0.7 else None,
+                    'start_date': start,
+                    'end_date': end,
+                    'duration': f"{self.random.randint(1, 9)} yrs {self.random.randint(1, 11)} mos",
+                    'description': self._text(10, 120) if self.random.random() < 0.6 else None,
+                    'is_multi_role': 1 if roles > 1 else 0,
+                    'parent_experience_id': None,
+                })
+        return entries
+
+    def _education(self):
+        entries = []
+        for _ in range(self.random.randint(0, 3)):
+            start, end = self._date_range()
+            entries.append({
+                'school_name': self._skewed(self.schools),
+                'school_linkedin_url': None,
+                'degree_name': self.random.choice(DEGREES),
+                'field_of_study': self.random.choice(FIELDS),
+                'start_date': start,
+                'end_date': end,
+                'grade': self.random.choice([None, '3.8', 'First Class Honours']),
+                'activities': self._text(3, 15) if self.random.random() < 0.3 else None,
+                'description': self._text(5, 40) if self.random.random() < 0.3 else None,
+            })
+        return entries
+
+    def profile(self, index):
+        """Payload for the index-th synthetic person; the same (seed, index) always gives the same payload."""
+        self.random = random.Random(f"{self.seed}:{index}")
+        name = f"{self.random.choice(FIRST_NAMES)} {self.random.choice(LAST_NAMES)}"
+        slug = f"{name.lower().replace(' ', '-').replace(chr(39), '')}-{index:07d}"
+        return {
+            'linkedin_url': f"https://www.linkedin.com/in/{slug}/",
+            'name': name,
+            'headline': f"{self.random.choice(TITLES)} at {self._skewed(self.companies)} | {self._text(3, 10)}",
+            'location': self.random.choice(CITIES),
+            'profile_pic_url': f"https://media.licdn.com/dms/image/v2/{index:x}/profile-displayphoto-shrink_800_800/0/{self.random.getrandbits(40)}?e=1735776000&v=beta&t=x",
+            'banner_pic_url': f"https://media.licdn.com/dms/image/v2/{index:x}/profile-displaybackgroundimage-shrink_350_1400/0/{self.random.getrandbits(40)}",
+            'website': f"https://example.com/{slug}" if self.random.random() < 0.2 else None,
+            'followers': f"{self.random.randint(10, 50000):,}" if self.random.random() < 0.8 else None,
+            'connections': '500+' if self.random.random() < 0.6 else str(self.random.randint(1, 499)),
+            'about': self._text(40, 400) if self.random.random() < 0.75 else None,
+            'featured': [{'title': self._text(3, 8), 'link': f"https://example.com/post/{self.random.getrandbits(32)}",
+                          'description': self._text(5, 30), 'image_url': None, 'type': self.random.choice(['Link', 'Post', 'Article'])}
+                         for _ in range(self.random.randint(0, 3))],
+            'experience': self._experience(),
+            'education': self._education(),
+            'skills': list(dict.fromkeys(self._skewed(self.skills, 0.8) for _ in range(self.random.randint(0, 50)))),
+            'recommendations': [{'recommender_name': f"{self.random.choice(FIRST_NAMES)} {self.random.choice(LAST_NAMES)}",
+                                 'recommender_headline': self.random.choice(TITLES),
+                                 'recommender_linkedin_url': f"https://www.linkedin.com/in/rec-{self.random.getrandbits(32):x}/",
+                                 'relationship': 'worked with them on the same team',
+                                 'recommendation_text': self._text(30, 200)}
+                                for _ in range(self.random.randint(0, 4) if self.random.random() < 0.4 else 0)],
+        }
+
+    def edited(self, payload):
+        """A copy of payload with the kind of change a re-scrape picks up (new job, headline, skills)."""
+        changed = dict(payload)
+        change = self.random.random()
+        if change < 0.4:
+            changed['headline'] = f"{self.random.choice(TITLES)} at {self._skewed(self.companies)}"
+        elif change < 0.7:
+            changed['experience'] = self._experience()[:1] + list(payload['experience'])
+        else:
+            changed['skills'] = list(payload['skills'][1:]) + [self._skewed(self.skills)]
+        return changed
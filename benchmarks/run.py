@@ -0,0 +1,248 @@
+"""Benchmark harness for the CRM's hot endpoints.
+
+Populates SQLite databases of the requested sizes with synthetic payloads
+(see generator.py), then drives the Flask app through its test client,
+single-threaded and with a thread pool, and reports throughput and
+p50/p95/p99 latency per endpoint. Results are written as JSON so runs can
+be compared:
+
+    python -m benchmarks.run --sizes 10000,100000 --output before.json
+    python -m benchmarks.run --sizes 10000,100000 --output after.json --compare before.json
+
+Populated databases are kept in --db-dir and reused by later runs with
+the same size and seed.
+"""
+import argparse
+import concurrent.futures
+import datetime
+import json
+import os
+import platform
+import random
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.generator import PayloadGenerator
+
+POPULATE_BATCH = 1000
+BULK_REQUEST_SIZE = 100 # Profiles per request in the bulk save scenario
+SEARCH_TERMS = ['python', 'acme', 'engineer', 'berlin', 'product manager', 'leader', 'stanford', 'kubernetes']
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * (len(sorted_values) - 1)))))
+    return sorted_values[index]
+
+def summarize(name, latencies, errors, wall_seconds, threads):
+    ordered = sorted(latencies)
+    to_ms = lambda value: round(value * 1000, 3) if value is not None else None
+    return {
+        'endpoint': name,
+        'threads': threads,
+        'requests': len(latencies),
+        'errors': errors,
+        'throughput_rps': round(len(latencies) / wall_seconds, 1) if wall_seconds else None,
+        'p50_ms': to_ms(percentile(ordered, 0.50)),
+        'p95_ms': to_ms(percentile(ordered, 0.95)),
+        'p99_ms': to_ms(percentile(ordered, 0.99)),
+        'max_ms': to_ms(ordered[-1] if ordered else None),
+    }
+
+class Benchmark:
+    """Runs every scenario against one populated database."""
+
+    def __init__(self, crm, size, seed, requests, threads):
+        self.crm = crm
+        self.size = size
+        self.seed = seed
+        self.requests = requests
+        self.threads = threads
+        self._local = threading.local()
+
+    def client(self):
+        # Test clients and generators are cheap but not safe to share across threads
+        if not hasattr(self._local, 'client'):
+            self._local.client = self.crm.app.test_client()
+        return self._local.client
+
+    @property
+    def generator(self):
+        if not hasattr(self._local, 'generator'):
+            self._local.generator = PayloadGenerator(self.seed)
+        return self._local.generator
+
+    def measure(self, name, make_request, threads=1, count=None):
+        """Call make_request(i) count times across threads; each call returns a response."""
+        count = count or self.requests
+        latencies = []
+        errors = 0
+        lock = threading.Lock()
+
+        def one(i):
+            nonlocal errors
+            started = time.perf_counter()
+            response = make_request(i)
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies.append(elapsed)
+                if response.status_code >= 400:
+                    errors += 1
+
+        wall_started = time.perf_counter()
+        if threads == 1:
+            for i in range(count):
+                one(i)
+        else:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=threads) as pool:
+                list(pool.map(one, range(count)))
+        return summarize(name, latencies, errors, time.perf_counter() - wall_started, threads)
+
+    def scenarios(self):
+        rnd = random.Random(self.seed)
+        size = self.size
+        first_page = self.client().get('/api/profiles?per_page=50').get_json()
+        deep_cursor = None
+        if first_page and first_page.get('next_cursor'):
+            # A cursor half-way through the table, to show deep pages cost the same as the first
+            middle = self.crm.sqlite3.connect(self.crm.database_path()).execute(
+                "SELECT timestamp, id FROM profiles ORDER BY timestamp DESC, id DESC LIMIT 1 OFFSET ?", (size // 2,)).fetchone()
+            if middle:
+                deep_cursor = self.crm.encode_page_cursor(middle[0], middle[1])
+        new_index = iter(range(size, size * 10))
+
+        return [
+            ('POST /api/save_profile (new)', lambda i: self.client().post('/api/save_profile', json=self.generator.profile(next(new_index)))),
+            ('POST /api/save_profile (unchanged re-save)', lambda i: self.client().post('/api/save_profile', json=self.generator.profile(rnd.randrange(size)))),
+            ('POST /api/save_profile (edited re-save)', lambda i: self.client().post('/api/save_profile', json=self.generator.edited(self.generator.profile(rnd.randrange(size))))),
+            (f'POST /api/save_profiles (batch of {BULK_REQUEST_SIZE})', lambda i: self.client().post('/api/save_profiles', json=[self.generator.profile(next(new_index)) for _ in range(BULK_REQUEST_SIZE)])),
+            ('GET / (first page)', lambda i: self.client().get('/')),
+            ('GET /api/profiles (first page)', lambda i: self.client().get('/api/profiles')),
+            ('GET /api/profiles (deep page)', lambda i: self.client().get('/api/profiles', query_string={'cursor': deep_cursor} if deep_cursor else {})),
+            ('GET /profile/<id> (cold cache)', lambda i: (self.crm.profile_cache.clear(), self.client().get(f'/profile/{rnd.randint(1, size)}'))[1]),
+            ('GET /profile/<id> (warm cache)', lambda i: self.client().get(f'/profile/{1 + i % 50}')),
+            ('GET /api/profiles/<id>', lambda i: self.client().get(f'/api/profiles/{rnd.randint(1, size)}')),
+            ('GET /api/search', lambda i: self.client().get('/api/search', query_string={'q': rnd.choice(SEARCH_TERMS)})),
+        ]
+
+    def run(self):
+        results = []
+        for name, make_request in self.scenarios():
+            count = max(1, self.requests // 20) if 'batch' in name else None
+            results.append(self.measure(name, make_request, threads=1, count=count))
+            if self.threads > 1:
+                results.append(self.measure(name, make_request, threads=self.threads, count=count))
+            print(f"  {name}: " + ', '.join(
+                f"{r['threads']}t {r['throughput_rps']} req/s p50 {r['p50_ms']}ms p99 {r['p99_ms']}ms" for r in results[-(2 if self.threads > 1 else 1):]),
+                file=sys.stderr)
+        return results
+
+def bulk_speedup(results):
+    """How many times cheaper a profile is in a bulk request than alone: single-threaded p50s, per profile."""
+    p50 = {r['endpoint']: r['p50_ms'] for r in results if r['threads'] == 1}
+    single, bulk = p50.get('POST /api/save_profile (new)'), p50.get(f'POST /api/save_profiles (batch of {BULK_REQUEST_SIZE})')
+    if not single or not bulk:
+        return None
+    return {'single_ms_per_profile': single, 'bulk_ms_per_profile': round(bulk / BULK_REQUEST_SIZE, 3),
+            'speedup': round(single * BULK_REQUEST_SIZE / bulk, 2)}
+
+def populate(crm, path, size, seed):
+    """Create (or reuse) a database at path holding size synthetic profiles."""
+    if os.path.exists(path):
+        existing = sqlite3.connect(path).execute("SELECT count(*) FROM profiles").fetchone()[0]
+        if existing >= size:
+            print(f"Reusing {path} ({existing} profiles)", file=sys.stderr)
+            return 0.0
+    generator = PayloadGenerator(seed)
+    client = crm.app.test_client()
+    started = time.perf_counter()
+    for start in range(0, size, POPULATE_BATCH):
+        batch = [generator.profile(i) for i in range(start, min(size, start + POPULATE_BATCH))]
+        response = client.post('/api/save_profiles', json=batch)
+        if response.status_code != 200 or not response.get_json()['success']:
+            raise RuntimeError(f"Populating failed at profile {start}: {response.get_data(as_text=True)[:500]}")
+        if start and start % (POPULATE_BATCH * 50) == 0:
+            print(f"  populated {start}/{size}", file=sys.stderr)
+    elapsed = time.perf_counter() - started
+    print(f"Populated {size} profiles in {elapsed:.1f}s ({size / elapsed:.0f}/s)", file=sys.stderr)
+    return elapsed
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL,
+                                       cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except Exception:
+        return None
+
+def compare(current, baseline_path):
+    """Print throughput and p95 changes against a previous results file."""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    previous = {(run['size'], r['endpoint'], r['threads']): r for run in baseline['runs'] for r in run['results']}
+    print(f"\nCompared with {baseline_path} ({baseline.get('git_revision')}):")
+    for run in current['runs']:
+        for r in run['results']:
+            old = previous.get((run['size'], r['endpoint'], r['threads']))
+            if not old or not old['throughput_rps'] or not old['p95_ms']:
+                continue
+            throughput = (r['throughput_rps'] / old['throughput_rps'] - 1) * 100
+            p95 = (r['p95_ms'] / old['p95_ms'] - 1) * 100
+            print(f"  [{run['size']}] {r['endpoint']} ({r['threads']}t): throughput {throughput:+.1f}%, p95 {p95:+.1f}%")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='10000', help='Comma-separated profile counts, e.g. 10000,100000,1000000')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--requests', type=int, default=500, help='Requests per scenario')
+    parser.add_argument('--threads', type=int, default=8, help='Concurrent clients for the threaded pass (1 to skip it)')
+    parser.add_argument('--db-dir', default=os.path.join(tempfile.gettempdir(), 'crm-benchmarks'))
+    parser.add_argument('--output', default='benchmark-results.json')
+    parser.add_argument('--compare', help='Earlier results file to compare against')
+    args = parser.parse_args(argv)
+
+    os.makedirs(args.db_dir, exist_ok=True)
+    # Point the app at the benchmark databases before it resolves its own path
+    os.environ['CRM_DATABASE'] = os.path.join(args.db_dir, 'unused.db')
+    # Generated picture URLs point nowhere; don't let background downloads skew the timings
+    os.environ.setdefault('CRM_IMAGE_PREFETCH', '0')
+    import app as crm
+
+    report = {
+        'started_at': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        'git_revision': git_revision(),
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'platform': platform.platform(),
+        'args': vars(args),
+        'runs': [],
+    }
+    for size in [int(value) for value in args.sizes.split(',')]:
+        path = os.path.join(args.db_dir, f'crm-{size}-seed{args.seed}.db')
+        crm.DATABASE = path
+        # Connections, interned names and text dictionaries are kept per database
+        # file; the rendered-profile cache is keyed by profile id and must be emptied
+        crm.profile_cache.clear()
+        print(f"Size {size}: {path}", file=sys.stderr)
+        populate_seconds = populate(crm, path, size, args.seed)
+        results = Benchmark(crm, size, args.seed, args.requests, args.threads).run()
+        speedup = bulk_speedup(results)
+        if speedup:
+            print(f"  Bulk save: {speedup['bulk_ms_per_profile']}ms per profile in batches of {BULK_REQUEST_SIZE} vs "
+                  f"{speedup['single_ms_per_profile']}ms saved alone, {speedup['speedup']}x", file=sys.stderr)
+        report['runs'].append({'size': size, 'database': path, 'populate_seconds': round(populate_seconds, 1),
+                               'bulk_speedup': speedup, 'results': results})
+
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {args.output}", file=sys.stderr)
+    if args.compare:
+        compare(report, args.compare)
+
+if __name__ == '__main__':
+    main()
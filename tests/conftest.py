@@ -0,0 +1,46 @@
+"""Shared fixtures: each test runs the app against a fresh database of its own."""
+import os
+
+os.environ.setdefault('CRM_IMAGE_PREFETCH', '0') # Saves must not start picture downloads
+
+import pytest
+
+import app as crm
+
+@pytest.fixture
+def crm_app(tmp_path, monkeypatch):
+    monkeypatch.setattr(crm, 'DATABASE', str(tmp_path / 'database.db'))
+    crm.profile_cache.clear() # Keyed by profile id, not by database
+    return crm
+
+@pytest.fixture
+def client(crm_app):
+    return crm_app.app.test_client()
+
+@pytest.fixture
+def db(crm_app):
+    return crm_app.db_pool.connection(crm_app.database_path())
+
+def profile_payload(n, **fields):
+    """A complete extension payload for person n; keyword arguments override fields."""
+    payload = {
+        'linkedin_url': f'https://www.linkedin.com/in/person-{n}/',
+        'name': f'Person {n}',
+        'headline': f'Engineer at Company {n % 5}',
+        'location': 'Berlin, Germany',
+        'about': f'Person {n} builds data pipelines. ' * 10,
+        'experience': [
+            {'title': 'Engineer', 'company_name': f'Company {n % 5}', 'start_date': 'Jan 2020', 'description': 'Built things. ' * 5},
+            {'title': 'Intern', 'company_name': 'Initech', 'start_date': 'Jun 2018', 'end_date': 'Dec 2019'},
+        ],
+        'education': [{'school_name': f'University {n % 3}', 'degree_name': 'BSc', 'field_of_study': 'Computer Science'}],
+        'skills': ['Python', 'SQL', f'Skill {n}'],
+        'recommendations': [{'recommender_name': 'Alex', 'recommendation_text': 'A pleasure to work with.'}],
+    }
+    payload.update(fields)
+    return payload
+
+def check_search_index(db):
+    """Fail unless profile_search indexes exactly what profile_search_source holds."""
+    db.execute("INSERT INTO profile_search (profile_search, rank) VALUES ('integrity-check', 1)")
+    db.rollback()
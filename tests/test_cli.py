@@ -0,0 +1,13 @@
+from tests.conftest import profile_payload
+
+def test_maintenance_commands_report_through_click(crm_app, client):
+    for n in range(3):
+        client.post('/api/save_profile', json=profile_payload(n))
+    runner = crm_app.app.test_cli_runner()
+
+    result = runner.invoke(args=['rebuild-search'])
+    assert result.exit_code == 0 and result.output.startswith('Indexed 3 profiles')
+    result = runner.invoke(args=['find-duplicates'])
+    assert result.exit_code == 0 and 'possible duplicate pairs' in result.output
+    result = runner.invoke(args=['rebuild-stats', '--check-only'])
+    assert (result.exit_code, result.output) == (0, "Incremental statistics match a full recomputation.\n")
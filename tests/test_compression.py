@@ -0,0 +1,61 @@
+import sqlite3
+
+import app as crm
+
+from tests.conftest import profile_payload
+
+def long_payload(n):
+    return profile_payload(n, about=f'Person {n} leads platform teams that ship data products. ' * 20,
+                           recommendations=[{'recommender_name': 'Alex', 'recommendation_text': 'Calm under pressure and generous with time. ' * 10}])
+
+def stored_types(db, profile_id):
+    return (db.execute("SELECT typeof(about) FROM profile_about WHERE profile_id = ?", (profile_id,)).fetchone()[0],
+            db.execute("SELECT typeof(description) FROM experience WHERE profile_id = ? AND position = 0", (profile_id,)).fetchone()[0],
+            db.execute("SELECT typeof(recommendation_text) FROM recommendations WHERE profile_id = ?", (profile_id,)).fetchone()[0])
+
+def test_compressed_text_round_trips(client, db):
+    payload = long_payload(1)
+    profile_id = client.post('/api/save_profile', json=payload).json['profile_id']
+    assert stored_types(db, profile_id) == ('blob', 'blob', 'blob')
+    stored = db.execute("SELECT about FROM profile_about WHERE profile_id = ?", (profile_id,)).fetchone()[0]
+    assert len(stored) < len(payload['about'])
+
+    profile = client.get(f'/api/profiles/{profile_id}').json
+    assert profile['about'] == payload['about']
+    assert profile['experience'][0]['description'] == payload['experience'][0]['description']
+    assert profile['recommendations'][0]['recommendation_text'] == payload['recommendations'][0]['recommendation_text']
+    assert db.execute("SELECT inflate(about) FROM profile_about WHERE profile_id = ?", (profile_id,)).fetchone()[0] == payload['about']
+    assert db.execute("SELECT inflate('short'), inflate(NULL)").fetchone()[:] == ('short', None)
+
+def test_dictionary_compression_is_readable_from_another_process(crm_app, client, tmp_path, monkeypatch):
+    # Characters that mean something in a URI must not break the read-only dictionary lookup
+    path = tmp_path / 'data #1?x=%20' / 'database.db'
+    monkeypatch.setattr(crm_app, 'DATABASE', str(path))
+    for n in range(12):
+        client.post('/api/save_profile', json=long_payload(n))
+    db = crm_app.db_pool.connection(crm_app.database_path())
+    dict_id = crm_app.train_text_dictionary(db)
+    assert crm_app.recompress_text(db)['profile_about.about'] == 12
+    assert db.execute("SELECT count(*) FROM profile_about WHERE hex(substr(about, 1, 1)) = '02'").fetchone()[0] == 12
+
+    # A process that started before the dictionary was trained fetches it on first use
+    monkeypatch.setitem(crm_app.text_codecs, str(path), crm_app.TextCodec(str(path)))
+    assert client.get('/api/profiles/3').json['about'] == long_payload(2)['about']
+    assert dict_id in crm_app.text_codecs[str(path)].dictionaries
+
+def test_training_on_the_in_memory_fallback(crm_app, monkeypatch):
+    db = sqlite3.connect(':memory:', check_same_thread=False)
+    db.row_factory = sqlite3.Row
+    monkeypatch.setitem(crm_app.text_codecs, ':memory:', crm_app.TextCodec(':memory:'))
+    crm_app.register_text_functions(db, ':memory:')
+    monkeypatch.setattr(crm_app.db_pool, 'memory_fallback', db)
+    crm_app.migrate_db(db)
+    for n in range(1, 4):
+        db.execute("INSERT INTO profiles (id, linkedin_url, name) VALUES (?, ?, 'X')", (n, f'https://www.linkedin.com/in/x-{n}/'))
+        db.execute("INSERT INTO profile_about (profile_id, about) VALUES (?, deflate(?))", (n, long_payload(n)['about']))
+    db.commit()
+
+    dict_id = crm_app.train_text_dictionary(db)
+    assert crm_app.text_codecs[':memory:'].active == dict_id
+    crm_app.recompress_text(db)
+    assert db.execute("SELECT hex(substr(about, 1, 1)), inflate(about) FROM profile_about WHERE profile_id = 2").fetchone()[:] == ('02', long_payload(2)['about'])
@@ -0,0 +1,58 @@
+import pytest
+
+import app as crm
+
+from tests.conftest import profile_payload
+
+CANONICAL = 'https://www.linkedin.com/in/jane-doe/'
+
+@pytest.mark.parametrize('url', [
+    'https://www.linkedin.com/in/jane-doe/',
+    'https://www.linkedin.com/in/jane-doe',
+    'http://linkedin.com/in/Jane-Doe/',
+    'https://de.linkedin.com/in/jane-doe/?originalSubdomain=de',
+    'https://www.linkedin.com/in/jane-doe/en/',
+    'https://www.linkedin.com/in/jane-doe/details/experience/#main',
+    'https://m.linkedin.com/in/jane%2Ddoe',
+    'www.linkedin.com/in/jane-doe/  ',
+])
+def test_profile_urls_are_canonicalised(url):
+    assert crm.canonical_linkedin_url(url) == CANONICAL
+
+def test_other_urls_are_only_trimmed():
+    assert crm.canonical_linkedin_url(' https://example.com/in/Jane/?x=1 ') == 'https://example.com/in/Jane/?x=1'
+    assert crm.canonical_linkedin_url('https://www.linkedin.com/company/Initech/about/') == 'https://www.linkedin.com/company/Initech/about/'
+    assert crm.canonical_linkedin_url(None) is None
+
+def test_url_variants_save_onto_one_profile(client, db):
+    first = client.post('/api/save_profile', json=profile_payload(1, linkedin_url='https://de.linkedin.com/in/Jane-Doe?trk=x'))
+    second = client.post('/api/save_profile', json=profile_payload(1, linkedin_url=CANONICAL, headline='CTO'))
+    assert first.json['profile_id'] == second.json['profile_id']
+    assert [tuple(row) for row in db.execute("SELECT linkedin_url, headline FROM profiles")] == [(CANONICAL, 'CTO')]
+
+@pytest.mark.parametrize('keep_legacy', [False, True])
+def test_merging_a_profile_saved_under_a_non_canonical_url(crm_app, client, db, keep_legacy):
+    legacy_url = 'https://linkedin.com/in/Jane-Doe/?trk=public_profile'
+    current = client.post('/api/save_profile', json=profile_payload(1, linkedin_url=CANONICAL)).json['profile_id']
+    legacy = client.post('/api/save_profile', json=profile_payload(2, name='Person 1', skills=['Go'])).json['profile_id']
+    # A row stored before URLs were canonicalised; canonicalising it would collide with the current one
+    db.execute("UPDATE profiles SET linkedin_url = ? WHERE id = ?", (legacy_url, legacy))
+    db.commit()
+    assert crm.canonicalize_profile_urls(db.cursor()) == 0
+    db.commit()
+
+    assert crm.rebuild_duplicate_index(db) == (2, 1)
+    pair = client.get('/api/duplicates').json['duplicates'][0]
+    assert pair['reason'] == 'url'
+    assert {side['id'] for side in pair['profiles']} == {current, legacy}
+
+    keep, merge = (legacy, current) if keep_legacy else (current, legacy)
+    merged = client.post('/api/duplicates/merge', json={'keep': keep, 'merge': merge}).json
+    assert (merged['profile_id'], merged['merged'], merged['moved']['skills']) == (keep, merge, 1 if keep == current else 3)
+    assert client.get('/api/duplicates').json['duplicates'] == []
+
+    # Later saves under either URL update the survivor instead of bringing the duplicate back
+    for url in (CANONICAL, legacy_url):
+        response = client.post('/api/save_profile', json=profile_payload(1, linkedin_url=url, headline='CTO'))
+        assert response.json['profile_id'] == keep
+    assert [tuple(row) for row in db.execute("SELECT id, headline FROM profiles")] == [(keep, 'CTO')]
@@ -0,0 +1,40 @@
+import json
+
+from tests.conftest import profile_payload
+
+def export_ids(client, since=None):
+    response = client.get('/api/export', query_string={'format': 'ndjson', 'since': since} if since is not None else {'format': 'ndjson'})
+    assert response.status_code == 200
+    ids = [json.loads(line)['id'] for line in response.get_data(as_text=True).splitlines()]
+    return ids, response.headers['X-Export-High-Water-Mark']
+
+def test_incremental_export_misses_no_save_in_the_same_second(client):
+    for n in range(3):
+        client.post('/api/save_profile', json=profile_payload(n))
+    ids, mark = export_ids(client)
+    assert ids == [1, 2, 3]
+
+    # Saved within the second of the previous export's last save
+    client.post('/api/save_profile', json=profile_payload(3))
+    client.post('/api/save_profile', json=profile_payload(1, headline='Staff Engineer'))
+    ids, next_mark = export_ids(client, mark)
+    assert ids == [2, 4]
+    assert int(next_mark) > int(mark)
+
+    assert export_ids(client, next_mark)[0] == []
+    client.post('/api/save_profile', json=profile_payload(1, headline='Staff Engineer')) # Unchanged: not exported again
+    assert export_ids(client, next_mark) == ([], next_mark)
+
+def test_export_since_a_date_includes_that_day(client, db):
+    client.post('/api/save_profile', json=profile_payload(1))
+    today = db.execute("SELECT date(timestamp) FROM profiles").fetchone()[0]
+    assert export_ids(client, today)[0] == [1]
+    assert client.get('/api/export', query_string={'since': 'yesterday'}).status_code == 400
+
+def test_child_table_export_follows_the_watermark(client):
+    client.post('/api/save_profile', json=profile_payload(1))
+    mark = export_ids(client)[1]
+    client.post('/api/save_profile', json=profile_payload(2))
+    response = client.get('/api/export', query_string={'format': 'csv', 'table': 'skills', 'since': mark})
+    rows = response.get_data(as_text=True).splitlines()[1:]
+    assert {row.split(',')[1] for row in rows} == {'2'}
@@ -0,0 +1,19 @@
+import io
+import os
+import zipfile
+
+def test_extension_zip_is_cached_next_to_the_database(crm_app, client, tmp_path):
+    response = client.get('/download-extension')
+    assert (response.status_code, response.mimetype) == (200, 'application/zip')
+    assert 'manifest.json' in zipfile.ZipFile(io.BytesIO(response.data)).namelist()
+    fingerprint = response.headers['ETag'].strip('"')
+    assert os.listdir(tmp_path / 'extension_cache') == [f'extension-{fingerprint}.zip']
+
+def test_extension_zip_supports_conditional_and_range_requests(client):
+    full = client.get('/download-extension')
+    assert client.get('/download-extension', headers={'If-None-Match': full.headers['ETag']}).status_code == 304
+
+    part = client.get('/download-extension', headers={'Range': 'bytes=10-19'})
+    assert part.status_code == 206
+    assert part.data == full.data[10:20]
+    assert part.headers['Content-Range'] == f'bytes 10-19/{len(full.data)}'
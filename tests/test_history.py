@@ -0,0 +1,61 @@
+import app as crm
+
+from tests.conftest import profile_payload
+
+def edits():
+    """Payloads for person 1, each a change from the one before; more than a keyframe interval of them."""
+    payload = profile_payload(1)
+    yield payload
+    for step in range(crm.HISTORY_KEYFRAME_INTERVAL + 3):
+        payload = dict(payload, headline=f'Engineer, step {step}', skills=payload['skills'][1:] + payload['skills'][:1])
+        if step % 3 == 0:
+            payload['experience'] = [{'title': f'Lead {step}', 'company_name': f'Company {step}', 'start_date': 'Jan 2024'}] + payload['experience']
+        if step % 4 == 1:
+            payload['experience'] = payload['experience'][1:]
+        if step == 5:
+            payload['location'] = None
+            payload['about'] = 'Rewritten. ' * 40
+        yield payload
+
+def test_every_version_reads_back_as_saved(client, db):
+    saved = []
+    for number, payload in enumerate(edits()):
+        if number == 7: # One of the versions comes through a bulk save
+            assert client.post('/api/save_profiles', json=[payload]).json['saved'] == 1
+        else:
+            assert client.post('/api/save_profile', json=payload).status_code == 201
+        saved.append(crm.history_document(*crm.normalize_profile(payload)))
+
+    versions = client.get('/api/profiles/1/history?per_page=100').json['versions']
+    assert [version['version'] for version in versions] == list(range(len(saved), 0, -1))
+    assert 'headline' in versions[0]['changes']
+    for number, document in enumerate(saved, 1):
+        response = client.get(f'/api/profiles/1/history/{number}')
+        assert response.status_code == 200
+        assert response.json['profile'] == document, f"version {number}"
+    assert client.get(f'/api/profiles/1/history/{len(saved) + 1}').status_code == 404
+    assert db.execute("SELECT count(*) FROM profile_history WHERE keyframe = 1").fetchone()[0] > 1 # Read across keyframes
+
+def test_unchanged_profile_has_one_version(client):
+    client.post('/api/save_profile', json=profile_payload(1))
+    client.post('/api/save_profile', json=profile_payload(1))
+    assert [version['version'] for version in client.get('/api/profiles/1/history').json['versions']] == [1]
+    assert client.get('/api/profiles/1/history/1').json['profile'] == crm.history_document(*crm.normalize_profile(profile_payload(1)))
+
+def test_recent_changes_by_field(client):
+    client.post('/api/save_profile', json=profile_payload(1))
+    client.post('/api/save_profile', json=profile_payload(2))
+    client.post('/api/save_profile', json=profile_payload(1, headline='CTO'))
+    changes = client.get('/api/history/changes?field=headline').json['changes']
+    assert [(change['profile_id'], change['version']) for change in changes] == [(1, 2)]
+    assert client.get('/api/history/changes?field=location').json['changes'] == []
+
+def test_changes_since_is_validated(client):
+    client.post('/api/save_profile', json=profile_payload(1))
+    client.post('/api/save_profile', json=profile_payload(1, headline='CTO'))
+    assert [change['version'] for change in client.get('/api/history/changes?since=2000-01-01').json['changes']] == [2]
+    assert client.get('/api/history/changes', query_string={'since': '2999-01-01 00:00:00'}).json['changes'] == []
+    for since in ('yesterday', '2024-13-01', '2024-01-01T00:00:00', "2024' OR 1=1"):
+        response = client.get('/api/history/changes', query_string={'since': since})
+        assert response.status_code == 400, since
+        assert 'since must be' in response.json['error']
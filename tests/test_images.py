@@ -0,0 +1,119 @@
+import http.server
+import re
+import struct
+import threading
+import time
+import zlib
+
+import pytest
+
+from tests.conftest import profile_payload
+
+def png(width, height):
+    raw = b''.join(b'\x00' + b'\x80\x80\x80' * width for _ in range(height))
+    chunk = lambda kind, data: struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data) & 0xffffffff)
+    return (b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0))
+            + chunk(b'IDAT', zlib.compress(raw)) + chunk(b'IEND', b''))
+
+@pytest.fixture
+def image_server(crm_app, monkeypatch):
+    """A local picture host at 127.0.0.1, the only allowed one; 'localhost' stands in for any other host."""
+    hits = []
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        def do_GET(self):
+            hits.append(self.path)
+            if self.path.startswith('/to/'):
+                self.send_response(302)
+                self.send_header('Location', f"http://{self.path[4:]}")
+                self.end_headers()
+                return
+            if self.path.startswith('/missing'):
+                self.send_error(404)
+                return
+            body = png(4, 4)
+            self.send_response(200)
+            self.send_header('Content-Type', 'image/png')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setattr(crm_app, 'IMAGE_ALLOWED_HOSTS', re.compile(r'127\.0\.0\.1'))
+    server.hits = hits
+    server.port = server.server_port
+    yield server
+    server.shutdown()
+
+def save_with_picture(client, n, url):
+    return client.post('/api/save_profile', json=profile_payload(n, profile_pic_url=url)).json['profile_id']
+
+def wait_for_download(crm_app, url):
+    # Downloads a picture whose first view already queued it, or one not seen yet
+    event = crm_app.image_cache._inflight.get(url) or crm_app.image_cache.request(url)
+    if event is not None:
+        assert event.wait(5)
+
+def test_first_view_does_not_wait_for_the_download(crm_app, client, image_server, monkeypatch):
+    url = f'http://127.0.0.1:{image_server.port}/slow.png'
+    profile_id = save_with_picture(client, 4, url)
+    release = threading.Event()
+    fetch_image = crm_app.image_cache.fetcher
+    def slow_fetch(url):
+        assert release.wait(5)
+        return fetch_image(url)
+    monkeypatch.setattr(crm_app.image_cache, 'fetcher', slow_fetch)
+
+    started = time.monotonic()
+    first = client.get(f'/images/{profile_id}/profile')
+    assert time.monotonic() - started < 1
+    assert (first.mimetype, first.cache_control.max_age) == ('image/svg+xml', 0)
+    release.set()
+    wait_for_download(crm_app, url)
+    assert client.get(f'/images/{profile_id}/profile').mimetype == 'image/png'
+    assert image_server.hits == ['/slow.png']
+
+def test_picture_is_downloaded_once_then_served_from_cache(crm_app, client, image_server, monkeypatch):
+    url = f'http://127.0.0.1:{image_server.port}/pic.png?sig=1'
+    profile_id = save_with_picture(client, 1, url)
+    wait_for_download(crm_app, url)
+    first = client.get(f'/images/{profile_id}/profile')
+    assert (first.status_code, first.mimetype) == (200, 'image/png')
+    assert first.data == png(4, 4)
+    assert image_server.hits == ['/pic.png?sig=1']
+
+    def no_downloads(url):
+        raise AssertionError(f"cache miss for {url}")
+    monkeypatch.setattr(crm_app.image_cache, 'fetcher', no_downloads)
+    again = client.get(f'/images/{profile_id}/profile')
+    assert again.data == first.data
+    assert client.get(f'/images/{profile_id}/profile', headers={'If-None-Match': first.headers['ETag']}).status_code == 304
+    part = client.get(f'/images/{profile_id}/profile', headers={'Range': 'bytes=0-7'})
+    assert (part.status_code, part.data) == (206, first.data[:8])
+
+def test_failed_download_falls_back_to_placeholder(crm_app, client, image_server):
+    url = f'http://127.0.0.1:{image_server.port}/missing.png'
+    profile_id = save_with_picture(client, 2, url)
+    wait_for_download(crm_app, url)
+    response = client.get(f'/images/{profile_id}/profile')
+    assert (response.status_code, response.mimetype) == (200, 'image/svg+xml')
+    assert response.cache_control.max_age == 0 # Asked again next time
+    assert image_server.hits == ['/missing.png']
+
+def test_other_hosts_are_never_fetched(crm_app, client, image_server):
+    profile_id = save_with_picture(client, 3, f'http://localhost:{image_server.port}/pic.png')
+    assert client.get(f'/images/{profile_id}/profile').mimetype == 'image/svg+xml'
+    assert image_server.hits == []
+    with pytest.raises(ValueError, match='not allowed'):
+        crm_app.fetch_image('file:///etc/passwd')
+
+def test_redirects_are_checked_against_allowed_hosts(crm_app, image_server):
+    port = image_server.port
+    assert crm_app.fetch_image(f'http://127.0.0.1:{port}/to/127.0.0.1:{port}/pic.png') == png(4, 4)
+    with pytest.raises(ValueError, match='not allowed'):
+        crm_app.fetch_image(f'http://127.0.0.1:{port}/to/localhost:{port}/secret')
+    assert '/secret' not in image_server.hits
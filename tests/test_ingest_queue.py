@@ -0,0 +1,48 @@
+import os
+import time
+
+import pytest
+
+from tests.conftest import profile_payload
+
+@pytest.fixture
+def ingest_queue(crm_app, monkeypatch):
+    # A queue of its own, journaling next to this test's database
+    queue = crm_app.IngestQueue()
+    monkeypatch.setattr(crm_app, 'ingest_queue', queue)
+    return queue
+
+def wait_for(client, ticket, timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        status = client.get(f'/api/ingest_status/{ticket}').json
+        if status['status'] != 'queued':
+            return status
+        time.sleep(0.02)
+    raise AssertionError(f"ticket {ticket} still queued")
+
+def queue_save(client, payload):
+    response = client.post('/api/save_profile?mode=queued', json=payload)
+    assert response.status_code == 202
+    return response.json['ticket']
+
+def test_queued_save_is_written(client, ingest_queue):
+    status = wait_for(client, queue_save(client, profile_payload(1)))
+    assert (status['status'], status['profile_id']) == ('done', 1)
+    assert os.path.getsize(ingest_queue.journal_path()) == 0
+
+def test_failed_batch_marks_its_tickets_failed(crm_app, client, ingest_queue, monkeypatch):
+    flush = crm_app.WriteBatch.flush
+
+    def broken_flush(self, cursor):
+        raise RuntimeError("index update failed")
+    monkeypatch.setattr(crm_app.WriteBatch, 'flush', broken_flush)
+    ticket = queue_save(client, profile_payload(1))
+    status = wait_for(client, ticket)
+    assert status['status'] == 'failed'
+    assert 'index update failed' in status['error']
+    assert not ingest_queue.is_pending(ticket)
+    assert os.path.getsize(ingest_queue.journal_path()) == 0 # Nothing is left to replay
+
+    monkeypatch.setattr(crm_app.WriteBatch, 'flush', flush)
+    assert wait_for(client, queue_save(client, profile_payload(2)))['status'] == 'done' # The writer carries on
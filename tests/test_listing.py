@@ -0,0 +1,50 @@
+import base64
+import json
+
+import pytest
+
+import app as crm
+
+from tests.conftest import profile_payload
+
+def all_pages(client, per_page):
+    ids, cursor, pages = [], None, 0
+    while True:
+        body = client.get('/api/profiles', query_string={'per_page': per_page, **({'cursor': cursor} if cursor else {})}).json
+        ids.extend(profile['id'] for profile in body['profiles'])
+        pages += 1
+        cursor = body['next_cursor']
+        if cursor is None:
+            return ids, pages
+
+def test_pages_cover_every_profile_newest_first(client, db):
+    for n in range(7):
+        client.post('/api/save_profile', json=profile_payload(n))
+    db.executemany("UPDATE profiles SET timestamp = ? WHERE id = ?",
+                   [(f'2024-01-0{n} 12:00:00', profile_id) for n, profile_id in enumerate([3, 1, 7, 2, 6, 4, 5], 1)])
+    db.commit()
+    ids, pages = all_pages(client, 3)
+    assert ids == [5, 4, 6, 2, 7, 1, 3]
+    assert pages == 3
+
+def test_tied_timestamps_keep_a_stable_order(client, db):
+    for n in range(9):
+        client.post('/api/save_profile', json=profile_payload(n))
+    db.execute("UPDATE profiles SET timestamp = '2024-01-01 12:00:00'")
+    db.commit()
+    for per_page in (1, 2, 4, 9):
+        assert all_pages(client, per_page)[0] == list(range(9, 0, -1))
+
+def token(value):
+    return base64.urlsafe_b64encode(json.dumps(value).encode('utf-8')).decode('ascii')
+
+@pytest.mark.parametrize('cursor', ['not-a-cursor', token({'a': 1}), token(['2024-01-01 12:00:00', '5']),
+                                    token([['2024'], 5]), token([{'ts': 1}, 5]), token(['2024-01-01 12:00:00', True])])
+def test_malformed_cursor_is_rejected(client, cursor):
+    client.post('/api/save_profile', json=profile_payload(1))
+    response = client.get('/api/profiles', query_string={'cursor': cursor})
+    assert response.status_code == 400
+    assert response.json['error'] == 'Invalid page cursor'
+
+def test_cursor_round_trip():
+    assert crm.decode_page_cursor(crm.encode_page_cursor('2024-01-01 12:00:00', 42)) == ('2024-01-01 12:00:00', 42)
@@ -0,0 +1,55 @@
+import os
+import shutil
+import sqlite3
+
+import app as crm
+
+from tests.conftest import check_search_index
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def baseline_database(path):
+    """The shipped database.db (the schema before any migration) plus a few related rows."""
+    shutil.copyfile(os.path.join(REPO_ROOT, 'database.db'), path)
+    db = sqlite3.connect(path)
+    assert db.execute("PRAGMA user_version").fetchone()[0] == 0
+    db.execute("INSERT INTO experience (profile_id, title, company_name, description) VALUES (1, 'Engineer', 'Acme Robotics', 'Built robots')")
+    db.execute("INSERT INTO experience (profile_id, title, company_name) VALUES (3, 'Analyst', 'acme  robotics')")
+    db.execute("INSERT INTO education (profile_id, school_name, degree_name) VALUES (1, 'Addis Ababa University', 'BSc')")
+    db.commit()
+    about = dict(db.execute("SELECT id, about FROM profiles"))
+    db.close()
+    return about
+
+def test_upgrade_from_baseline_schema(crm_app, client):
+    about = baseline_database(crm_app.database_path())
+
+    assert client.get('/').status_code == 200 # First use migrates
+    db = crm_app.db_pool.connection(crm_app.database_path())
+    assert db.execute("PRAGMA user_version").fetchone()[0] == len(crm.MIGRATIONS)
+
+    # Search is populated from the migrated tables, company names included
+    found = client.get('/api/search?q=acme').json['results']
+    assert sorted(result['id'] for result in found) == [1, 3]
+    assert db.execute("SELECT count(*) FROM sqlite_master WHERE name = 'profile_search_content'").fetchone()[0] == 0 # No second copy of the text
+    check_search_index(db)
+
+    # Names are interned case- and space-insensitively, and counted
+    assert db.execute("SELECT count(DISTINCT company_id) FROM experience").fetchone()[0] == 1
+    assert [tuple(row) for row in db.execute("SELECT name, profile_count FROM companies")] == [("Acme Robotics", 2)]
+
+    # About texts moved to the compressed side table and read back unchanged
+    assert db.execute("SELECT count(*) FROM profiles WHERE about IS NOT NULL").fetchone()[0] == 0
+    for profile_id, text in about.items():
+        assert client.get(f'/api/profiles/{profile_id}').json['about'] == text
+
+    # Existing profiles get export sequence numbers in the order they were saved
+    assert [row[0] for row in db.execute("SELECT change_seq FROM profiles ORDER BY timestamp, id")] == list(range(1, len(about) + 1))
+
+    cursor = db.cursor()
+    assert crm.rebuild_stats(cursor, write=False) == {}
+
+def test_migrating_twice_is_a_no_op(crm_app, client):
+    baseline_database(crm_app.database_path())
+    db = crm_app.db_pool.connection(crm_app.database_path())
+    assert crm.migrate_db(db) == 0
@@ -0,0 +1,37 @@
+import sqlite3
+import threading
+
+import pytest
+
+from tests.conftest import profile_payload
+
+def test_request_connections_are_shared_across_threads(crm_app, client, monkeypatch):
+    client.post('/api/save_profile', json=profile_payload(1))
+    client.get('/api/profiles')
+    opened = []
+    connect = crm_app.db_pool._connect
+    monkeypatch.setattr(crm_app.db_pool, '_connect', lambda path, readonly: opened.append(readonly) or connect(path, readonly))
+
+    def serve(n):
+        assert client.post('/api/save_profile', json=profile_payload(n)).json['success']
+        assert client.get('/api/profiles').status_code == 200
+    for n in range(2, 5):
+        thread = threading.Thread(target=serve, args=(n,))
+        thread.start()
+        thread.join()
+    assert opened == [] # Each new thread borrowed the connections the earlier requests handed back
+
+def test_release_rolls_back_and_caps_idle_connections(crm_app, client, monkeypatch):
+    client.get('/api/profiles')
+    monkeypatch.setattr(crm_app, 'POOL_IDLE_CONNECTIONS', 1)
+    pool = crm_app.ConnectionPool()
+    path = crm_app.database_path()
+    first, second = pool.acquire(path), pool.acquire(path)
+    first.execute("INSERT INTO profiles (linkedin_url, name) VALUES ('https://www.linkedin.com/in/x/', 'X')")
+    pool.release(first)
+    pool.release(second)
+    assert not first.in_transaction
+    assert pool.acquire(path) is first
+    assert first.execute("SELECT count(*) FROM profiles").fetchone()[0] == 0
+    with pytest.raises(sqlite3.ProgrammingError, match='closed'): # Beyond the idle cap
+        second.execute("SELECT 1")
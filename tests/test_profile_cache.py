@@ -0,0 +1,54 @@
+import pytest
+
+from tests.conftest import profile_payload
+
+@pytest.mark.parametrize('path', ['/api/profiles/{}', '/profile/{}'])
+def test_conditional_requests_and_cached_bodies(crm_app, client, monkeypatch, path):
+    profile_id = client.post('/api/save_profile', json=profile_payload(1)).json['profile_id']
+    url = path.format(profile_id)
+    first = client.get(url)
+    assert first.status_code == 200
+    assert b'Engineer at Company 1' in first.data
+    etag, last_modified = first.headers['ETag'], first.headers['Last-Modified']
+    assert first.cache_control.no_cache
+
+    def no_rebuild(db, profile_id):
+        raise AssertionError("body rebuilt for an unchanged profile")
+    with monkeypatch.context() as patch:
+        patch.setattr(crm_app, 'load_profile_graph', no_rebuild)
+        assert client.get(url).data == first.data
+        assert client.get(url, headers={'If-None-Match': etag}).status_code == 304
+        assert client.get(url, headers={'If-Modified-Since': last_modified}).status_code == 304
+        assert client.get(url, headers={'If-None-Match': '"stale"'}).status_code == 200
+
+    client.post('/api/save_profile', json=profile_payload(1, headline='CTO at Company 1'))
+    edited = client.get(url, headers={'If-None-Match': etag})
+    assert edited.status_code == 200
+    assert edited.headers['ETag'] != etag
+    assert b'CTO at Company 1' in edited.data
+
+def test_missing_profile_is_not_found(client):
+    assert client.get('/api/profiles/999').status_code == 404
+    assert client.get('/profile/999').status_code == 404
+
+def test_detail_graph_is_loaded_in_one_query(crm_app, client, db):
+    payload = profile_payload(1, featured=[{'title': 'Talk', 'link': 'https://example.com/talk'}],
+                              skills=['SQL', 'Python', 'Airflow'])
+    profile_id = client.post('/api/save_profile', json=payload).json['profile_id']
+
+    crm_app.request_trace.current = {'statements': 0, 'sql_seconds': 0.0, 'slowest': None}
+    try:
+        graph = crm_app.load_profile_graph(db, profile_id)
+        statements = crm_app.request_trace.current['statements']
+    finally:
+        crm_app.request_trace.current = None
+    assert statements == 1
+
+    assert (graph['id'], graph['name'], graph['about']) == (profile_id, 'Person 1', payload['about'])
+    assert [(exp['title'], exp['company_name']) for exp in graph['experience']] == [('Engineer', 'Company 1'), ('Intern', 'Initech')]
+    assert all(exp['company_id'] for exp in graph['experience'])
+    assert [edu['school_name'] for edu in graph['education']] == ['University 1']
+    assert [skill['skill_name'] for skill in graph['skills']] == ['Airflow', 'Python', 'SQL'] # Alphabetical
+    assert [rec['recommender_name'] for rec in graph['recommendations']] == ['Alex']
+    assert [feat['link'] for feat in graph['featured']] == ['https://example.com/talk']
+    assert client.get(f'/api/profiles/{profile_id}').json == graph
@@ -0,0 +1,108 @@
+import json
+import sqlite3
+
+from tests.conftest import profile_payload
+
+def company_of(db, profile_id):
+    return db.execute("""
+        SELECT c.name FROM experience e JOIN companies c ON c.id = e.company_id
+        WHERE e.profile_id = ? ORDER BY e.position LIMIT 1""", (profile_id,)).fetchone()[0]
+
+def test_save_profile_creates_then_reports_unchanged(client):
+    payload = profile_payload(1)
+    first = client.post('/api/save_profile', json=payload)
+    assert first.status_code == 201
+    assert first.json['changes']['profile'] == 'inserted'
+    again = client.post('/api/save_profile', json=payload)
+    assert again.json['changes']['profile'] == 'unchanged'
+    assert again.json['profile_id'] == first.json['profile_id']
+
+def test_bulk_save_with_failing_item(client, db):
+    bad = profile_payload(1, experience=[{'title': 'Founder', 'company_name': 'NewCo', 'description': {'not': 'text'}}])
+    other = profile_payload(2, experience=[{'title': 'Engineer', 'company_name': 'OtherCo'}])
+    good = profile_payload(3, experience=[{'title': 'Engineer', 'company_name': 'NewCo'}])
+    response = client.post('/api/save_profiles', json=[bad, other, good, {'name': 'No URL'}])
+    assert response.status_code == 200
+    body = response.json
+    assert (body['total'], body['saved'], body['failed']) == (4, 2, 2)
+    assert [result['success'] for result in body['results']] == [False, True, True, False]
+    assert body['results'][3]['missing'] == ['headline', 'linkedin_url']
+
+    other_id, good_id = body['results'][1]['profile_id'], body['results'][2]['profile_id']
+    assert company_of(db, other_id) == 'OtherCo'
+    assert company_of(db, good_id) == 'NewCo'
+    counts = dict(db.execute("SELECT name, profile_count FROM companies WHERE name IN ('NewCo', 'OtherCo')").fetchall())
+    assert counts == {'NewCo': 1, 'OtherCo': 1}
+    assert db.execute("SELECT count(*) FROM profiles WHERE linkedin_url LIKE '%person-1/'").fetchone()[0] == 0
+
+    # Ids cached after the commit must still be the right ones
+    client.post('/api/save_profile', json=profile_payload(4, experience=[{'title': 'CTO', 'company_name': 'NewCo'}]))
+    assert db.execute("SELECT count(*) FROM companies WHERE name = 'NewCo'").fetchone()[0] == 1
+    assert db.execute("SELECT profile_count FROM companies WHERE name = 'NewCo'").fetchone()[0] == 2
+
+def test_switching_databases_keeps_interned_ids_apart(crm_app, client, tmp_path, monkeypatch):
+    # Fill the first database's caches with ids the second one does not have
+    for n in range(5):
+        assert client.post('/api/save_profile', json=profile_payload(n)).status_code == 201
+    monkeypatch.setattr(crm_app, 'DATABASE', str(tmp_path / 'other.db'))
+    crm_app.profile_cache.clear()
+    response = client.post('/api/save_profile', json=profile_payload(7, experience=[{'title': 'Engineer', 'company_name': 'Initech'}]))
+    assert response.status_code == 201
+    db = crm_app.db_pool.connection(crm_app.database_path())
+    assert company_of(db, response.json['profile_id']) == 'Initech'
+
+def index_state(db):
+    rows = lambda sql: sorted(tuple(row) for row in db.execute(sql))
+    return {
+        'pairs': rows("SELECT profile_id, other_id, reason, similarity FROM duplicate_candidates"),
+        'block_keys': rows("SELECT block_key, profile_id FROM profile_block_keys"),
+        'lsh': rows("SELECT band, bucket, profile_id FROM profile_lsh"),
+        'search': rows("SELECT rowid, name, headline, location, experience, skills FROM profile_search"),
+        'companies': rows("SELECT name, profile_count FROM companies"),
+        'locations': rows("SELECT name_key, profile_count FROM stats_locations"),
+        'days': rows("SELECT day, profiles_added FROM stats_daily"),
+    }
+
+def test_bulk_save_indexes_like_single_saves(crm_app, client, tmp_path, monkeypatch):
+    payloads = [profile_payload(n) for n in range(12)]
+    payloads.append(profile_payload(3, linkedin_url='https://www.linkedin.com/in/person-3-again/')) # Duplicate of person 3
+    payloads.append(profile_payload(5, location='Paris, France', skills=['Rust'])) # Edit within the request
+
+    for payload in payloads:
+        assert client.post('/api/save_profile', json=payload).status_code == 201
+    db = crm_app.db_pool.connection(crm_app.database_path())
+    singles = index_state(db)
+
+    monkeypatch.setattr(crm_app, 'DATABASE', str(tmp_path / 'bulk.db'))
+    assert client.post('/api/save_profiles', json=payloads).json['failed'] == 0
+    db = crm_app.db_pool.connection(crm_app.database_path())
+    assert index_state(db) == singles
+    assert (4, 13, 'name_company', 1.0) in singles['pairs'] # Person 3 under its second URL
+    assert crm_app.rebuild_stats(db.cursor(), write=False) == {}
+
+def test_reading_a_bulk_upload_does_not_hold_the_write_lock(crm_app, client, monkeypatch):
+    client.post('/api/save_profile', json=profile_payload(0))
+    monkeypatch.setattr(crm_app, 'BULK_BATCH_SIZE', 2)
+    other = sqlite3.connect(crm_app.database_path(), timeout=0, isolation_level=None)
+    locked = []
+
+    def write_lock_taken():
+        try:
+            other.execute("BEGIN IMMEDIATE")
+        except sqlite3.OperationalError:
+            return True
+        other.execute("ROLLBACK")
+        return False
+
+    read_payload = crm_app.iter_bulk_payload
+    def reading_slowly():
+        for item in read_payload():
+            locked.append(write_lock_taken()) # Another writer, while the next record is still on its way
+            yield item
+    monkeypatch.setattr(crm_app, 'iter_bulk_payload', reading_slowly)
+
+    body = ''.join(json.dumps(profile_payload(n)) + '\n' for n in range(1, 6)) + '{broken\n'
+    response = client.post('/api/save_profiles', data=body, content_type='application/x-ndjson')
+    assert (response.json['saved'], response.json['failed']) == (5, 1)
+    assert [result['index'] for result in response.json['results']] == list(range(6))
+    assert locked == [False] * 6
@@ -0,0 +1,70 @@
+import app as crm
+
+from tests.conftest import check_search_index, profile_payload
+
+def search(client, q, **args):
+    return client.get('/api/search', query_string={'q': q, **args})
+
+def ids(response):
+    return [result['id'] for result in response.json['results']]
+
+def test_search_follows_saves_and_edits(client):
+    for n in range(4):
+        client.post('/api/save_profile', json=profile_payload(n))
+    rustacean = client.post('/api/save_profile', json=profile_payload(9, skills=['Rust', 'Kubernetes'])).json['profile_id']
+    assert ids(search(client, 'kubernetes')) == [rustacean]
+    assert ids(search(client, 'kube')) == [rustacean] # The last word matches as a prefix
+    assert len(ids(search(client, 'Initech'))) == 5 # Company names from experience
+
+    client.post('/api/save_profile', json=profile_payload(9, skills=['Go']))
+    assert ids(search(client, 'kubernetes')) == []
+    assert ids(search(client, 'go')) == [rustacean]
+
+def test_results_are_ranked_and_paginated(client):
+    about = client.post('/api/save_profile', json=profile_payload(1, about='Sometimes writes Haskell.')).json['profile_id']
+    name = client.post('/api/save_profile', json=profile_payload(2, name='Haskell Curry')).json['profile_id']
+    others = [client.post('/api/save_profile', json=profile_payload(n, about='Haskell ' * n)).json['profile_id'] for n in range(3, 6)]
+
+    first = search(client, 'haskell', per_page=2)
+    assert first.json['results'][0]['id'] == name # A name match outweighs the about text
+    assert '[Haskell]' in first.json['results'][0]['snippet']
+    assert first.json['next_page'] == 2
+    rest = search(client, 'haskell', per_page=2, page=2).json['results'] + search(client, 'haskell', per_page=2, page=3).json['results']
+    assert sorted(ids(first) + [result['id'] for result in rest]) == sorted([about, name] + others)
+    assert search(client, 'haskell', per_page=2, page=3).json['next_page'] is None
+
+def test_queries_are_escaped(client):
+    client.post('/api/save_profile', json=profile_payload(1))
+    assert search(client, 'Person AND OR NEAR("').status_code == 200
+    assert search(client, '  ').status_code == 400
+
+def test_rebuild_restores_a_lost_index(crm_app, client, db):
+    for n in range(3):
+        client.post('/api/save_profile', json=profile_payload(n))
+    db.execute("DELETE FROM profile_search")
+    db.commit()
+    assert ids(search(client, 'Person')) == []
+    assert crm.rebuild_search_index(db) == 3
+    assert sorted(ids(search(client, 'Person'))) == [1, 2, 3]
+
+def test_index_stays_in_step_with_the_stored_text(client, db):
+    for n in range(4):
+        client.post('/api/save_profile', json=profile_payload(n))
+    client.post('/api/save_profile', json=profile_payload(1, about='Now writes Elixir.', skills=['Elixir']))
+    # Saved twice in one transaction, next to a failing item
+    bulk = [profile_payload(2, headline='Gardener'), profile_payload(7),
+            profile_payload(8, experience=[{'title': 'Founder', 'company_name': 'NewCo', 'description': {'not': 'text'}}]),
+            profile_payload(2, headline='Beekeeper'), profile_payload(7, skills=['Haskell'])]
+    results = client.post('/api/save_profiles', json=bulk).json['results']
+    assert [result['success'] for result in results] == [True, True, False, True, True]
+    check_search_index(db)
+    assert ids(search(client, 'elixir')) == [2]
+    assert ids(search(client, 'beekeeper')) == [3]
+    assert ids(search(client, 'gardener')) == ids(search(client, 'newco')) == []
+    assert ids(search(client, 'haskell')) == [results[1]['profile_id']]
+
+    copy = client.post('/api/save_profile', json=profile_payload(3, linkedin_url='https://www.linkedin.com/in/copy/', skills=['Fortran'])).json['profile_id']
+    assert client.post('/api/duplicates/merge', json={'keep': 4, 'merge': copy}).json['success']
+    check_search_index(db)
+    assert ids(search(client, 'fortran')) == [4]
+    assert db.execute("SELECT count(*) FROM sqlite_master WHERE name = 'profile_search_content'").fetchone()[0] == 0
@@ -0,0 +1,50 @@
+import app as crm
+
+from tests.conftest import profile_payload
+
+def drift(db):
+    return crm.rebuild_stats(db.cursor(), write=False)
+
+def top(client, dimension):
+    return {row['name']: row['profiles'] for row in client.get('/api/stats?limit=50').json[f'top_{dimension}']}
+
+def test_counters_match_recomputation_after_edits_and_merges(client, db):
+    for n in range(8):
+        assert client.post('/api/save_profile', json=profile_payload(n)).status_code == 201
+    assert drift(db) == {}
+
+    # Edits that move a profile between companies and locations and drop skills
+    client.post('/api/save_profile', json=profile_payload(1, location='Paris, France', skills=['Rust'],
+                                                          experience=[{'title': 'CTO', 'company_name': 'Company 4'}]))
+    client.post('/api/save_profile', json=profile_payload(2, location=None, education=[]))
+    assert drift(db) == {}
+
+    # A bulk save that edits, adds and fails in the same request
+    bulk = [profile_payload(3, skills=[]), profile_payload(9), {'name': 'No URL'},
+            profile_payload(10, experience=[{'title': 'Founder', 'company_name': 'NewCo', 'description': {'not': 'text'}}])]
+    assert client.post('/api/save_profiles', json=bulk).json['saved'] == 2
+    assert drift(db) == {}
+
+    # Merge a second copy of person 5 into the first
+    keep = client.post('/api/save_profile', json=profile_payload(5)).json['profile_id']
+    copy = client.post('/api/save_profile', json=profile_payload(5, linkedin_url='https://www.linkedin.com/in/person-5-again/',
+                                                                 location='Lisbon, Portugal', skills=['Go'])).json['profile_id']
+    assert client.post('/api/duplicates/merge', json={'keep': keep, 'merge': copy}).json['success']
+    assert drift(db) == {}
+
+    stats = client.get('/api/stats').json
+    assert stats['total_profiles'] == db.execute("SELECT count(*) FROM profiles").fetchone()[0] == 9
+    assert top(client, 'companies')['Company 4'] == db.execute(
+        "SELECT count(DISTINCT e.profile_id) FROM experience e JOIN companies c ON c.id = e.company_id WHERE c.name = 'Company 4'").fetchone()[0]
+    assert 'NewCo' not in top(client, 'companies')
+
+def test_rebuild_reports_and_repairs_drift(client, db):
+    for n in range(3):
+        client.post('/api/save_profile', json=profile_payload(n))
+    db.execute("UPDATE companies SET profile_count = profile_count + 5 WHERE name = 'Initech'")
+    db.commit()
+    assert 'companies' in drift(db)
+    crm.rebuild_stats(db.cursor())
+    db.commit()
+    assert drift(db) == {}
+    assert top(client, 'companies')['Initech'] == 3